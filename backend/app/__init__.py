@@ -1,11 +1,16 @@
+import time
+
+# Время начала импорта пакета - для разбивки времени старта (см. create_app)
+_import_started = time.perf_counter()
+
 from flask import Flask, send_file
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
-from flask_marshmallow import Marshmallow
 from flask_caching import Cache
 from dotenv import load_dotenv, find_dotenv
+from app.logging_setup import init_logging
+from app.sqlite_mode import RoutingSQLAlchemy, sqlite_engine_options, init_sqlite_production_mode
+import logging
 import os
-import sys
 
 # Load environment variables
 dotenv_path = find_dotenv(filename='.env', raise_error_if_not_found=False, usecwd=True)
@@ -14,36 +19,32 @@ dotenv_path = find_dotenv(filename='.env', raise_error_if_not_found=False, usecw
 # Если мы запускаем из backend/, то .env должен найтись там.
 # Если из корня, то find_dotenv может не найти backend/.env без usecwd или если он не поднимется достаточно высоко.
 # Поэтому, дополнительно проверим конкретный путь, если find_dotenv не справился так, как мы хотим.
-
-if dotenv_path:
-    print(f"[DEBUG] dotenv: Found .env at: {dotenv_path}")
-    load_dotenv(dotenv_path)
-else:
-    # Если find_dotenv не нашел (например, при запуске из корня проекта, а .env в backend/)
-    # попробуем наш предыдущий "жесткий" путь.
+if not dotenv_path:
     specific_path_to_env = os.path.join(os.path.dirname(__file__), '..', '.env')
-    print(f"[DEBUG] dotenv: .env not found by find_dotenv. Trying specific path: {os.path.abspath(specific_path_to_env)}")
     if os.path.exists(specific_path_to_env):
-        load_dotenv(dotenv_path=specific_path_to_env)
-        dotenv_path = specific_path_to_env # Обновляем для логгирования ниже
-    else:
-        print(f"[DEBUG] dotenv: Specific path .env also not found at {os.path.abspath(specific_path_to_env)}.")
-
-# Финальная проверка и логгирование значения ключа
-if dotenv_path and os.path.exists(dotenv_path):
-     print(f"[DEBUG] dotenv: Loaded .env from {dotenv_path}. EXCHANGE_RATE_API_KEY: {os.getenv('EXCHANGE_RATE_API_KEY')}")
-else:
-    print(f"[DEBUG] dotenv: .env file was NOT loaded. EXCHANGE_RATE_API_KEY: {os.getenv('EXCHANGE_RATE_API_KEY')}")
+        dotenv_path = specific_path_to_env
+if dotenv_path:
+    load_dotenv(dotenv_path)
 
 # Initialize extensions
-db = SQLAlchemy()
-ma = Marshmallow()
+db = RoutingSQLAlchemy()
 cache = Cache()
 
 # Global price updater instance
 price_updater = None
 
+logger = logging.getLogger(__name__)
+_import_seconds = time.perf_counter() - _import_started
+
+def _mark(timings, phase, started):
+    """Записывает длительность фазы старта в миллисекундах и возвращает текущее время."""
+    now = time.perf_counter()
+    timings[phase] = round((now - started) * 1000, 1)
+    return now
+
 def create_app():
+    timings = {'import_app': round(_import_seconds * 1000, 1)}
+    started = phase_started = time.perf_counter()
     # Определяем абсолютный путь к папке instance внутри backend
     # __file__ это backend/app/__init__.py
     # os.path.dirname(__file__) это backend/app/
@@ -54,15 +55,25 @@ def create_app():
     if not os.path.exists(instance_folder_path):
         try:
             os.makedirs(instance_folder_path)
-            print(f"Created instance folder: {instance_folder_path}")
+            logger.info(f"Created instance folder: {instance_folder_path}")
         except OSError as e:
-            print(f"Error creating instance folder {instance_folder_path}: {e}", file=sys.stderr)
+            logger.error(f"Error creating instance folder {instance_folder_path}: {e}")
             # Если не удалось создать, возможно, будут проблемы дальше
 
     app = Flask(__name__, instance_path=instance_folder_path, instance_relative_config=True)
     
     # Configure the Flask application
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev')
+
+    # Логирование (см. app/logging_setup.py): json или text, запись через очередь в отдельном потоке,
+    # сообщения о каждой строке: all, sample (не больше LOG_ROW_RATE в секунду) или summary
+    app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO').upper()
+    app.config['LOG_FORMAT'] = os.getenv('LOG_FORMAT', 'json')
+    app.config['LOG_ASYNC'] = os.getenv('LOG_ASYNC', '1') == '1'
+    app.config['LOG_QUEUE_SIZE'] = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    app.config['LOG_ROW_MODE'] = os.getenv('LOG_ROW_MODE', 'sample')
+    app.config['LOG_ROW_RATE'] = float(os.getenv('LOG_ROW_RATE', '10'))
+    init_logging(app)
     
     # Конфигурация базы данных SQLite (комментируем)
     # Теперь, когда instance_path установлен, 'sqlite:///app.db' будет автоматически искаться в instance_folder_path
@@ -76,18 +87,153 @@ def create_app():
     # app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', default_postgres_uri)
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Производственный режим SQLite: WAL, PRAGMA и раздельные пулы чтения/записи (см. app/sqlite_mode.py)
+    app.config['SQLITE_PRODUCTION_MODE'] = os.getenv('SQLITE_PRODUCTION_MODE', '0') == '1' \
+        and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    app.config['SQLITE_READ_POOL_SIZE'] = int(os.getenv('SQLITE_READ_POOL_SIZE', '8'))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+    app.config['SQLITE_WRITE_TIMEOUT'] = float(os.getenv('SQLITE_WRITE_TIMEOUT', '30'))
+    if app.config['SQLITE_PRODUCTION_MODE']:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(app)
+
+    # PostgreSQL: секции metal_price по месяцам (см. app/tasks/partitions.py); ретенция 0 - секции не удаляются
+    app.config['PRICE_PARTITIONING'] = os.getenv('PRICE_PARTITIONING', '0') == '1'
+    app.config['PRICE_PARTITION_MONTHS_AHEAD'] = int(os.getenv('PRICE_PARTITION_MONTHS_AHEAD', '3'))
+    app.config['PRICE_PARTITION_RETENTION_MONTHS'] = int(os.getenv('PRICE_PARTITION_RETENTION_MONTHS', '0'))
+
+    # Ретенция тиков MetalPrice (см. app/tasks/retention.py); пустое значение - выключено
+    app.config['RETENTION_DAYS'] = int(os.getenv('RETENTION_DAYS', '0')) or None
+    app.config['RETENTION_BATCH_SIZE'] = int(os.getenv('RETENTION_BATCH_SIZE', '1000'))
+    app.config['RETENTION_VACUUM_PAGES'] = int(os.getenv('RETENTION_VACUUM_PAGES', '1000'))
+
+    # Адаптивное расписание PriceUpdater (см. app/tasks/scheduler.py)
+    app.config['UPDATER_BASE_INTERVAL'] = float(os.getenv('UPDATER_BASE_INTERVAL', '600'))
+    app.config['UPDATER_FAST_INTERVAL'] = float(os.getenv('UPDATER_FAST_INTERVAL', '60'))
+    app.config['UPDATER_MAX_INTERVAL'] = float(os.getenv('UPDATER_MAX_INTERVAL', '3600'))
+    app.config['UPDATER_JITTER'] = float(os.getenv('UPDATER_JITTER', '0.1'))
+    # Ожидаемое время публикации цен ЦБ, 'HH:MM' в UTC через запятую; пусто - выучить по изменениям
+    app.config['PRICE_PUBLISH_TIMES'] = os.getenv('PRICE_PUBLISH_TIMES', '')
+    app.config['PRICE_PUBLISH_WINDOW_MINUTES'] = float(os.getenv('PRICE_PUBLISH_WINDOW_MINUTES', '30'))
+
+    # SSE поток /api/metals/stream (см. app/services/price_stream.py)
+    app.config['PRICE_STREAM_QUEUE_SIZE'] = int(os.getenv('PRICE_STREAM_QUEUE_SIZE', '16'))
+    app.config['PRICE_STREAM_MAX_CLIENTS'] = int(os.getenv('PRICE_STREAM_MAX_CLIENTS', '10000'))
+    # Клиенты Flask-маршрута держат поток воркера; 0 - без отдельного лимита (gevent)
+    app.config['PRICE_STREAM_MAX_THREAD_CLIENTS'] = int(os.getenv('PRICE_STREAM_MAX_THREAD_CLIENTS', '4'))
+    app.config['PRICE_STREAM_HEARTBEAT_SECONDS'] = float(os.getenv('PRICE_STREAM_HEARTBEAT_SECONDS', '15'))
+    app.config['PRICE_STREAM_POLL_SECONDS'] = float(os.getenv('PRICE_STREAM_POLL_SECONDS', '5'))
+
+    # Асинхронный режим чтения (app/asgi.py); по умолчанию async-драйвер выводится из SQLALCHEMY_DATABASE_URI
+    app.config['ASYNC_DATABASE_URL'] = os.getenv('ASYNC_DATABASE_URL')
+    app.config['ASYNC_DB_POOL_SIZE'] = int(os.getenv('ASYNC_DB_POOL_SIZE', '10'))
+    # Потоки для маршрутов, которые в ASGI режиме обслуживает обычное Flask приложение
+    app.config['ASGI_WSGI_THREADS'] = int(os.getenv('ASGI_WSGI_THREADS', '16'))
+
+    # Создавать таблицы и начальные металлы при каждом старте; 0 - только через `flask init-db`
+    app.config['DB_AUTO_INIT'] = os.getenv('DB_AUTO_INIT', '1') == '1'
+
+    # Фоновый PriceUpdater в каждом процессе сервера (gunicorn/uvicorn воркер, run.py, flask run);
+    # в остальных CLI-командах не запускается. Цены обновляет только держатель блокировки ниже
+    app.config['PRICE_UPDATER_ENABLED'] = os.getenv('PRICE_UPDATER_ENABLED', '1') == '1'
+    # Файл блокировки, выбирающий единственный процесс, в котором работает PriceUpdater
+    app.config['PRICE_UPDATER_LOCK_PATH'] = os.getenv(
+        'PRICE_UPDATER_LOCK_PATH', os.path.join(app.instance_path, 'price_updater.lock'))
+    # Час UTC, начиная с которого выполняется ежедневное обслуживание (секции, ретенция, батчи);
+    # дата последнего запуска хранится рядом с файлом блокировки (<lock>.maintenance)
+    app.config['MAINTENANCE_HOUR_UTC'] = int(os.getenv('MAINTENANCE_HOUR_UTC', '2'))
     
     # Configure cache
     app.config['CACHE_TYPE'] = 'SimpleCache'
     app.config['CACHE_DEFAULT_TIMEOUT'] = 300  # 5 minutes
+    # Снимок последних цен и анализ сбрасываются при обновлении цен в этом процессе;
+    # таймаут ограничивает устаревание в остальных воркерах
+    app.config['PRICE_SNAPSHOT_CACHE_SECONDS'] = int(os.getenv('PRICE_SNAPSHOT_CACHE_SECONDS', '60'))
+    app.config['ANALYSIS_CACHE_SECONDS'] = int(os.getenv('ANALYSIS_CACHE_SECONDS', '300'))
+
+    # Ночной пакетный анализ всех металлов и окон (см. app/tasks/analytics.py); сохраненный анализ
+    # отдается API, пока он не старше ANALYSIS_FRESH_SECONDS и после него не было новых цен
+    app.config['ANALYTICS_BATCH_ENABLED'] = os.getenv('ANALYTICS_BATCH_ENABLED', '1') == '1'
+    app.config['ANALYTICS_WORKERS'] = int(os.getenv('ANALYTICS_WORKERS', '0'))  # 0 - по числу CPU
+    app.config['ANALYSIS_FRESH_SECONDS'] = int(os.getenv('ANALYSIS_FRESH_SECONDS', str(26 * 3600)))
+
+    # Повторные POST /api/metals/update в течение этого окна не запускают новый парсинг
+    app.config['MANUAL_UPDATE_DEBOUNCE_SECONDS'] = float(os.getenv('MANUAL_UPDATE_DEBOUNCE_SECONDS', '30'))
+
+    # Кэш результатов /api/metals/history (см. app/services/history_cache.py); 0 - выключен
+    app.config['HISTORY_CACHE_SECONDS'] = int(os.getenv('HISTORY_CACHE_SECONDS', '300'))
+    app.config['HISTORY_CACHE_MAX_POINTS'] = int(os.getenv('HISTORY_CACHE_MAX_POINTS', '2000000'))
+
+    # /api/metals/dashboard: потоков для параллельных подзапросов и максимум подзапросов
+    app.config['DASHBOARD_WORKERS'] = int(os.getenv('DASHBOARD_WORKERS', '4'))
+    app.config['DASHBOARD_MAX_QUERIES'] = int(os.getenv('DASHBOARD_MAX_QUERIES', '50'))
+
+    # /api/portfolio/valuation: максимум позиций и максимальная длина периода ряда стоимости
+    app.config['PORTFOLIO_MAX_HOLDINGS'] = int(os.getenv('PORTFOLIO_MAX_HOLDINGS', '100'))
+    app.config['PORTFOLIO_MAX_DAYS'] = int(os.getenv('PORTFOLIO_MAX_DAYS', '3660'))
+
+    # Максимум пар (metal, timestamp) в одном запросе POST /api/metals/as-of
+    app.config['AS_OF_MAX_QUERIES'] = int(os.getenv('AS_OF_MAX_QUERIES', '10000'))
+
+    # Оповещения о ценах (см. app/services/alert_engine.py): приемник log, file или queue
+    app.config['ALERTS_ENABLED'] = os.getenv('ALERTS_ENABLED', '1') == '1'
+    app.config['ALERT_SINK'] = os.getenv('ALERT_SINK', 'log')
+    app.config['ALERT_SINK_PATH'] = os.getenv('ALERT_SINK_PATH', os.path.join(app.instance_path, 'alerts.jsonl'))
+    app.config['ALERT_QUEUE_SIZE'] = int(os.getenv('ALERT_QUEUE_SIZE', '1000'))
+
+    # Прогноз цен (см. app/services/forecast_service.py): пересчет после записи цен и ночью, чтение из кэша
+    app.config['FORECAST_ON_INGEST'] = os.getenv('FORECAST_ON_INGEST', '1') == '1'
+    app.config['FORECAST_WINDOW_DAYS'] = int(os.getenv('FORECAST_WINDOW_DAYS', '90'))
+    app.config['FORECAST_HORIZON_DAYS'] = int(os.getenv('FORECAST_HORIZON_DAYS', '7'))
+    app.config['FORECAST_ALPHA'] = float(os.getenv('FORECAST_ALPHA', '0.3'))
+    app.config['FORECAST_BETA'] = float(os.getenv('FORECAST_BETA', '0.1'))
+    app.config['FORECAST_CONFIDENCE'] = float(os.getenv('FORECAST_CONFIDENCE', '0.95'))
+    app.config['FORECAST_MIN_POINTS'] = int(os.getenv('FORECAST_MIN_POINTS', '10'))
+    app.config['FORECAST_CACHE_SECONDS'] = int(os.getenv('FORECAST_CACHE_SECONDS', '300'))
+
+    # Фильтр аномальных цен при загрузке (см. app/services/price_filter.py): выбросы - в QuarantinedPrice
+    app.config['ANOMALY_FILTER_ENABLED'] = os.getenv('ANOMALY_FILTER_ENABLED', '1') == '1'
+    app.config['ANOMALY_ALPHA'] = float(os.getenv('ANOMALY_ALPHA', '0.05'))
+    app.config['ANOMALY_Z'] = float(os.getenv('ANOMALY_Z', '6'))
+    app.config['ANOMALY_MIN_CHANGE_PERCENT'] = float(os.getenv('ANOMALY_MIN_CHANGE_PERCENT', '5'))
+    app.config['ANOMALY_WARMUP'] = int(os.getenv('ANOMALY_WARMUP', '20'))
+    app.config['ANOMALY_SEED_ROWS'] = int(os.getenv('ANOMALY_SEED_ROWS', '100'))
+
+    # Очередь фоновых задач: обновления и загрузка истории (см. app/tasks/jobs.py)
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', '2'))
+    app.config['JOB_MAX_PENDING'] = int(os.getenv('JOB_MAX_PENDING', '100'))
+    app.config['JOB_HISTORY_SIZE'] = int(os.getenv('JOB_HISTORY_SIZE', '200'))
+    # Незавершенная задача без обновлений дольше этого считается потерянной (воркер упал)
+    app.config['JOB_STALE_SECONDS'] = float(os.getenv('JOB_STALE_SECONDS', '3600'))
+
+    # Прогрев кэшей при старте воркера (см. app/tasks/warmup.py), готовность - /api/ready
+    app.config['WARMUP_ENABLED'] = os.getenv('WARMUP_ENABLED', '0') == '1'
+    app.config['WARMUP_CURRENCIES'] = os.getenv('WARMUP_CURRENCIES', 'RUB,EUR')
+
+    # In-memory хранилище истории цен (см. app/services/price_store.py)
+    app.config['PRICE_STORE_ENABLED'] = os.getenv('PRICE_STORE_ENABLED', '0') == '1'
+    app.config['PRICE_STORE_REFRESH_SECONDS'] = float(os.getenv('PRICE_STORE_REFRESH_SECONDS', '60'))
+
+    # Бинарный архив истории для чтения через mmap (см. app/services/history_archive.py)
+    app.config['HISTORY_ARCHIVE_PATH'] = os.getenv('HISTORY_ARCHIVE_PATH')
+    app.config['HISTORY_ARCHIVE_MAX_TAIL'] = int(os.getenv('HISTORY_ARCHIVE_MAX_TAIL', '4096'))
     
+    phase_started = _mark(timings, 'config', phase_started)
+
     # Initialize CORS
     CORS(app)
     
     # Initialize extensions with app
     db.init_app(app)
-    ma.init_app(app)
+    from app.services.price_stream import price_stream_hub
+    price_stream_hub.init_app(app)
+    if app.config['SQLITE_PRODUCTION_MODE']:
+        init_sqlite_production_mode(app, db)
     cache.init_app(app)
+    init_job_queue(app)
+
+    phase_started = _mark(timings, 'extensions', phase_started)
 
     # Route to serve the frontend
     @app.route('/')
@@ -97,31 +243,118 @@ def create_app():
     # Register blueprints
     from app.routes import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
+
+    from app.cli import register_commands
+    register_commands(app)
     
-    # Create database tables
+    phase_started = _mark(timings, 'blueprints', phase_started)
+
     with app.app_context():
-        db.create_all()
-        
-        # Initialize metals if they don't exist
-        from app.models.metal import Metal
-        if not Metal.query.first():
-            initial_metals = [
-                Metal(symbol='GOLD', name='Gold', unit='USD/oz'),
-                Metal(symbol='SILVER', name='Silver', unit='USD/oz'),
-                Metal(symbol='PLATINUM', name='Platinum', unit='USD/oz'),
-                Metal(symbol='PALLADIUM', name='Palladium', unit='USD/oz')
-            ]
-            db.session.add_all(initial_metals)
-            db.session.commit()
+        if app.config['DB_AUTO_INIT']:
+            init_database(app)
+            phase_started = _mark(timings, 'database', phase_started)
+
+        if app.config['PRICE_STORE_ENABLED']:
+            init_price_store(app)
+        if app.config['HISTORY_ARCHIVE_PATH']:
+            init_history_archive(app)
+        if app.config['PRICE_STORE_ENABLED'] or app.config['HISTORY_ARCHIVE_PATH']:
+            _mark(timings, 'series_sources', phase_started)
+
+    if app.config['WARMUP_ENABLED']:
+        from app.tasks.warmup import start_warmup
+        start_warmup(app)
+
+    if app.config['PRICE_UPDATER_ENABLED'] and _is_server_process():
+        init_price_updater(app)
+
+    timings['create_app'] = round((time.perf_counter() - started) * 1000, 1)
+    app.extensions['startup_timings'] = timings
+    logger.info(f"Startup timings, ms: {timings}")
     
     return app
 
+def init_database(app):
+    """Create the tables and seed the initial metals (must run inside an app context)."""
+    # Models must be imported for create_all to see their tables
+    from app.models.exchange_rate import ExchangeRate  # noqa: F401
+    from app.models.alert import PriceAlert  # noqa: F401
+    from app.models.job import BackgroundJob  # noqa: F401
+    from app.models.price_change import PriceChange  # noqa: F401
+    db.create_all()
+    upgrade_schema()
+    # PostgreSQL: metal_price секционируется по месяцам (PRICE_PARTITIONING=1)
+    from app.tasks.partitions import init_price_partitions
+    init_price_partitions(app)
+
+    # Initialize metals if they don't exist
+    from app.models.metal import Metal
+    if not Metal.query.first():
+        initial_metals = [
+            Metal(symbol='GOLD', name='Gold', unit='USD/oz'),
+            Metal(symbol='SILVER', name='Silver', unit='USD/oz'),
+            Metal(symbol='PLATINUM', name='Platinum', unit='USD/oz'),
+            Metal(symbol='PALLADIUM', name='Palladium', unit='USD/oz')
+        ]
+        db.session.add_all(initial_metals)
+        db.session.commit()
+
+# Колонки, добавленные в уже существующие таблицы: (таблица, колонка, тип в DDL)
+SCHEMA_UPGRADES = [
+    ('metal_analysis', 'window_days', 'INTEGER'),
+]
+
+def upgrade_schema():
+    """Add columns introduced after a table was created (create_all does not alter existing tables)."""
+    from sqlalchemy import inspect, text
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    for table, column, ddl in SCHEMA_UPGRADES:
+        if table in tables and column not in {c['name'] for c in inspector.get_columns(table)}:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+            db.session.commit()
+            logger.info(f"Добавлена колонка {table}.{column}")
+
+def init_price_store(app):
+    """Load price history into the in-memory series store."""
+    from app.services.price_store import PriceSeriesStore
+    store = PriceSeriesStore(refresh_interval=app.config['PRICE_STORE_REFRESH_SECONDS'])
+    store.load()
+    app.extensions['price_store'] = store
+    return store
+
+def init_history_archive(app):
+    """Open (building it from the database if missing) the mmap history archive."""
+    from app.services.history_archive import HistoryArchive, build_from_db
+    path = app.config['HISTORY_ARCHIVE_PATH']
+    if not os.path.exists(path):
+        build_from_db(path)
+    archive = HistoryArchive(path, max_tail=app.config['HISTORY_ARCHIVE_MAX_TAIL'])
+    app.extensions['history_archive'] = archive
+    return archive
+
+def init_job_queue(app):
+    """Create the background job queue (worker threads start on the first submitted job)."""
+    from app.tasks.jobs import create_job_queue
+    queue = create_job_queue(app)
+    app.extensions['job_queue'] = queue
+    return queue
+
+def _is_server_process():
+    """False для CLI-команд flask (init-db, compact-prices, ...): им фоновое обновление цен не нужно."""
+    if os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+        return True
+    import click
+    context = click.get_current_context(silent=True)
+    return context is not None and context.info_name == 'run'
+
 def init_price_updater(app):
     """Initialize and start the price updater."""
     global price_updater
     from app.tasks.price_updater import PriceUpdater
     try:
-        price_updater = PriceUpdater(app)
+        price_updater = PriceUpdater(app, update_interval=app.config['UPDATER_BASE_INTERVAL'],
+                                     lock_path=app.config['PRICE_UPDATER_LOCK_PATH'])
         price_updater.start()
     except ValueError as e:
-        print(f"Warning: Price updater not started: {e}") 
\ No newline at end of file
+        logger.warning(f"Price updater not started: {e}")
\ No newline at end of file
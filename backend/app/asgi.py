@@ -0,0 +1,262 @@
+"""ASGI entry point with non-blocking read endpoints.
+
+    uvicorn --factory app.asgi:create_asgi_app --workers 2
+
+GET /api/metals/current, /api/metals/history and /api/metals/analysis are served natively
+on the event loop (async DB driver, httpx for exchange rates), so one process can wait on many
+slow upstream calls at once. The SSE stream /api/metals/stream is served on the event loop too:
+an idle subscriber costs a queue, not a thread. Every other route (updates, jobs, health,
+frontend) is delegated to the regular Flask app on a bounded thread pool.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs
+import asyncio
+import json
+import logging
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """Один WSGI-запрос, выполняемый в потоке заданного пула."""
+
+    def __init__(self, wsgi_application, duplicate_header_limit, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._run_wsgi_app, body)
+
+    def _run_wsgi_app(self, body) -> None:
+        """Выполнить Flask-приложение и отправить ответ (в потоке пула, как run_wsgi_app asgiref)."""
+        try:
+            environ = self.build_environ(self.scope, body)
+        except ValueError:
+            # Слишком много повторяющихся заголовков
+            self.sync_send({'type': 'http.response.start', 'status': 400,
+                            'headers': [(b'content-type', b'text/plain')]})
+            self.sync_send({'type': 'http.response.body', 'body': b'Bad Request: Too many duplicate headers'})
+            return
+        bytes_sent = 0
+        for output in self.wsgi_application(environ, self.start_response):
+            if not self.response_started:
+                self.response_started = True
+                self.sync_send(self.response_start)
+            if self.response_content_length is not None:
+                # Не больше, чем объявлено в Content-Length
+                output = output[:self.response_content_length - bytes_sent]
+            self.sync_send({'type': 'http.response.body', 'body': output, 'more_body': True})
+            bytes_sent += len(output)
+            if bytes_sent == self.response_content_length:
+                break
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+class _PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi, running Flask on a thread pool.
+
+    asgiref runs sync code with thread_sensitive=True by default, i.e. every WSGI request
+    in one shared thread, which would serialize the whole Flask app.
+    """
+
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        instance = _PooledWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit, self.executor)
+        await instance(scope, receive, send)
+
+
+class MetalsASGI:
+    """ASGI application: async read endpoints plus the Flask app for everything else."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(max_workers=flask_app.config['ASGI_WSGI_THREADS'],
+                                           thread_name_prefix='wsgi')
+        self.wsgi = _PooledWsgiToAsgi(flask_app, self.executor)
+        self.service = None
+        self.routes = {
+            '/api/metals/current': self.get_current_prices,
+            '/api/metals/history': self.get_historical_prices,
+            '/api/metals/analysis': self.get_metal_analysis,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/api/metals/stream':
+            # Не через пул потоков: каждый SSE-клиент занимал бы поток пула на все время подключения
+            return await self.stream_prices(receive, send)
+        handler = self.routes.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        args = {key: values[0] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()} \
+            if handler else {}
+        if handler == self.get_historical_prices and (args.get('resolution', 'raw') != 'raw'
+                                                      or self._wants_compact(scope, args)):
+            # Прореженную историю и компактный формат отдает Flask (с кэшем диапазонов)
+            handler = None
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+        if self.service is None:
+            await self.startup()
+        status, payload = await handler(args)
+        await self._send_json(send, status, payload)
+
+    async def startup(self):
+        from app import db
+        from app.services.async_metal_service import AsyncMetalService, create_async_engine_for_app
+        from app.services.exchange_rate_service import AsyncExchangeRateClient
+
+        if self.service is not None:
+            return
+        with self.flask_app.app_context():
+            engine = create_async_engine_for_app(self.flask_app, db.engine)
+        self.service = AsyncMetalService(self.flask_app, engine, AsyncExchangeRateClient(engine))
+
+    async def shutdown(self):
+        if self.service is not None:
+            await self.service.engine.dispose()
+            await self.service.fx_client.aclose()
+            self.service = None
+        self.executor.shutdown(wait=False)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def stream_prices(self, receive, send):
+        """Server-Sent Events, как GET /api/metals/stream во Flask, но на event loop."""
+        from app.services.price_stream import AsyncSubscription, price_stream_hub
+
+        loop = asyncio.get_running_loop()
+        subscription = price_stream_hub.subscribe(lambda: AsyncSubscription(price_stream_hub.max_queue, loop))
+        if subscription is None:
+            return await self._send_json(send, 503, {'status': 'error',
+                                                     'message': 'Превышено число подключений к потоку цен'})
+        heartbeat = self.flask_app.config['PRICE_STREAM_HEARTBEAT_SECONDS']
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'access-control-allow-origin', b'*'),
+            ]})
+            await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+            while True:
+                getter = asyncio.ensure_future(subscription.get(heartbeat))
+                await asyncio.wait({getter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    getter.cancel()
+                    return
+                message = getter.result()
+                if message is None:
+                    # Клиент не успевал читать и был отключен; EventSource переподключится сам
+                    break
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            price_stream_hub.unsubscribe(subscription)
+            disconnected.cancel()
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    @staticmethod
+    def _wants_compact(scope, args) -> bool:
+        from werkzeug.datastructures import MIMEAccept
+        from werkzeug.http import parse_accept_header
+        from app.services.series_codec import negotiate
+
+        accept = b', '.join(value for name, value in scope['headers'] if name == b'accept').decode('latin-1')
+        return negotiate(parse_accept_header(accept, MIMEAccept), args.get('format')) is not None
+
+    @staticmethod
+    async def _send_json(send, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            # То же, что добавляет Flask-CORS для синхронных маршрутов
+            (b'access-control-allow-origin', b'*'),
+        ]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # Обработчики повторяют коды ответов и сообщения app/routes/metal_routes.py
+
+    async def get_current_prices(self, args):
+        try:
+            prices = await self.service.get_current_prices(target_currency=args.get('currency'))
+            return 200, {'status': 'success', 'data': prices}
+        except ValueError as ve:
+            return 400, {'status': 'error', 'message': str(ve)}
+        except Exception as e:
+            logger.error(f"Unexpected error in /metals/current: {e}", exc_info=True)
+            return 500, {'status': 'error', 'message': "Внутренняя ошибка сервера при получении текущих цен."}
+
+    async def get_historical_prices(self, args):
+        try:
+            metal = args.get('metal', '').upper()
+            date_from_str = args.get('date_from')
+            date_to_str = args.get('date_to')
+            if not all([metal, date_from_str, date_to_str]):
+                return 400, {'status': 'error', 'message': 'Missing required parameters: metal, date_from, date_to'}
+            try:
+                date_from = datetime.fromisoformat(date_from_str)
+                date_to = datetime.fromisoformat(date_to_str)
+            except ValueError:
+                return 400, {'status': 'error', 'message': 'Invalid date format. Use ISO format (YYYY-MM-DD)'}
+            prices = await self.service.get_historical_prices(metal, date_from, date_to)
+            return 200, {'status': 'success', 'data': prices}
+        except Exception as e:
+            return 500, {'status': 'error', 'message': str(e)}
+
+    async def get_metal_analysis(self, args):
+        from app.services.metal_service import ANALYSIS_WINDOWS, DEFAULT_ANALYSIS_WINDOW
+
+        try:
+            metal = args.get('metal', '').upper()
+            if not metal:
+                return 400, {'status': 'error', 'message': 'Missing required parameter: metal'}
+            try:
+                window = int(args.get('window', DEFAULT_ANALYSIS_WINDOW))
+            except ValueError:
+                window = None
+            if window not in ANALYSIS_WINDOWS:
+                return 400, {'status': 'error',
+                             'message': f"Invalid window. Use one of: {', '.join(map(str, ANALYSIS_WINDOWS))}"}
+            analysis = await self.service.analyze_metal(metal, window)
+            if not analysis:
+                return 404, {'status': 'error', 'message': f'No data available for metal: {metal}'}
+            return 200, {'status': 'success', 'data': analysis}
+        except Exception as e:
+            return 500, {'status': 'error', 'message': str(e)}
+
+
+def create_asgi_app(flask_app=None) -> MetalsASGI:
+    """Factory for uvicorn (--factory app.asgi:create_asgi_app)."""
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    return MetalsASGI(flask_app)
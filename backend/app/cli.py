@@ -0,0 +1,95 @@
+import json
+import click
+from flask import current_app
+
+
+def register_commands(app):
+    """Register the application's Flask CLI commands (flask --app run <command>)."""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Создать таблицы и начальный список металлов (при DB_AUTO_INIT=0 это не делается при старте)."""
+        from app import init_database
+
+        init_database(app)
+        click.echo('Схема базы данных создана, металлы добавлены.')
+
+    @app.cli.command('partition-prices')
+    @click.option('--convert', is_flag=True, help='Перевести существующую metal_price на месячные секции.')
+    @click.option('--keep-old', is_flag=True, help='При --convert оставить старую таблицу как metal_price_unpartitioned.')
+    @click.option('--drop-expired', is_flag=True, help='Удалить секции старше PRICE_PARTITION_RETENTION_MONTHS.')
+    @click.option('--explain', 'explain_metal', default=None, help='Показать, какие секции читает запрос истории металла.')
+    @click.option('--days', type=int, default=30, help='Период запроса истории для --explain, дней.')
+    def partition_prices(convert, keep_old, drop_expired, explain_metal, days):
+        """PostgreSQL: секции metal_price по месяцам - перевод, создание вперед, удаление старых."""
+        from datetime import datetime, timedelta
+        from app import db
+        from app.models.metal import Metal
+        from app.tasks.partitions import price_partitions_from_config
+
+        if db.engine.dialect.name != 'postgresql':
+            raise click.UsageError('Секционирование metal_price поддерживается только для PostgreSQL.')
+        partitions = price_partitions_from_config(current_app.config)
+        report = {}
+        if convert:
+            report['convert'] = partitions.convert(keep_old=keep_old)
+        elif not partitions.is_partitioned():
+            raise click.UsageError('metal_price не секционирована: запустите с --convert.')
+        report['created'] = partitions.ensure()
+        if drop_expired:
+            report['drop_expired'] = partitions.drop_expired()
+        if explain_metal:
+            metal = Metal.query.filter_by(symbol=explain_metal.upper()).first()
+            if not metal:
+                raise click.UsageError(f'Неизвестный металл: {explain_metal}')
+            end = datetime.utcnow()
+            report['explain'] = partitions.explain_history(metal.id, end - timedelta(days=days), end)
+        report['partitions'] = partitions.partitions()
+        click.echo(json.dumps(report, ensure_ascii=False, indent=2))
+
+    @app.cli.command('forecast-metals')
+    @click.option('--metals', default=None, help='Символы металлов через запятую (по умолчанию все).')
+    def forecast_metals(metals):
+        """Пересчитать прогнозы цен металлов и сохранить их в MetalForecast."""
+        from app.services.forecast_service import forecast_batch_from_config
+
+        try:
+            batch = forecast_batch_from_config(current_app.config)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        symbols = [symbol.strip() for symbol in metals.split(',')] if metals else None
+        click.echo(json.dumps(batch.run(symbols), ensure_ascii=False, indent=2))
+
+    @app.cli.command('compact-prices')
+    @click.option('--days', type=int, default=None, help='Хранить тики за последние N дней (по умолчанию RETENTION_DAYS).')
+    @click.option('--batch-size', type=int, default=None, help='Строк на одно удаление/коммит.')
+    @click.option('--dry-run', is_flag=True, help='Только показать, сколько строк и байт будет освобождено.')
+    @click.option('--enable-incremental-vacuum', is_flag=True,
+                  help='Однократно перевести SQLite в auto_vacuum=INCREMENTAL (выполняет полный VACUUM).')
+    def compact_prices(days, batch_size, dry_run, enable_incremental_vacuum):
+        """Свернуть старые внутридневные тики MetalPrice в дневные OHLC строки."""
+        from app.tasks.retention import RetentionJob
+
+        days = days or current_app.config.get('RETENTION_DAYS')
+        if not days:
+            raise click.UsageError('Укажите --days или переменную окружения RETENTION_DAYS.')
+        if enable_incremental_vacuum:
+            RetentionJob.enable_incremental_vacuum()
+        job = RetentionJob(days, batch_size=batch_size or current_app.config['RETENTION_BATCH_SIZE'],
+                           vacuum_pages=current_app.config['RETENTION_VACUUM_PAGES'])
+        click.echo(json.dumps(job.run(dry_run=dry_run), ensure_ascii=False, indent=2))
+
+    @app.cli.command('analyze-metals')
+    @click.option('--windows', default=None, help='Окна в днях через запятую (по умолчанию 7,30,90,365).')
+    @click.option('--workers', type=int, default=None, help='Процессов пула (по умолчанию ANALYTICS_WORKERS или число CPU).')
+    def analyze_metals(windows, workers):
+        """Посчитать анализ всех металлов по всем окнам и сохранить его в MetalAnalysis."""
+        from app.services.metal_service import ANALYSIS_WINDOWS
+        from app.tasks.analytics import AnalyticsBatch
+
+        try:
+            window_list = [int(value) for value in windows.split(',')] if windows else ANALYSIS_WINDOWS
+            batch = AnalyticsBatch(window_list, workers=workers or current_app.config['ANALYTICS_WORKERS'] or None)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        click.echo(json.dumps(batch.run(), ensure_ascii=False, indent=2))
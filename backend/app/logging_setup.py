@@ -0,0 +1,208 @@
+"""Логирование приложения: асинхронная запись через очередь, JSON-записи с request id, сэмплирование.
+
+- Записи кладутся в ограниченную очередь (QueueHandler), а пишет их в stdout отдельный поток
+  QueueListener, поэтому медленный stdout/сборщик логов не попадает в задержку запроса. Если
+  очередь переполнена, запись отбрасывается (счетчик dropped), а не блокирует поток.
+- LOG_FORMAT=json - одна JSON-строка на запись: ts, level, logger, message, request_id и поля
+  из extra={...}; text - прежний человекочитаемый формат.
+- request_id берется из заголовка X-Request-ID или генерируется для каждого запроса,
+  возвращается в ответе и переносится в фоновые задачи, запущенные запросом.
+- Сообщения о каждой строке (extra={'per_row': True}) управляются LOG_ROW_MODE: all - все,
+  sample - не больше LOG_ROW_RATE в секунду с каждого места вызова (число пропущенных
+  попадает в поле suppressed следующей записи), summary - только итоговые записи по пачке.
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import uuid
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+ROW_MODES = ('all', 'sample', 'summary')
+
+request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+
+# Атрибуты любой LogRecord; остальные атрибуты записи пришли из extra и попадают в JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_plain = logging.Formatter()
+_listener: Optional[QueueListener] = None
+_handler: Optional['DroppingQueueHandler'] = None
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Добавляет request_id текущего запроса или задачи (выполняется в потоке, который пишет лог)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RowSamplingFilter(logging.Filter):
+    """Ограничивает сообщения о каждой строке (per_row=True) по режиму LOG_ROW_MODE.
+
+    В режиме sample у каждого места вызова (logger, строка) свой token bucket на rate
+    сообщений в секунду; остальные записи отбрасываются до форматирования и очереди.
+    """
+
+    def __init__(self, mode: str = 'sample', rate: float = 10.0):
+        super().__init__()
+        if mode not in ROW_MODES:
+            raise ValueError(f"Unknown LOG_ROW_MODE: {mode}. Use one of: {', '.join(ROW_MODES)}")
+        self.mode = mode
+        self.rate = rate
+        self._lock = threading.Lock()
+        # (logger, lineno) -> [токены, время последнего пополнения, пропущено]
+        self._buckets: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'per_row', False) or self.mode == 'all':
+            return True
+        if self.mode == 'summary':
+            return False
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault((record.name, record.lineno), [self.rate, now, 0])
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed, bucket[2] = bucket[2], 0
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который при переполненной очереди отбрасывает запись, а не ждет."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и traceback вычисляются в потоке вызова (args и exc_info могут измениться
+        # позже), но без форматирования - его делает поток QueueListener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            payload['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key != 'per_row':
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if getattr(record, 'request_id', None):
+            line = f"{line} [request_id={record.request_id}]"
+        if getattr(record, 'suppressed', None):
+            line = f"{line} (+{record.suppressed} similar suppressed)"
+        return line
+
+
+def init_logging(app) -> None:
+    """Настроить корневой логгер процесса по конфигурации app (повторный вызов перенастраивает его)."""
+    global _listener, _handler
+    config = app.config
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if config['LOG_FORMAT'] == 'json' else TextFormatter())
+    if config['LOG_ASYNC']:
+        _handler = DroppingQueueHandler(queue.Queue(maxsize=config['LOG_QUEUE_SIZE']))
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=False)
+        _listener.start()
+    else:
+        # Синхронная запись (отладка): тот же интерфейс, очередь не используется
+        _handler, _listener = output, _NullListener()
+    _handler.addFilter(RequestIdFilter())
+    _handler.addFilter(RowSamplingFilter(config['LOG_ROW_MODE'], config['LOG_ROW_RATE']))
+    root.addHandler(_handler)
+    root.setLevel(config['LOG_LEVEL'])
+
+    app.before_request(_assign_request_id)
+    app.after_request(_echo_request_id)
+    app.teardown_request(_clear_request_id)
+
+
+class _NullListener:
+    def stop(self) -> None:
+        pass
+
+
+def _assign_request_id() -> None:
+    from flask import request
+    request_id_var.set(request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex)
+
+
+def _echo_request_id(response):
+    request_id = request_id_var.get()
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+def _clear_request_id(exc) -> None:
+    # Поток сервера переиспользуется: записи вне запроса не должны получить id прошлого запроса
+    request_id_var.set(None)
+
+
+def dropped_records() -> int:
+    """Сколько записей отброшено из-за переполненной очереди логов."""
+    return getattr(_handler, 'dropped', 0)
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    # QueueListener.stop() дописывает оставшиеся в очереди записи
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,47 @@
+from datetime import datetime
+from app import db
+
+def alert_levels(condition, threshold, percent, reference_price):
+    """Price levels that trigger an alert: [('above', level), ('below', level)]."""
+    if condition == 'move':
+        return [('above', reference_price * (1 + percent / 100)),
+                ('below', reference_price * (1 - percent / 100))]
+    return [(condition, threshold)]
+
+class PriceAlert(db.Model):
+    """User alert on a metal price: a fixed threshold or a percent move from a reference price."""
+    id = db.Column(db.Integer, primary_key=True)
+    metal_id = db.Column(db.Integer, db.ForeignKey('metal.id'), nullable=False)
+    condition = db.Column(db.String(10), nullable=False)  # 'above', 'below', 'move'
+    threshold = db.Column(db.Float)  # уровень для above/below
+    percent = db.Column(db.Float)  # изменение в процентах для move
+    reference_price = db.Column(db.Float)  # цена, от которой считается move
+    note = db.Column(db.String(200))
+    active = db.Column(db.Boolean, nullable=False, default=True, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    triggered_at = db.Column(db.DateTime)
+    triggered_price = db.Column(db.Float)
+
+    metal = db.relationship('Metal')
+
+    def levels(self):
+        return alert_levels(self.condition, self.threshold, self.percent, self.reference_price)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'metal': self.metal.symbol,
+            'condition': self.condition,
+            'threshold': self.threshold,
+            'percent': self.percent,
+            'reference_price': self.reference_price,
+            'levels': {side: round(level, 6) for side, level in self.levels()},
+            'note': self.note,
+            'active': self.active,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'triggered_at': self.triggered_at.isoformat() if self.triggered_at else None,
+            'triggered_price': self.triggered_price
+        }
+
+    def __repr__(self):
+        return f'<PriceAlert {self.id} {self.condition} on {self.metal_id}>'
@@ -0,0 +1,15 @@
+from datetime import datetime
+from app import db
+
+class ExchangeRate(db.Model):
+    """Daily exchange rate table from one base currency, as returned by the 'latest' API endpoint."""
+    __table_args__ = (db.UniqueConstraint('base', 'date', name='uq_exchange_rate_base_date'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    base = db.Column(db.String(3), nullable=False)  # e.g., 'USD'
+    date = db.Column(db.Date, nullable=False, index=True)  # дата, на которую API опубликовал курсы
+    rates = db.Column(db.Text, nullable=False)  # JSON {"RUB": 77.94, "EUR": 0.8587, ...}
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ExchangeRate {self.base} on {self.date}>'
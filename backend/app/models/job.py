@@ -0,0 +1,26 @@
+from datetime import datetime
+from app import db
+
+class BackgroundJob(db.Model):
+    """Background job state shared by all worker processes (see app/tasks/jobs.py)."""
+    id = db.Column(db.String(32), primary_key=True)
+    type = db.Column(db.String(20), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON
+    # Хэш типа и параметров, пока задача в очереди или выполняется; NULL после завершения.
+    # Уникальность не дает двум воркерам поставить одну и ту же задачу одновременно.
+    active_key = db.Column(db.String(40), unique=True)
+    key_hash = db.Column(db.String(40), nullable=False, index=True)
+    request_id = db.Column(db.String(64))
+    status = db.Column(db.String(10), nullable=False, index=True)  # 'queued', 'running', 'succeeded', 'failed'
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    message = db.Column(db.String(200))
+    rows = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(100))  # host:pid процесса, выполняющего задачу
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.type}: {self.status}>'
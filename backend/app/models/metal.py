@@ -27,6 +27,23 @@ class MetalPrice(db.Model):
     def __repr__(self):
         return f'<MetalPrice {self.metal_id} at {self.timestamp}>'
 
+class MetalPriceDaily(db.Model):
+    """Daily OHLC aggregate of intraday ticks compacted by the retention job."""
+    __table_args__ = (db.UniqueConstraint('metal_id', 'date', name='uq_metal_price_daily_metal_date'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    metal_id = db.Column(db.Integer, db.ForeignKey('metal.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    tick_count = db.Column(db.Integer, nullable=False)  # сколько тиков было свернуто в эту строку
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MetalPriceDaily {self.metal_id} on {self.date}>'
+
 class MetalAnalysis(db.Model):
     """Model for storing metal price analysis."""
     id = db.Column(db.Integer, primary_key=True)
@@ -34,9 +51,55 @@ class MetalAnalysis(db.Model):
     trend = db.Column(db.String(20), nullable=False)  # 'up', 'down', 'unchanged'
     volatility = db.Column(db.String(20), nullable=False)  # 'high', 'medium', 'low'
     sentiment = db.Column(db.String(20), nullable=False)  # 'positive', 'negative', 'neutral'
+    window_days = db.Column(db.Integer)  # длина окна анализа в днях (NULL у строк до появления окон - 30)
     period_start = db.Column(db.DateTime, nullable=False)
     period_end = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
-        return f'<MetalAnalysis {self.metal_id} for {self.period_start} to {self.period_end}>' 
\ No newline at end of file
+        return f'<MetalAnalysis {self.metal_id} for {self.period_start} to {self.period_end}>' 
+
+class MetalForecast(db.Model):
+    """Latest short-horizon forecast of a metal (one row per metal, replaced by each forecast batch)."""
+    id = db.Column(db.Integer, primary_key=True)
+    metal_id = db.Column(db.Integer, db.ForeignKey('metal.id'), nullable=False, unique=True)
+    as_of = db.Column(db.Date, nullable=False)  # последний день ряда, по которому строился прогноз
+    window_days = db.Column(db.Integer, nullable=False)
+    horizon_days = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON: прогнозы моделей с доверительными интервалами
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MetalForecast {self.metal_id} as of {self.as_of}>'
+
+class QuarantinedPrice(db.Model):
+    """Price rejected by the ingest anomaly filter, kept for review instead of MetalPrice."""
+    id = db.Column(db.Integer, primary_key=True)
+    metal_id = db.Column(db.Integer, db.ForeignKey('metal.id'), nullable=False)
+    price = db.Column(db.Float)  # NULL, если цена не разобрана как число
+    timestamp = db.Column(db.DateTime, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)  # 'invalid', 'outlier'
+    expected_price = db.Column(db.Float)  # ожидаемая цена по состоянию фильтра
+    score = db.Column(db.Float)  # отклонение в стандартных отклонениях
+    status = db.Column(db.String(10), nullable=False, default='pending', index=True)  # 'pending', 'released', 'rejected'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reviewed_at = db.Column(db.DateTime)
+
+    metal = db.relationship('Metal')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'metal': self.metal.symbol,
+            'price': self.price,
+            'timestamp': self.timestamp.isoformat(),
+            'reason': self.reason,
+            'expected_price': round(self.expected_price, 6) if self.expected_price is not None else None,
+            'score': round(self.score, 2) if self.score is not None else None,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'reviewed_at': self.reviewed_at.isoformat() if self.reviewed_at else None
+        }
+
+    def __repr__(self):
+        return f'<QuarantinedPrice {self.metal_id} at {self.timestamp}: {self.reason}>'
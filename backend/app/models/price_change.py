@@ -0,0 +1,13 @@
+from datetime import datetime
+from app import db
+
+class PriceChange(db.Model):
+    """Short-lived log of inserted and corrected prices, polled by the SSE hub of every worker."""
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(10), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)  # время цены (MetalPrice.timestamp)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<PriceChange {self.id} {self.symbol} at {self.timestamp}>'
@@ -4,4 +4,8 @@ api_bp = Blueprint('api', __name__)
 
 # Import routes after creating the blueprint to avoid circular imports
 from . import main_routes
-from . import metal_routes 
\ No newline at end of file
+from . import metal_routes 
+from . import job_routes
+from . import portfolio_routes
+from . import alert_routes
+from . import quarantine_routes
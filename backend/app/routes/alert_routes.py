@@ -0,0 +1,51 @@
+from flask import current_app, jsonify, request
+from . import api_bp
+from app.services.alert_engine import AlertService
+
+@api_bp.route('/alerts', methods=['POST'])
+def create_alert():
+    """Новое оповещение: {"metal": "GOLD", "condition": "above", "threshold": 2500}
+    или {"metal": "GOLD", "condition": "move", "percent": 3, "reference_price": 2400}.
+    """
+    try:
+        alert = AlertService.create(request.get_json(silent=True) or {})
+    except ValueError as ve:
+        return jsonify({
+            'status': 'error',
+            'message': str(ve)
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error in /alerts: {e}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': "Внутренняя ошибка сервера при создании оповещения."
+        }), 500
+    return jsonify({
+        'status': 'success',
+        'data': alert
+    }), 201
+
+@api_bp.route('/alerts', methods=['GET'])
+def list_alerts():
+    """Оповещения, новые первыми; фильтры ?metal=GOLD&active=1."""
+    active = request.args.get('active')
+    return jsonify({
+        'status': 'success',
+        'data': AlertService.list(metal=request.args.get('metal'),
+                                  active=None if active is None else active == '1',
+                                  limit=request.args.get('limit', 100, type=int))
+    }), 200
+
+@api_bp.route('/alerts/<int:alert_id>', methods=['DELETE'])
+def delete_alert(alert_id):
+    """Отключить оповещение (запись остается в истории)."""
+    alert = AlertService.deactivate(alert_id)
+    if alert is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Alert not found: {alert_id}'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'data': alert
+    }), 200
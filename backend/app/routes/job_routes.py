@@ -0,0 +1,26 @@
+from flask import jsonify, request
+from . import api_bp
+from app.tasks.jobs import get_job_queue
+
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Статус фоновой задачи: progress, rows, duration_seconds, error."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Job not found: {job_id}'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'data': job.to_dict()
+    }), 200
+
+@api_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Последние задачи всех воркеров, новые первыми."""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({
+        'status': 'success',
+        'data': [job.to_dict() for job in get_job_queue().recent(limit)]
+    }), 200
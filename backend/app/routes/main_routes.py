@@ -1,4 +1,4 @@
-from flask import jsonify, send_file
+from flask import current_app, jsonify, send_file
 from . import api_bp
 import os
 
@@ -13,4 +13,18 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'message': 'API is running'
-    }), 200 
\ No newline at end of file
+    }), 200 
+
+@api_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until the worker has warmed its caches (WARMUP_ENABLED=1)."""
+    warmup = current_app.extensions.get('warmup')
+    if warmup is not None and not warmup.ready.is_set():
+        return jsonify({
+            'status': 'warming_up',
+            'message': 'Worker is warming up caches'
+        }), 503
+    return jsonify({
+        'status': 'ready',
+        'warmup': warmup.report if warmup is not None else None
+    }), 200
\ No newline at end of file
@@ -1,7 +1,14 @@
-from datetime import datetime
-from flask import jsonify, request
+from datetime import datetime, timezone
+from flask import Response, current_app, jsonify, request, url_for
 from . import api_bp
-from app.services.metal_service import MetalService
+from app.models.metal import Metal
+from app.services.dashboard_service import DashboardService
+from app.services.forecast_service import ForecastService
+from app.services.metal_service import ANALYSIS_WINDOWS, DEFAULT_ANALYSIS_WINDOW, MetalService
+from app.services import series_codec
+from app.services.history_cache import RESOLUTIONS
+from app.services.price_stream import price_stream_hub
+from app.tasks.jobs import JobQueueFull, get_job_queue
 
 @api_bp.route('/metals/current', methods=['GET'])
 def get_current_prices():
@@ -48,11 +55,32 @@ def get_historical_prices():
                 'message': 'Invalid date format. Use ISO format (YYYY-MM-DD)'
             }), 400
 
-        prices = MetalService.get_historical_prices(metal, date_from, date_to)
+        resolution = request.args.get('resolution', 'raw')
+        if resolution not in RESOLUTIONS:
+            return jsonify({
+                'status': 'error',
+                'message': f"Invalid resolution. Use one of: {', '.join(RESOLUTIONS)}"
+            }), 400
+
+        mimetype = series_codec.negotiate(request.accept_mimetypes, request.args.get('format'))
+        if mimetype:
+            # Компактный формат: колонки с дельтами, можно несколько металлов через запятую
+            series = {}
+            for symbol in dict.fromkeys(symbol for symbol in metal.split(',') if symbol):
+                timestamps, prices = MetalService.get_historical_series(symbol, date_from, date_to, resolution)
+                series[symbol] = series_codec.encode_series(timestamps, prices)
+            body = series_codec.serialize({
+                'status': 'success',
+                'encoding': series_codec.ENCODING,
+                'data': series
+            }, mimetype)
+            return Response(body, mimetype=mimetype, headers={'Vary': 'Accept'})
+
+        prices = MetalService.get_historical_prices(metal, date_from, date_to, resolution)
         return jsonify({
             'status': 'success',
             'data': prices
-        }), 200
+        }), 200, {'Vary': 'Accept'}
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -61,7 +89,7 @@ def get_historical_prices():
 
 @api_bp.route('/metals/analysis', methods=['GET'])
 def get_metal_analysis():
-    """Get analysis for a specific metal."""
+    """Get analysis for a specific metal over ?window=7|30|90|365 days (default 30)."""
     try:
         metal = request.args.get('metal', '').upper()
         if not metal:
@@ -70,7 +98,14 @@ def get_metal_analysis():
                 'message': 'Missing required parameter: metal'
             }), 400
 
-        analysis = MetalService.analyze_metal(metal)
+        window = request.args.get('window', DEFAULT_ANALYSIS_WINDOW, type=int)
+        if window not in ANALYSIS_WINDOWS:
+            return jsonify({
+                'status': 'error',
+                'message': f"Invalid window. Use one of: {', '.join(map(str, ANALYSIS_WINDOWS))}"
+            }), 400
+
+        analysis = MetalService.analyze_metal(metal, window)
         if not analysis:
             return jsonify({
                 'status': 'error',
@@ -87,20 +122,212 @@ def get_metal_analysis():
             'message': str(e)
         }), 500
 
+@api_bp.route('/metals/forecast', methods=['GET'])
+def get_metal_forecast():
+    """Прогноз цены металла на FORECAST_HORIZON_DAYS дней: ?metal=GOLD&model=ewma|holt|log_linear (по умолчанию все модели)."""
+    metal = request.args.get('metal', '').upper()
+    if not metal:
+        return jsonify({
+            'status': 'error',
+            'message': 'Missing required parameter: metal'
+        }), 400
+    try:
+        forecast = ForecastService.get(metal, request.args.get('model'))
+    except ValueError as ve:
+        return jsonify({
+            'status': 'error',
+            'message': str(ve)
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error in /metals/forecast: {e}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': "Внутренняя ошибка сервера при получении прогноза."
+        }), 500
+    if not forecast:
+        return jsonify({
+            'status': 'error',
+            'message': f'No data available for metal: {metal}'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'data': forecast
+    }), 200
+
+@api_bp.route('/metals/as-of', methods=['POST'])
+def get_prices_as_of():
+    """Цены на моменты для пачки пар: {"queries": [{"metal": "GOLD", "timestamp": "..."}], "method": "previous", "currency": "RUB"}."""
+    payload = request.get_json(silent=True) or {}
+    queries = payload.get('queries')
+    if not isinstance(queries, list) or not queries:
+        return jsonify({
+            'status': 'error',
+            'message': 'Missing required parameter: queries'
+        }), 400
+    max_queries = current_app.config['AS_OF_MAX_QUERIES']
+    if len(queries) > max_queries:
+        return jsonify({
+            'status': 'error',
+            'message': f'Too many queries: {len(queries)} (max {max_queries})'
+        }), 400
+
+    pairs = []
+    for query in queries:
+        try:
+            moment = datetime.fromisoformat(query['timestamp'])
+            metal = query['metal'].upper()
+        except (KeyError, TypeError, AttributeError, ValueError):
+            return jsonify({
+                'status': 'error',
+                'message': f'Invalid query: {query}. Expected {{"metal": "GOLD", "timestamp": "YYYY-MM-DDTHH:MM:SS"}}'
+            }), 400
+        if moment.tzinfo is not None:
+            # Цены хранятся в naive UTC
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        pairs.append((metal, moment))
+
+    try:
+        prices = MetalService.get_prices_as_of(pairs, method=payload.get('method', 'previous'),
+                                               target_currency=payload.get('currency'))
+    except ValueError as ve:
+        return jsonify({
+            'status': 'error',
+            'message': str(ve)
+        }), 400
+    return jsonify({
+        'status': 'success',
+        'data': prices
+    }), 200
+
+@api_bp.route('/metals/dashboard', methods=['POST'])
+def get_dashboard():
+    """Несколько подзапросов за один запрос: {"currency": "RUB", "queries": [{"id": "prices", "type": "current"},
+    {"id": "gold", "type": "history", "metal": "GOLD", "date_from": "...", "date_to": "..."},
+    {"type": "analysis", "metal": "GOLD"}]}.
+    """
+    payload = request.get_json(silent=True) or {}
+    queries = payload.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(query, dict) for query in queries):
+        return jsonify({
+            'status': 'error',
+            'message': 'Missing required parameter: queries'
+        }), 400
+    max_queries = current_app.config['DASHBOARD_MAX_QUERIES']
+    if len(queries) > max_queries:
+        return jsonify({
+            'status': 'error',
+            'message': f'Too many queries: {len(queries)} (max {max_queries})'
+        }), 400
+    try:
+        results = DashboardService.run(queries, default_currency=payload.get('currency'))
+    except ValueError as ve:
+        return jsonify({
+            'status': 'error',
+            'message': str(ve)
+        }), 400
+    return jsonify({
+        'status': 'success',
+        'data': results
+    }), 200
+
+@api_bp.route('/metals/stream', methods=['GET'])
+def stream_prices():
+    """Server-Sent Events: новые цены публикуются сразу после записи в БД."""
+    subscription = price_stream_hub.subscribe()
+    if subscription is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Превышено число подключений к потоку цен'
+        }), 503
+    heartbeat = current_app.config['PRICE_STREAM_HEARTBEAT_SECONDS']
+
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    # Клиент не успевал читать и был отключен; EventSource переподключится сам
+                    break
+                yield message
+        finally:
+            price_stream_hub.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @api_bp.route('/metals/update', methods=['POST'])
 def update_metal_prices():
-    """Обновить цены на металлы."""
+    """Поставить обновление цен в очередь задач; статус - GET /api/jobs/<job_id>."""
     try:
-        MetalService.update_prices_from_parser()
+        job, created = get_job_queue().submit(
+            'update', reuse_for=current_app.config['MANUAL_UPDATE_DEBOUNCE_SECONDS'])
+    except JobQueueFull as e:
         return jsonify({
-            'status': 'success',
-            'message': 'Цены на металлы успешно обновлены'
-        }), 200
-    except Exception as e:
+            'status': 'error',
+            'message': str(e)
+        }), 429
+    return _job_accepted(job, created)
+
+@api_bp.route('/metals/backfill', methods=['POST'])
+def backfill_metal_prices():
+    """Поставить в очередь загрузку истории с mfd.ru: {"metal": "GOLD", "date_from": "...", "date_to": "..."}.
+
+    Без metal загружаются все металлы из БД.
+    """
+    payload = request.get_json(silent=True) or {}
+    date_from_str = payload.get('date_from')
+    date_to_str = payload.get('date_to')
+    if not all([date_from_str, date_to_str]):
+        return jsonify({
+            'status': 'error',
+            'message': 'Missing required parameters: date_from, date_to'
+        }), 400
+    try:
+        date_from = datetime.fromisoformat(date_from_str).date()
+        date_to = datetime.fromisoformat(date_to_str).date()
+    except (TypeError, ValueError):
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid date format. Use ISO format (YYYY-MM-DD)'
+        }), 400
+    if date_from > date_to:
+        return jsonify({
+            'status': 'error',
+            'message': 'date_from must not be later than date_to'
+        }), 400
+
+    known = [metal.symbol for metal in Metal.query.order_by(Metal.symbol).all()]
+    metal = (payload.get('metal') or '').upper()
+    if metal and metal not in known:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown metal: {metal}'
+        }), 400
+
+    try:
+        job, created = get_job_queue().submit('backfill', {
+            'metals': [metal] if metal else known,
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat()
+        })
+    except JobQueueFull as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }), 429
+    return _job_accepted(job, created)
+
+def _job_accepted(job, created):
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job.id,
+        'job_status': job.status,
+        'deduplicated': not created,
+        'status_url': url_for('api.get_job', job_id=job.id)
+    }), 202
 
 # Закомментируем этот обработчик, чтобы использовался предыдущий, работающий с БД
 # @api_bp.route('/metals/history', methods=['GET'])
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from flask import current_app, jsonify, request
+from . import api_bp
+from app.services.history_cache import RESOLUTIONS
+from app.services.portfolio_service import PortfolioService
+
+@api_bp.route('/portfolio/valuation', methods=['POST'])
+def value_portfolio():
+    """Стоимость портфеля: {"currency": "RUB", "holdings": [{"metal": "GOLD", "quantity": 10, "unit": "oz"}],
+    "date_from": "...", "date_to": "...", "resolution": "day"}. Период по умолчанию - последние 365 дней.
+    """
+    payload = request.get_json(silent=True) or {}
+    holdings = payload.get('holdings')
+    if not isinstance(holdings, list) or not holdings:
+        return jsonify({
+            'status': 'error',
+            'message': 'Missing required parameter: holdings'
+        }), 400
+    max_holdings = current_app.config['PORTFOLIO_MAX_HOLDINGS']
+    if len(holdings) > max_holdings:
+        return jsonify({
+            'status': 'error',
+            'message': f'Too many holdings: {len(holdings)} (max {max_holdings})'
+        }), 400
+
+    try:
+        date_to = datetime.fromisoformat(payload['date_to']) if payload.get('date_to') else datetime.utcnow()
+        date_from = datetime.fromisoformat(payload['date_from']) if payload.get('date_from') \
+            else date_to - timedelta(days=365)
+    except (TypeError, ValueError):
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid date format. Use ISO format (YYYY-MM-DD)'
+        }), 400
+    max_days = current_app.config['PORTFOLIO_MAX_DAYS']
+    if date_from > date_to or (date_to - date_from).days > max_days:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid period: date_from must not be after date_to, max {max_days} days'
+        }), 400
+    resolution = payload.get('resolution', 'day')
+    if resolution not in RESOLUTIONS:
+        return jsonify({
+            'status': 'error',
+            'message': f"Invalid resolution. Use one of: {', '.join(RESOLUTIONS)}"
+        }), 400
+
+    try:
+        data = PortfolioService.value(holdings, payload.get('currency'), date_from, date_to, resolution)
+    except ValueError as ve:
+        return jsonify({
+            'status': 'error',
+            'message': str(ve)
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error in /portfolio/valuation: {e}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': "Внутренняя ошибка сервера при оценке портфеля."
+        }), 500
+    return jsonify({
+        'status': 'success',
+        'data': data
+    }), 200
@@ -0,0 +1,63 @@
+from flask import current_app, jsonify, request
+from . import api_bp
+from app.services.price_filter import QuarantineService
+
+@api_bp.route('/quarantine', methods=['GET'])
+def list_quarantined_prices():
+    """Цены в карантине, новые первыми; фильтры ?status=pending|released|rejected|all&metal=GOLD."""
+    status = request.args.get('status', 'pending')
+    try:
+        rows = QuarantineService.list(status=None if status == 'all' else status,
+                                      metal=request.args.get('metal'),
+                                      limit=request.args.get('limit', 100, type=int))
+    except ValueError as ve:
+        return jsonify({
+            'status': 'error',
+            'message': str(ve)
+        }), 400
+    return jsonify({
+        'status': 'success',
+        'data': rows
+    }), 200
+
+@api_bp.route('/quarantine/counts', methods=['GET'])
+def quarantine_counts():
+    """Сколько цен в карантине: по статусам, ожидающие разбора - по металлам и причинам."""
+    return jsonify({
+        'status': 'success',
+        'data': QuarantineService.counts()
+    }), 200
+
+@api_bp.route('/quarantine/<int:row_id>/release', methods=['POST'])
+def release_quarantined_price(row_id):
+    """Признать цену верной и записать ее в историю."""
+    return _review(QuarantineService.release, row_id)
+
+@api_bp.route('/quarantine/<int:row_id>', methods=['DELETE'])
+def reject_quarantined_price(row_id):
+    """Отклонить цену (запись остается в карантине со статусом rejected)."""
+    return _review(QuarantineService.reject, row_id)
+
+def _review(action, row_id):
+    try:
+        row = action(row_id)
+    except ValueError as ve:
+        return jsonify({
+            'status': 'error',
+            'message': str(ve)
+        }), 409
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error in /quarantine/{row_id}: {e}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': "Внутренняя ошибка сервера при разборе карантина."
+        }), 500
+    if row is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Quarantined price not found: {row_id}'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'data': row
+    }), 200
@@ -0,0 +1,276 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+from flask import current_app
+from app import db
+from app.models.alert import PriceAlert, alert_levels
+from app.models.metal import Metal, MetalPrice
+from app.services.alert_sinks import create_sink
+
+logger = logging.getLogger(__name__)
+
+ALERT_CONDITIONS = ('above', 'below', 'move')
+
+
+class _LevelIndex:
+    """Уровни срабатывания одной стороны (above или below) одного металла, по возрастанию.
+
+    Пары (level, alert_id) хранятся в одном отсортированном списке: для above сработали
+    все уровни <= цены (префикс списка), для below - все уровни >= цены (суффикс).
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[float, int]] = []
+
+    def add(self, level: float, alert_id: int) -> None:
+        insort(self.entries, (level, alert_id))
+
+    def add_many(self, entries: List[Tuple[float, int]]) -> None:
+        # Одна сортировка вместо insort на каждую запись при загрузке большого числа оповещений
+        self.entries.extend(entries)
+        self.entries.sort()
+
+    def remove(self, level: float, alert_id: int) -> None:
+        i = bisect_left(self.entries, (level, alert_id))
+        if i < len(self.entries) and self.entries[i] == (level, alert_id):
+            del self.entries[i]
+
+    def at_or_below(self, price: float) -> List[Tuple[float, int]]:
+        return self.entries[:bisect_right(self.entries, (price, float('inf')))]
+
+    def at_or_above(self, price: float) -> List[Tuple[float, int]]:
+        return self.entries[bisect_left(self.entries, (price, float('-inf'))):]
+
+
+class AlertEngine:
+    """Проверка оповещений о ценах при записи новых цен.
+
+    Активные оповещения разложены по металлам в отсортированные индексы уровней
+    (move - это пара уровней above/below от reference_price), поэтому новая цена
+    проверяется двумя bisect, и затрагиваются только сработавшие оповещения: O(log n + k).
+    Сработавшее оповещение одноразовое: оно выключается условным UPDATE (... AND active),
+    так что при проверке в нескольких процессах уведомление отправляется один раз.
+    Индекс живет в памяти процесса; оповещения, созданные другими процессами,
+    догружаются перед каждой проверкой по возрастанию id.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._above: Dict[str, _LevelIndex] = {}
+        self._below: Dict[str, _LevelIndex] = {}
+        # alert_id -> (metal, сведения для уведомления, уровни)
+        self._alerts: Dict[int, Tuple[str, Dict, List[Tuple[str, float]]]] = {}
+        self._last_id = 0
+        self.triggered = 0
+
+    @property
+    def active_count(self) -> int:
+        return len(self._alerts)
+
+    def add(self, alert: PriceAlert, symbol: str) -> None:
+        with self._lock:
+            self._add(alert.id, symbol, alert.condition, alert.levels(), alert.note, alert.created_at)
+
+    def discard(self, alert_id: int) -> None:
+        with self._lock:
+            self._remove(alert_id)
+
+    def refresh(self) -> int:
+        """Догрузить активные оповещения, созданные после последней загрузки (в т.ч. другими процессами)."""
+        # Колонки, а не объекты ORM: при первой загрузке оповещений могут быть сотни тысяч
+        rows = db.session.query(PriceAlert.id, Metal.symbol, PriceAlert.condition, PriceAlert.threshold,
+                                PriceAlert.percent, PriceAlert.reference_price, PriceAlert.note,
+                                PriceAlert.created_at)\
+            .join(Metal, PriceAlert.metal_id == Metal.id)\
+            .filter(PriceAlert.active.is_(True), PriceAlert.id > self._last_id)\
+            .order_by(PriceAlert.id.asc()).all()
+        with self._lock:
+            pending: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}
+            for alert_id, symbol, condition, threshold, percent, reference_price, note, created_at in rows:
+                levels = self._register(alert_id, symbol, condition,
+                                        alert_levels(condition, threshold, percent, reference_price), note, created_at)
+                for side, level in levels:
+                    pending.setdefault((side, symbol), []).append((level, alert_id))
+            for (side, symbol), entries in pending.items():
+                sides = self._above if side == 'above' else self._below
+                sides.setdefault(symbol, _LevelIndex()).add_many(entries)
+        return len(rows)
+
+    def evaluate(self, prices: List[Dict]) -> List[Dict]:
+        """Проверить новые цены [{'symbol', 'price', 'timestamp'}] и разослать сработавшие оповещения.
+
+        Цены проверяются по возрастанию времени. Оповещение не срабатывает на цены за дни до
+        своего создания (загрузка истории); цены ЦБ датируются началом дня, поэтому сравниваются даты.
+        """
+        self.refresh()
+        fired: Dict[int, Dict] = {}
+        with self._lock:
+            for price_data in sorted(prices, key=lambda p: p['timestamp']):
+                symbol = price_data['symbol'].upper()
+                price = float(price_data['price'])
+                timestamp = datetime.fromisoformat(price_data['timestamp'])
+                crossed = [('above', level, alert_id) for level, alert_id in
+                           (self._above[symbol].at_or_below(price) if symbol in self._above else [])]
+                crossed += [('below', level, alert_id) for level, alert_id in
+                            (self._below[symbol].at_or_above(price) if symbol in self._below else [])]
+                for side, level, alert_id in crossed:
+                    _, info, _ = self._alerts[alert_id]
+                    if alert_id in fired or info['created_at'].date() > timestamp.date():
+                        continue
+                    fired[alert_id] = dict(info, side=side, level=round(level, 6), price=price,
+                                           timestamp=price_data['timestamp'])
+        if not fired:
+            return []
+
+        notifications = []
+        triggered_at = datetime.utcnow()
+        table = PriceAlert.__table__
+        for alert_id, notification in fired.items():
+            claimed = db.session.execute(
+                table.update().where(table.c.id == alert_id, table.c.active.is_(True))
+                .values(active=False, triggered_at=triggered_at, triggered_price=notification['price'])).rowcount
+            if claimed:
+                notification['created_at'] = notification['created_at'].isoformat()
+                notification['triggered_at'] = triggered_at.isoformat()
+                notifications.append(notification)
+        db.session.commit()
+        # Из индекса - только после коммита: если он не прошел, оповещения остаются активными
+        # в БД и в индексе и проверяются снова на следующих ценах. Не захваченные здесь уже
+        # выключены другим процессом или через DELETE /api/alerts/<id>.
+        with self._lock:
+            for alert_id in fired:
+                self._remove(alert_id)
+        self.triggered += len(notifications)
+
+        for notification in notifications:
+            try:
+                self.sink.send(notification)
+            except Exception as e:
+                logger.error(f"Не удалось отправить оповещение {notification['alert_id']}: {e}", exc_info=True)
+        return notifications
+
+    def _register(self, alert_id: int, symbol: str, condition: str, levels: List[Tuple[str, float]],
+                  note: Optional[str], created_at: datetime) -> List[Tuple[str, float]]:
+        """Запомнить оповещение; возвращает уровни, которые нужно добавить в индексы ([] - уже есть)."""
+        self._last_id = max(self._last_id, alert_id)
+        if alert_id in self._alerts:
+            return []
+        info = {'alert_id': alert_id, 'metal': symbol, 'condition': condition, 'note': note, 'created_at': created_at}
+        self._alerts[alert_id] = (symbol, info, levels)
+        return levels
+
+    def _add(self, alert_id: int, symbol: str, condition: str, levels: List[Tuple[str, float]],
+             note: Optional[str], created_at: datetime) -> None:
+        for side, level in self._register(alert_id, symbol, condition, levels, note, created_at):
+            sides = self._above if side == 'above' else self._below
+            sides.setdefault(symbol, _LevelIndex()).add(level, alert_id)
+
+    def _remove(self, alert_id: int) -> None:
+        entry = self._alerts.pop(alert_id, None)
+        if entry is None:
+            return
+        symbol, _, levels = entry
+        for side, level in levels:
+            sides = self._above if side == 'above' else self._below
+            sides[symbol].remove(level, alert_id)
+
+
+class AlertService:
+    """Создание, просмотр и отключение оповещений для /api/alerts."""
+
+    @staticmethod
+    def create(payload: Dict) -> Dict:
+        symbol = str(payload.get('metal') or '').upper()
+        metal = Metal.query.filter_by(symbol=symbol).first()
+        if not metal:
+            raise ValueError(f'Unknown metal: {symbol}')
+        condition = payload.get('condition')
+        if condition not in ALERT_CONDITIONS:
+            raise ValueError(f"Invalid condition. Use one of: {', '.join(ALERT_CONDITIONS)}")
+
+        alert = PriceAlert(metal_id=metal.id, condition=condition, note=payload.get('note'))
+        latest = AlertService._latest_price(metal.id)
+        if condition == 'move':
+            alert.percent = AlertService._positive(payload, 'percent')
+            if payload.get('reference_price') is not None:
+                alert.reference_price = AlertService._positive(payload, 'reference_price')
+            else:
+                # Без reference_price изменение считается от последней известной цены
+                if latest is None:
+                    raise ValueError(f'No price available for metal: {symbol}; pass reference_price')
+                alert.reference_price = latest
+        else:
+            alert.threshold = AlertService._positive(payload, 'threshold')
+        # Оповещение срабатывает на пересечение уровня. Уровень, который текущая цена уже
+        # прошла, сработал бы на следующей же цене без всякого пересечения
+        if latest is not None:
+            for side, level in alert.levels():
+                if (side == 'above' and latest >= level) or (side == 'below' and latest <= level):
+                    raise ValueError(f'{symbol} is already {side} {round(level, 6)} (latest price {latest})')
+        db.session.add(alert)
+        db.session.commit()
+
+        engine = get_alert_engine()
+        if engine:
+            engine.add(alert, symbol)
+        return alert.to_dict()
+
+    @staticmethod
+    def list(metal: Optional[str] = None, active: Optional[bool] = None, limit: int = 100) -> List[Dict]:
+        query = PriceAlert.query
+        if metal:
+            query = query.join(Metal, PriceAlert.metal_id == Metal.id).filter(Metal.symbol == metal.upper())
+        if active is not None:
+            query = query.filter(PriceAlert.active.is_(active))
+        return [alert.to_dict() for alert in query.order_by(PriceAlert.id.desc()).limit(limit).all()]
+
+    @staticmethod
+    def deactivate(alert_id: int) -> Optional[Dict]:
+        alert = PriceAlert.query.get(alert_id)
+        if alert is None:
+            return None
+        alert.active = False
+        db.session.commit()
+        engine = get_alert_engine()
+        if engine:
+            engine.discard(alert_id)
+        return alert.to_dict()
+
+    @staticmethod
+    def _latest_price(metal_id: int) -> Optional[float]:
+        """Последняя записанная цена металла из БД (снимок цен в кэше может отставать)."""
+        latest = db.session.query(MetalPrice.price).filter(MetalPrice.metal_id == metal_id)\
+            .order_by(MetalPrice.timestamp.desc()).first()
+        return latest[0] if latest else None
+
+    @staticmethod
+    def _positive(payload: Dict, field: str) -> float:
+        try:
+            value = float(payload[field])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Missing or invalid parameter: {field}')
+        if value <= 0:
+            raise ValueError(f'{field} must be positive')
+        return value
+
+
+def evaluate_alerts(saved_prices: List[Dict]) -> None:
+    """Проверка оповещений после записи цен; ошибки логируются и не прерывают загрузку цен."""
+    try:
+        engine = get_alert_engine()
+        if engine:
+            engine.evaluate(saved_prices)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Ошибка проверки оповещений о ценах: {e}", exc_info=True)
+
+
+def get_alert_engine() -> Optional[AlertEngine]:
+    """Движок оповещений текущего приложения или None, если оповещения выключены (ALERTS_ENABLED=0)."""
+    engine = current_app.extensions.get('alert_engine')
+    if engine is None and current_app.config['ALERTS_ENABLED']:
+        engine = current_app.extensions.setdefault('alert_engine', AlertEngine(create_sink(current_app)))
+    return engine
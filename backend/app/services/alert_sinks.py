@@ -0,0 +1,82 @@
+"""Куда отправляются сработавшие оповещения о ценах.
+
+Приемник выбирается настройкой ALERT_SINK: log (логгер приложения), file (JSON Lines в
+ALERT_SINK_PATH) или queue (очередь в памяти процесса - для тестов и локальной отладки).
+Свой приемник (почта, вебхук, брокер сообщений) подключается через register_sink().
+"""
+from typing import Callable, Dict, List
+import json
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LogSink:
+    """Пишет оповещения в лог."""
+
+    def send(self, notification: Dict) -> None:
+        logger.info(f"Сработало оповещение {notification['alert_id']}: {notification['metal']} "
+                    f"{notification['side']} {notification['level']} (цена {notification['price']})")
+
+
+class FileSink:
+    """Дописывает оповещения в файл, по одному JSON-объекту на строку."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def send(self, notification: Dict) -> None:
+        line = json.dumps(notification, ensure_ascii=False, separators=(',', ':'))
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+class QueueSink:
+    """Кладет оповещения в ограниченную очередь; при переполнении отбрасывает самые старые."""
+
+    def __init__(self, max_size: int = 1000):
+        self.queue = queue.Queue(maxsize=max_size)
+
+    def send(self, notification: Dict) -> None:
+        while True:
+            try:
+                self.queue.put_nowait(notification)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def drain(self) -> List[Dict]:
+        """Все накопившиеся оповещения (очередь очищается)."""
+        items = []
+        try:
+            while True:
+                items.append(self.queue.get_nowait())
+        except queue.Empty:
+            return items
+
+
+SINKS: Dict[str, Callable] = {
+    'log': lambda app: LogSink(),
+    'file': lambda app: FileSink(app.config['ALERT_SINK_PATH']),
+    'queue': lambda app: QueueSink(app.config['ALERT_QUEUE_SIZE']),
+}
+
+
+def register_sink(name: str, factory: Callable) -> None:
+    """Добавить приемник: factory(app) возвращает объект с методом send(notification)."""
+    SINKS[name] = factory
+
+
+def create_sink(app):
+    name = app.config['ALERT_SINK']
+    if name not in SINKS:
+        raise ValueError(f"Unknown ALERT_SINK: {name}. Use one of: {', '.join(SINKS)}")
+    return SINKS[name](app)
@@ -2,8 +2,14 @@ from datetime import datetime
 from typing import Dict, List
 import requests
 from bs4 import BeautifulSoup
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+# Адрес страницы ЦБ на mfd.ru; переопределяется через окружение (например, для нагрузочных тестов)
+MFD_URL = os.getenv('MFD_URL', 'https://mfd.ru/centrobank/preciousmetals/')
+
 class MetalParserService:
     METAL_SYMBOLS = {
         'GOLD': 'Золото',
@@ -28,7 +34,7 @@ class MetalParserService:
 
     @staticmethod
     def get_all_current_prices() -> List[Dict]:
-        url = 'https://mfd.ru/centrobank/preciousmetals/'
+        url = MFD_URL
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
         }
@@ -68,15 +74,15 @@ class MetalParserService:
                     'timestamp': timestamp
                 })
         except Exception as e:
-            print('Ошибка парсинга:', str(e))
+            logger.error(f"Ошибка парсинга: {e}")
         if not results or (results and 'error' in results[0]):
-            print('Ошибка парсинга mfd.ru или нет данных.')
+            logger.warning('Ошибка парсинга mfd.ru или нет данных.')
         return results
 
     @staticmethod
     def get_historical_prices_from_mfd(metal_symbol: str, date_from: str, date_to: str) -> List[Dict]:
         """Парсит исторические цены для выбранного металла и периода с mfd.ru"""
-        url = 'https://mfd.ru/centrobank/preciousmetals/'
+        url = MFD_URL
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
         }
@@ -116,5 +122,5 @@ class MetalParserService:
                         'price': price
                     })
         except Exception as e:
-            print('Ошибка парсинга истории mfd:', str(e))
+            logger.error(f"Ошибка парсинга истории mfd: {e}")
         return results 
\ No newline at end of file
@@ -0,0 +1,223 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import logging
+from sqlalchemy import and_, delete, func, insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.models.metal import Metal, MetalPrice, MetalAnalysis
+from app.services.exchange_rate_service import AsyncExchangeRateClient
+from app.services.metal_service import (DEFAULT_ANALYSIS_WINDOW, DEFAULT_BASE_CURRENCY, analysis_is_fresh,
+                                        compute_analysis, converted_unit, price_currency)
+from app.services.price_store import from_epoch_us
+
+logger = logging.getLogger(__name__)
+
+# Синхронный драйвер -> асинхронный для того же URI базы
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+}
+
+metal_table = Metal.__table__
+price_table = MetalPrice.__table__
+
+
+def create_async_engine_for_app(app, engine) -> AsyncEngine:
+    """Асинхронный движок для той же базы, что и синхронный db.engine приложения."""
+    url = app.config.get('ASYNC_DATABASE_URL')
+    if url:
+        url = make_url(url)
+    else:
+        url = engine.url
+        if url.drivername not in ASYNC_DRIVERS:
+            raise ValueError(f"Нет асинхронного драйвера для {url.drivername}; задайте ASYNC_DATABASE_URL")
+        url = url.set(drivername=ASYNC_DRIVERS[url.drivername])
+    options = {'pool_size': app.config['ASYNC_DB_POOL_SIZE'], 'max_overflow': 0}
+    if url.get_backend_name() == 'sqlite':
+        # Для файловой SQLite по умолчанию NullPool, а каждое соединение aiosqlite - отдельный поток
+        options['poolclass'] = AsyncAdaptedQueuePool
+        options['connect_args'] = {'timeout': app.config['SQLITE_WRITE_TIMEOUT']}
+    return create_async_engine(url, **options)
+
+
+class AsyncMetalService:
+    """Асинхронные версии чтения MetalService для app/asgi.py.
+
+    Запросы к БД идут через async-драйвер (aiosqlite/asyncpg), курсы валют - через
+    httpx, поэтому медленный внешний сервис не занимает поток воркера. Форматы
+    ответов совпадают с синхронным MetalService.
+    """
+
+    def __init__(self, app, engine: AsyncEngine, fx_client: AsyncExchangeRateClient):
+        self.app = app
+        self.engine = engine
+        self.fx_client = fx_client
+
+    async def get_current_prices(self, target_currency: Optional[str] = None) -> List[Dict]:
+        final_target_currency = target_currency.upper() if target_currency else DEFAULT_BASE_CURRENCY
+
+        latest = select(price_table.c.metal_id, func.max(price_table.c.timestamp).label('timestamp'))\
+            .group_by(price_table.c.metal_id).subquery()
+        query = select(metal_table.c.symbol, metal_table.c.name, metal_table.c.unit,
+                       price_table.c.price, price_table.c.timestamp)\
+            .select_from(metal_table
+                         .outerjoin(latest, latest.c.metal_id == metal_table.c.id)
+                         .outerjoin(price_table, and_(price_table.c.metal_id == metal_table.c.id,
+                                                      price_table.c.timestamp == latest.c.timestamp)))\
+            .order_by(metal_table.c.id)
+        async with self.engine.connect() as connection:
+            rows = (await connection.execute(query)).all()
+
+        # Курсы для всех исходных валют запрашиваются параллельно
+        currencies = sorted({price_currency(row.unit) for row in rows if row.price is not None}
+                            - {final_target_currency})
+        results = await asyncio.gather(*(self.fx_client.get_rate_quote(currency, final_target_currency)
+                                         for currency in currencies), return_exceptions=True)
+        quotes = {}
+        for currency, result in zip(currencies, results):
+            if isinstance(result, ValueError):
+                logger.error(f"Не удалось получить курс {currency}/{final_target_currency}: {result}. Возвращаем исходную цену.")
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                quotes[currency] = result
+
+        output = []
+        for row in rows:
+            if row.price is None:
+                logger.warning(f"Нет данных о ценах для металла: {row.symbol}")
+                output.append({
+                    'symbol': row.symbol,
+                    'name': row.name,
+                    'price': None,
+                    'unit': f"{final_target_currency}/oz" if '/' in row.unit else final_target_currency,
+                    'timestamp': None
+                })
+                continue
+            price_value, price_unit = row.price, row.unit
+            quote = quotes.get(price_currency(row.unit))
+            if quote is not None:
+                price_value = round(price_value * quote.rate, 2)
+                price_unit = converted_unit(price_unit, final_target_currency)
+            price_output = {
+                'symbol': row.symbol,
+                'name': row.name,
+                'price': price_value,
+                'unit': price_unit,
+                'timestamp': row.timestamp.isoformat()
+            }
+            if quote is not None and quote.stale:
+                # Как в MetalService.get_current_prices: цена посчитана по последнему сохраненному курсу
+                price_output['fx_stale'] = True
+                price_output['fx_rate_date'] = quote.date.isoformat()
+            output.append(price_output)
+        return output
+
+    def _series_source(self, metal_symbol: str):
+        for name in ('price_store', 'history_archive'):
+            source = self.app.extensions.get(name)
+            if source and source.has_metal(metal_symbol):
+                return source
+        return None
+
+    def _source_range(self, source, metal_symbol: str, date_from: datetime, date_to: datetime):
+        # Хранилище может догрузить строки из БД синхронно, поэтому вызывается из пула потоков
+        with self.app.app_context():
+            timestamps, prices = source.range(metal_symbol, date_from, date_to)
+            return list(timestamps), list(prices)
+
+    async def _price_series(self, metal_symbol: str, metal_id: Optional[int],
+                            date_from: datetime, date_to: datetime):
+        """(timestamps, prices) металла за период: из хранилища/архива или из БД."""
+        source = self._series_source(metal_symbol)
+        if source:
+            timestamps, prices = await asyncio.to_thread(self._source_range, source, metal_symbol, date_from, date_to)
+            return [from_epoch_us(ts) for ts in timestamps], prices
+        if metal_id is None:
+            return [], []
+        query = select(price_table.c.timestamp, price_table.c.price)\
+            .where(price_table.c.metal_id == metal_id,
+                   price_table.c.timestamp >= date_from,
+                   price_table.c.timestamp <= date_to)\
+            .order_by(price_table.c.timestamp.asc())
+        async with self.engine.connect() as connection:
+            rows = (await connection.execute(query)).all()
+        return [timestamp for timestamp, _ in rows], [price for _, price in rows]
+
+    async def _precomputed_analysis(self, metal_symbol: str, metal_id: int, window_days: int) -> Optional[Dict]:
+        """Последний сохраненный анализ окна, если он свежий (как MetalService._precomputed_analysis)."""
+        analysis_table = MetalAnalysis.__table__
+        async with self.engine.connect() as connection:
+            row = (await connection.execute(
+                select(analysis_table).where(analysis_table.c.metal_id == metal_id,
+                                             analysis_table.c.window_days == window_days)
+                .order_by(analysis_table.c.created_at.desc()).limit(1))).first()
+            if row is None:
+                return None
+            latest_price_at = (await connection.execute(
+                select(func.max(price_table.c.timestamp)).where(price_table.c.metal_id == metal_id))).scalar()
+        if not analysis_is_fresh(row.created_at, row.period_end, latest_price_at,
+                                 self.app.config['ANALYSIS_FRESH_SECONDS'], datetime.utcnow()):
+            return None
+        return {
+            'metal': metal_symbol,
+            'trend': row.trend,
+            'volatility': row.volatility,
+            'sentiment': row.sentiment,
+            'window_days': window_days,
+            'period_start': row.period_start.isoformat(),
+            'period_end': row.period_end.isoformat()
+        }
+
+    async def _metal_id(self, metal_symbol: str) -> Optional[int]:
+        async with self.engine.connect() as connection:
+            return (await connection.execute(
+                select(metal_table.c.id).where(metal_table.c.symbol == metal_symbol.upper()))).scalar()
+
+    async def get_historical_prices(self, metal_symbol: str, date_from: datetime, date_to: datetime) -> List[Dict]:
+        metal_id = None
+        if not self._series_source(metal_symbol):
+            metal_id = await self._metal_id(metal_symbol)
+            if metal_id is None:
+                return []
+        timestamps, prices = await self._price_series(metal_symbol, metal_id, date_from, date_to)
+        return [{
+            'price': price,
+            'timestamp': timestamp.isoformat()
+        } for timestamp, price in zip(timestamps, prices)]
+
+    async def analyze_metal(self, metal_symbol: str, window_days: int = DEFAULT_ANALYSIS_WINDOW) -> Dict:
+        metal_id = await self._metal_id(metal_symbol)
+        if metal_id is None:
+            return {}
+
+        precomputed = await self._precomputed_analysis(metal_symbol, metal_id, window_days)
+        if precomputed is not None:
+            return precomputed
+
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=window_days)
+        _, price_values = await self._price_series(metal_symbol, metal_id, start_date, end_date)
+        result = compute_analysis(price_values)
+        if not result:
+            return {}
+
+        analysis_table = MetalAnalysis.__table__
+        async with self.engine.begin() as connection:
+            # Одна строка на (металл, окно), как в MetalService._compute_and_store_analysis
+            await connection.execute(delete(analysis_table).where(analysis_table.c.metal_id == metal_id,
+                                                                  analysis_table.c.window_days == window_days))
+            await connection.execute(insert(analysis_table).values(
+                metal_id=metal_id, window_days=window_days, period_start=start_date, period_end=end_date, **result))
+
+        return {
+            'metal': metal_symbol,
+            **result,
+            'window_days': window_days,
+            'period_start': start_date.isoformat(),
+            'period_end': end_date.isoformat()
+        }
@@ -0,0 +1,143 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+import logging
+from flask import current_app
+from app.models.metal import Metal
+from app.services.exchange_rate_service import ExchangeRateService
+from app.services.history_cache import RESOLUTIONS
+from app.services.metal_service import (ANALYSIS_WINDOWS, DEFAULT_ANALYSIS_WINDOW, DEFAULT_BASE_CURRENCY, MetalService,
+                                        price_currency)
+
+logger = logging.getLogger(__name__)
+
+QUERY_TYPES = ('current', 'history', 'analysis')
+
+
+class DashboardService:
+    """Несколько подзапросов дашборда (current/history/analysis) за один HTTP-запрос.
+
+    Общие для всех подзапросов данные получаются один раз: строки Metal (одним запросом) и курсы
+    из базовых валют металлов во все валюты подзапросов current. Загрузка курсов, история и
+    анализ выполняются параллельно на пуле DASHBOARD_WORKERS потоков, каждый в своем контексте
+    приложения (сессия SQLAlchemy у каждого потока своя). Ошибка одного подзапроса попадает в
+    его результат и не ломает остальные.
+    """
+
+    @staticmethod
+    def _query_ids(queries: List[Dict]) -> List[str]:
+        """Ключи результатов подзапросов: id, а без него - позиция. ValueError при повторе."""
+        query_ids = [str(query.get('id') or position) for position, query in enumerate(queries)]
+        duplicates = sorted({query_id for query_id in query_ids if query_ids.count(query_id) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate query ids: {', '.join(duplicates)}")
+        return query_ids
+
+    @staticmethod
+    def run(queries: List[Dict], default_currency: str = None) -> Dict[str, Dict]:
+        query_ids = DashboardService._query_ids(queries)
+        metals = {metal.symbol: metal.unit for metal in Metal.query.all()}
+        planned: List[Tuple[str, str, Callable, tuple]] = []
+        results: Dict[str, Dict] = {}
+        for query_id, query in zip(query_ids, queries):
+            try:
+                task, args = DashboardService._plan(query, metals, default_currency)
+            except ValueError as e:
+                results[query_id] = {'type': query.get('type'), 'status': 'error', 'message': str(e)}
+                continue
+            planned.append((query_id, query['type'], task, args))
+
+        app = current_app._get_current_object()
+        executor = DashboardService._executor(app)
+        # Курсы нужны только подзапросам current и загружаются параллельно с историей и анализом
+        currencies = {args[0] for _, query_type, _, args in planned if query_type == 'current'}
+        bases = {price_currency(unit) for unit in metals.values()}
+        quote_futures = {(base, currency): executor.submit(DashboardService._in_context, app,
+                                                           ExchangeRateService.get_rate_quote, (base, currency))
+                         for base in bases for currency in currencies if base != currency}
+        futures: Dict[str, Future] = {query_id: executor.submit(DashboardService._in_context, app, task, args)
+                                      for query_id, query_type, task, args in planned if query_type != 'current'}
+
+        for query_id, query_type, task, args in planned:
+            if query_type == 'current':
+                quotes = {base: DashboardService._result_or_error(future)
+                          for (base, currency), future in quote_futures.items() if currency == args[0]}
+                outcome = lambda: task(*args, quotes)
+            else:
+                outcome = futures[query_id].result
+            results[query_id] = DashboardService._wrap(query_type, args, outcome)
+        return results
+
+    @staticmethod
+    def _plan(query: Dict, metals: Dict[str, str], default_currency: str) -> Tuple[Callable, tuple]:
+        """Проверяет подзапрос и возвращает (функция, аргументы)."""
+        query_type = query.get('type')
+        if query_type not in QUERY_TYPES:
+            raise ValueError(f"Unknown query type: {query_type}. Use one of: {', '.join(QUERY_TYPES)}")
+        if query_type == 'current':
+            currency = (query.get('currency') or default_currency or DEFAULT_BASE_CURRENCY).upper()
+            return DashboardService._current, (currency,)
+
+        metal = (query.get('metal') or '').upper()
+        if not metal:
+            raise ValueError('Missing required parameter: metal')
+        if metal not in metals:
+            raise ValueError(f'Unknown metal: {metal}')
+        if query_type == 'analysis':
+            window = query.get('window', DEFAULT_ANALYSIS_WINDOW)
+            if window not in ANALYSIS_WINDOWS:
+                raise ValueError(f"Invalid window. Use one of: {', '.join(map(str, ANALYSIS_WINDOWS))}")
+            return MetalService.analyze_metal, (metal, window)
+
+        if not all([query.get('date_from'), query.get('date_to')]):
+            raise ValueError('Missing required parameters: metal, date_from, date_to')
+        try:
+            date_from = datetime.fromisoformat(query['date_from'])
+            date_to = datetime.fromisoformat(query['date_to'])
+        except (TypeError, ValueError):
+            raise ValueError('Invalid date format. Use ISO format (YYYY-MM-DD)')
+        resolution = query.get('resolution', 'raw')
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Invalid resolution. Use one of: {', '.join(RESOLUTIONS)}")
+        return MetalService.get_historical_prices, (metal, date_from, date_to, resolution)
+
+    @staticmethod
+    def _current(currency: str, quotes: Dict):
+        return MetalService.get_current_prices(target_currency=currency, quotes=quotes)
+
+    @staticmethod
+    def _wrap(query_type: str, args: tuple, outcome: Callable) -> Dict:
+        """Результат подзапроса в формате ответов отдельных эндпоинтов."""
+        try:
+            data = outcome()
+        except ValueError as e:
+            return {'type': query_type, 'status': 'error', 'message': str(e)}
+        except Exception as e:
+            logger.error(f"Ошибка подзапроса дашборда {query_type}: {e}", exc_info=True)
+            return {'type': query_type, 'status': 'error', 'message': str(e)}
+        if query_type == 'analysis' and not data:
+            return {'type': query_type, 'status': 'error', 'message': f'No data available for metal: {args[0]}'}
+        return {'type': query_type, 'status': 'success', 'data': data}
+
+    @staticmethod
+    def _in_context(app, fn: Callable, args: tuple):
+        with app.app_context():
+            return fn(*args)
+
+    @staticmethod
+    def _result_or_error(future: Future):
+        try:
+            return future.result()
+        except ValueError as e:
+            return e
+        except Exception as e:
+            logger.error(f"Ошибка загрузки курса для дашборда: {e}", exc_info=True)
+            return ValueError(str(e))
+
+    @staticmethod
+    def _executor(app) -> ThreadPoolExecutor:
+        executor = app.extensions.get('dashboard_executor')
+        if executor is None:
+            executor = app.extensions.setdefault('dashboard_executor', ThreadPoolExecutor(
+                max_workers=app.config['DASHBOARD_WORKERS'], thread_name_prefix='dashboard'))
+        return executor
@@ -1,14 +1,29 @@
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+import json
+import logging
 import os
-import requests
+import time
 from flask import current_app
 from app import cache # Используем существующий экземпляр cache из __init__.py
+from app.services.fx_rate_history import RateQuote, get_fx_rate_history
+from app.services.single_flight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger(__name__)
 
 # Базовый URL для API exchangerate-api.com
-API_BASE_URL = "https://v6.exchangerate-api.com/v6"
+API_BASE_URL = os.getenv('EXCHANGE_RATE_API_BASE_URL', "https://v6.exchangerate-api.com/v6")
+# Сколько секунд кэшируется курс
+EXCHANGE_RATE_CACHE_SECONDS = int(os.getenv('EXCHANGE_RATE_CACHE_SECONDS', '3600'))
+# Сколько секунд кэшируется последний известный курс, отданный вместо недоступного API
+EXCHANGE_RATE_STALE_RETRY_SECONDS = int(os.getenv('EXCHANGE_RATE_STALE_RETRY_SECONDS', '60'))
+RATE_TABLE_CACHE_KEY = 'fx_rate_table:{}'
+
+# Одновременные промахи кэша по одной базовой валюте делают один запрос к API
+_rate_flight = SingleFlight()
 
 class ExchangeRateService:
     @staticmethod
-    @cache.memoize(timeout=3600) # Кэшировать результат на 1 час (3600 секунд)
     def get_exchange_rate(base_currency: str, target_currency: str) -> float:
         """
         Получает обменный курс между двумя валютами.
@@ -19,52 +34,246 @@ class ExchangeRateService:
                  Возвращает 1.0, если базовая и целевая валюты совпадают.
                  Вызывает исключение ValueError при ошибке API или если валюты не найдены.
         """
-        if base_currency.upper() == target_currency.upper():
-            return 1.0
+        return ExchangeRateService.get_rate_quote(base_currency, target_currency).rate
+
+    @staticmethod
+    def get_rate_quote(base_currency: str, target_currency: str, as_of: Optional[date] = None) -> RateQuote:
+        """
+        Курс с датой публикации и признаком устаревания.
+
+        Без as_of (или с сегодняшней датой) - текущий курс: из кэша процесса, затем из таблицы
+        ExchangeRate, если она загружена не раньше EXCHANGE_RATE_CACHE_SECONDS назад, и только
+        потом из API. Если API недоступен, возвращается последний сохраненный курс со stale=True.
+        С прошедшей датой as_of - последний сохраненный курс на эту дату (API отдает только текущие
+        курсы, поэтому история копится с момента первых запросов).
+        """
+        base_currency, target_currency = base_currency.upper(), target_currency.upper()
+        today = datetime.utcnow().date()
+        if base_currency == target_currency:
+            return RateQuote(1.0, as_of or today)
+
+        if as_of is not None and as_of < today:
+            quote = get_fx_rate_history().as_of(base_currency, target_currency, as_of)
+            if quote is None:
+                raise ValueError(f"Нет сохраненного курса {base_currency}/{target_currency} на {as_of.isoformat()}.")
+            return quote
+
+        table = cache.get(RATE_TABLE_CACHE_KEY.format(base_currency))
+        if table is None:
+            # Кэш проверяется повторно внутри single-flight: ожидающие получают уже загруженную таблицу
+            table = _rate_flight.do(base_currency, ExchangeRateService._load_rate_table, base_currency)
+        rate = table['rates'].get(target_currency)
+        if rate is None:
+            raise ValueError(f"Одна из валют ({base_currency} или {target_currency}) не поддерживается API.")
+        return RateQuote(float(rate), date.fromisoformat(table['date']), table['stale'])
+
+    @staticmethod
+    def _load_rate_table(base_currency: str) -> Dict:
+        """Таблица курсов base_currency: из БД, если она свежая, иначе из API с откатом на последнюю сохраненную."""
+        cache_key = RATE_TABLE_CACHE_KEY.format(base_currency)
+        table = cache.get(cache_key)
+        if table is not None:
+            return table
+
+        history = get_fx_rate_history()
+        stored = history.latest(base_currency)
+        if stored and (datetime.utcnow() - stored.fetched_at).total_seconds() < EXCHANGE_RATE_CACHE_SECONDS:
+            table = {'date': stored.date.isoformat(), 'rates': json.loads(stored.rates), 'stale': False}
+            cache.set(cache_key, table, timeout=EXCHANGE_RATE_CACHE_SECONDS)
+            return table
+
+        try:
+            day, rates = ExchangeRateService._fetch_rate_table(base_currency)
+        except ValueError as e:
+            if stored is None:
+                raise
+            current_app.logger.warning(f"API курсов недоступен ({e}), используем курсы {base_currency} на {stored.date}")
+            table = {'date': stored.date.isoformat(), 'rates': json.loads(stored.rates), 'stale': True}
+            # Устаревшую таблицу держим недолго, чтобы скоро снова попробовать API
+            cache.set(cache_key, table, timeout=EXCHANGE_RATE_STALE_RETRY_SECONDS)
+            return table
+
+        history.record(base_currency, day, rates)
+        table = {'date': day.isoformat(), 'rates': rates, 'stale': False}
+        cache.set(cache_key, table, timeout=EXCHANGE_RATE_CACHE_SECONDS)
+        return table
+
+    @staticmethod
+    def _fetch_rate_table(base_currency: str) -> Tuple[date, Dict[str, float]]:
+        """Запрос всей таблицы курсов base_currency (эндпоинт latest) - один запрос на все целевые валюты."""
+        # requests нужен только при промахе кэша; не замедляем им импорт приложения
+        import requests
 
         api_key = os.getenv('EXCHANGE_RATE_API_KEY')
         if not api_key:
             current_app.logger.error("EXCHANGE_RATE_API_KEY не найден в переменных окружения.")
             raise ValueError("API ключ для обменных курсов не настроен.")
 
-        url = f"{API_BASE_URL}/{api_key}/pair/{base_currency.upper()}/{target_currency.upper()}"
+        url = f"{API_BASE_URL}/{api_key}/latest/{base_currency}"
         
         try:
             response = requests.get(url, timeout=10) # Таймаут 10 секунд
             response.raise_for_status()  # Вызовет исключение для HTTP ошибок 4xx/5xx
-            data = response.json()
-
-            if data.get('result') == 'success':
-                rate = data.get('conversion_rate')
-                if rate is not None:
-                    current_app.logger.info(f"Получен курс: 1 {base_currency} = {rate} {target_currency}")
-                    return float(rate)
-                else:
-                    current_app.logger.error(f"Ключ 'conversion_rate' отсутствует в ответе API для {base_currency}/{target_currency}. Ответ: {data}")
-                    raise ValueError(f"Не удалось получить курс для {base_currency}/{target_currency}: ключ 'conversion_rate' отсутствует.")
-            else:
-                error_type = data.get('error-type', 'unknown_error')
-                current_app.logger.error(f"Ошибка API exchangerate: {error_type} для {base_currency}/{target_currency}. Ответ: {data}")
-                # Предоставляем более информативное сообщение пользователю/разработчику
-                if error_type == "invalid-key":
-                    raise ValueError("Недействительный API ключ для exchangerate-api.com.")
-                elif error_type == "inactive-account":
-                    raise ValueError("Аккаунт exchangerate-api.com неактивен.")
-                elif error_type == "unsupported-code":
-                     raise ValueError(f"Одна из валют ({base_currency} или {target_currency}) не поддерживается API.")
-                else:
-                    raise ValueError(f"Ошибка API при получении курса для {base_currency}/{target_currency}: {error_type}")
+            day, rates = rates_from_latest_response(response.json(), base_currency)
+            current_app.logger.info(f"Получена таблица курсов {base_currency} на {day}: {len(rates)} валют")
+            return day, rates
 
         except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Ошибка запроса к API обменных курсов для {base_currency}/{target_currency}: {e}")
-            raise ValueError(f"Сетевая ошибка при получении курса для {base_currency}/{target_currency}.")
+            current_app.logger.error(f"Ошибка запроса к API обменных курсов для {base_currency}: {e}")
+            raise ValueError(f"Сетевая ошибка при получении курсов для {base_currency}.")
         except ValueError as e: # Перехватываем ValueError, которые мы сами генерируем выше
             # Логгируем и снова выбрасываем, чтобы не попасть в общий Exception ниже с менее специфичным сообщением
-            current_app.logger.error(f"Ошибка значения при обработке ответа API для {base_currency}/{target_currency}: {e}")
+            current_app.logger.error(f"Ошибка значения при обработке ответа API для {base_currency}: {e}")
             raise
         except Exception as e: # Общий обработчик для других неожиданных ошибок (например, json.JSONDecodeError)
-            current_app.logger.error(f"Неожиданная ошибка при получении курса для {base_currency}/{target_currency}: {e}")
-            raise ValueError(f"Неожиданная ошибка при получении курса для {base_currency}/{target_currency}.")
+            current_app.logger.error(f"Неожиданная ошибка при получении курсов для {base_currency}: {e}")
+            raise ValueError(f"Неожиданная ошибка при получении курсов для {base_currency}.")
+
+
+def rates_from_latest_response(data: dict, base_currency: str) -> Tuple[date, Dict[str, float]]:
+    """Извлекает дату публикации и таблицу курсов из ответа latest-эндпоинта."""
+    if data.get('result') == 'success':
+        rates = data.get('conversion_rates')
+        if not rates:
+            logger.error(f"Ключ 'conversion_rates' отсутствует в ответе API для {base_currency}. Ответ: {data}")
+            raise ValueError(f"Не удалось получить курсы для {base_currency}: ключ 'conversion_rates' отсутствует.")
+        updated = data.get('time_last_update_unix')
+        day = datetime.utcfromtimestamp(updated).date() if updated else datetime.utcnow().date()
+        return day, {code: float(rate) for code, rate in rates.items()}
+    raise_api_error(data, base_currency)
+
+
+def raise_api_error(data: dict, base_currency: str, target_currency: Optional[str] = None):
+    """ValueError с понятным сообщением по ответу API с result=error."""
+    error_type = data.get('error-type', 'unknown_error')
+    pair = f"{base_currency}/{target_currency}" if target_currency else base_currency
+    logger.error(f"Ошибка API exchangerate: {error_type} для {pair}. Ответ: {data}")
+    # Предоставляем более информативное сообщение пользователю/разработчику
+    if error_type == "invalid-key":
+        raise ValueError("Недействительный API ключ для exchangerate-api.com.")
+    elif error_type == "inactive-account":
+        raise ValueError("Аккаунт exchangerate-api.com неактивен.")
+    elif error_type == "unsupported-code":
+        raise ValueError(f"Валюта не поддерживается API: {pair}.")
+    raise ValueError(f"Ошибка API при получении курса для {pair}: {error_type}")
+
+
+class AsyncExchangeRateClient:
+    """Неблокирующий клиент exchangerate-api для асинхронного режима (app/asgi.py).
+
+    Работает как синхронный ExchangeRateService.get_rate_quote: таблица курсов базовой валюты
+    берется из кэша процесса, затем из свежей строки ExchangeRate, затем из API (эндпоинт
+    latest) и сохраняется в ExchangeRate через async engine. Если API недоступен, отдается
+    последняя сохраненная таблица со stale=True и кэшируется на EXCHANGE_RATE_STALE_RETRY_SECONDS.
+    Одновременные промахи по одной базовой валюте ждут один общий запрос. Без engine таблицы
+    не сохраняются и откатываться не на что.
+    """
+
+    def __init__(self, engine=None, timeout: float = 10.0, cache_seconds: float = EXCHANGE_RATE_CACHE_SECONDS,
+                 stale_retry_seconds: float = EXCHANGE_RATE_STALE_RETRY_SECONDS):
+        import httpx
+
+        self._httpx = httpx
+        self._client = httpx.AsyncClient(timeout=timeout)
+        self.engine = engine
+        self.cache_seconds = cache_seconds
+        self.stale_retry_seconds = stale_retry_seconds
+        self._tables: Dict[str, Tuple[Dict, float]] = {}
+        self._flight = AsyncSingleFlight()
+
+    async def get_exchange_rate(self, base_currency: str, target_currency: str) -> float:
+        return (await self.get_rate_quote(base_currency, target_currency)).rate
+
+    async def get_rate_quote(self, base_currency: str, target_currency: str) -> RateQuote:
+        base_currency, target_currency = base_currency.upper(), target_currency.upper()
+        if base_currency == target_currency:
+            return RateQuote(1.0, datetime.utcnow().date())
+        table = self._cached_table(base_currency)
+        if table is None:
+            table = await self._flight.do(base_currency, self._load_rate_table, base_currency)
+        rate = table['rates'].get(target_currency)
+        if rate is None:
+            raise ValueError(f"Одна из валют ({base_currency} или {target_currency}) не поддерживается API.")
+        return RateQuote(float(rate), date.fromisoformat(table['date']), table['stale'])
+
+    def _cached_table(self, base_currency: str) -> Optional[Dict]:
+        cached = self._tables.get(base_currency)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    def _cache_table(self, base_currency: str, table: Dict, seconds: float) -> Dict:
+        self._tables[base_currency] = (table, time.monotonic() + seconds)
+        return table
+
+    async def _load_rate_table(self, base_currency: str) -> Dict:
+        table = self._cached_table(base_currency)
+        if table is not None:
+            return table
+        stored = await self._latest_stored(base_currency)
+        if stored and (datetime.utcnow() - stored.fetched_at).total_seconds() < self.cache_seconds:
+            return self._cache_table(base_currency, {'date': stored.date.isoformat(), 'rates': json.loads(stored.rates),
+                                                     'stale': False}, self.cache_seconds)
+        try:
+            day, rates = await self._fetch_rate_table(base_currency)
+        except ValueError as e:
+            if stored is None:
+                raise
+            logger.warning(f"API курсов недоступен ({e}), используем курсы {base_currency} на {stored.date}")
+            return self._cache_table(base_currency, {'date': stored.date.isoformat(), 'rates': json.loads(stored.rates),
+                                                     'stale': True}, self.stale_retry_seconds)
+        await self._record(base_currency, day, rates)
+        return self._cache_table(base_currency, {'date': day.isoformat(), 'rates': rates, 'stale': False},
+                                 self.cache_seconds)
+
+    async def _latest_stored(self, base_currency: str):
+        if self.engine is None:
+            return None
+        from sqlalchemy import select
+        from app.models.exchange_rate import ExchangeRate
+
+        table = ExchangeRate.__table__
+        async with self.engine.connect() as connection:
+            return (await connection.execute(
+                select(table.c.date, table.c.rates, table.c.fetched_at).where(table.c.base == base_currency)
+                .order_by(table.c.date.desc(), table.c.fetched_at.desc()).limit(1))).first()
+
+    async def _record(self, base_currency: str, day: date, rates: Dict[str, float]) -> None:
+        """Сохранить таблицу в ExchangeRate, как FxRateHistory.record в синхронном режиме."""
+        if self.engine is None:
+            return
+        from sqlalchemy.exc import IntegrityError
+        from app.services.fx_rate_history import rate_table_statements
+
+        update, insert = rate_table_statements(base_currency, day, rates)
+        try:
+            async with self.engine.begin() as connection:
+                if not (await connection.execute(update)).rowcount:
+                    await connection.execute(insert)
+        except IntegrityError:
+            # Эту же таблицу одновременно записал другой воркер
+            logger.info(f"Таблица курсов {base_currency} на {day} уже сохранена другим процессом")
+
+    async def _fetch_rate_table(self, base_currency: str) -> Tuple[date, Dict[str, float]]:
+        api_key = os.getenv('EXCHANGE_RATE_API_KEY')
+        if not api_key:
+            logger.error("EXCHANGE_RATE_API_KEY не найден в переменных окружения.")
+            raise ValueError("API ключ для обменных курсов не настроен.")
+        url = f"{API_BASE_URL}/{api_key}/latest/{base_currency}"
+        try:
+            response = await self._client.get(url)
+            response.raise_for_status()
+            data = response.json()
+        except self._httpx.HTTPError as e:
+            logger.error(f"Ошибка запроса к API обменных курсов для {base_currency}: {e}")
+            raise ValueError(f"Сетевая ошибка при получении курсов для {base_currency}.")
+        except Exception as e:
+            logger.error(f"Неожиданная ошибка при получении курсов для {base_currency}: {e}")
+            raise ValueError(f"Неожиданная ошибка при получении курсов для {base_currency}.")
+        return rates_from_latest_response(data, base_currency)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
 
 # Пример использования (можно раскомментировать для тестирования)
 # if __name__ == '__main__':
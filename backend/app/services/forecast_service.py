@@ -0,0 +1,266 @@
+"""Краткосрочный прогноз цен металлов: пакетная подгонка простых моделей для всех металлов сразу.
+
+Ряд каждого металла приводится к дневной сетке за последние FORECAST_WINDOW_DAYS дней
+(цена закрытия дня, пропущенные дни - последней известной ценой), ряды складываются в
+матрицу металлы x дни, и каждая модель считается векторно по всем металлам (numpy):
+
+- ewma - простое экспоненциальное сглаживание, прогноз - последний уровень;
+- holt - метод Холта (уровень + линейный тренд); сезонность Holt-Winters для дневных цен
+  металлов не используется;
+- log_linear - линейная регрессия логарифма цены по времени.
+
+Для каждой модели хранится прогноз на 1..FORECAST_HORIZON_DAYS дней с доверительным
+интервалом FORECAST_CONFIDENCE. Прогнозы пересчитываются после записи новых цен
+(FORECAST_ON_INGEST) и ночью, сохраняются в MetalForecast и отдаются из кэша.
+"""
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence
+import json
+import logging
+import time
+from flask import current_app
+from app import cache, db
+from app.models.metal import Metal, MetalForecast, MetalPrice
+
+logger = logging.getLogger(__name__)
+
+FORECAST_CACHE_KEY = 'metal_forecast:{}'
+FORECAST_MODELS = ('ewma', 'holt', 'log_linear')
+
+
+def ewma_forecast(Y, horizon: int, alpha: float, z: float):
+    """Простое экспоненциальное сглаживание по строкам Y (металлы x дни): (mean, lower, upper), каждый M x horizon."""
+    import numpy as np
+
+    level = Y[:, 0].copy()
+    squared = np.zeros(len(Y))
+    for t in range(1, Y.shape[1]):
+        error = Y[:, t] - level
+        squared += error * error
+        level += alpha * error
+    sigma = np.sqrt(squared / (Y.shape[1] - 1))
+    steps = np.arange(1, horizon + 1)
+    mean = np.repeat(level[:, None], horizon, axis=1)
+    # Дисперсия ошибки прогноза SES на h шагов: sigma^2 * (1 + (h - 1) * alpha^2)
+    half_width = z * sigma[:, None] * np.sqrt(1 + (steps - 1) * alpha ** 2)
+    return mean, mean - half_width, mean + half_width
+
+
+def holt_forecast(Y, horizon: int, alpha: float, beta: float, z: float):
+    """Метод Холта (аддитивный тренд) по строкам Y: (mean, lower, upper), каждый M x horizon."""
+    import numpy as np
+
+    level = Y[:, 0].copy()
+    trend = Y[:, 1] - Y[:, 0]
+    squared = np.zeros(len(Y))
+    for t in range(1, Y.shape[1]):
+        error = Y[:, t] - (level + trend)
+        squared += error * error
+        # Форма коррекции ошибки: то же, что l = a*y + (1-a)*(l+b), b = beta*(l_new-l) + (1-beta)*b
+        level = level + trend + alpha * error
+        trend = trend + alpha * beta * error
+    sigma = np.sqrt(squared / (Y.shape[1] - 1))
+    steps = np.arange(1, horizon + 1)
+    mean = level[:, None] + steps * trend[:, None]
+    # Дисперсия на h шагов: sigma^2 * (1 + sum_{j<h} alpha^2 * (1 + j*beta)^2)
+    factor = 1 + np.concatenate(([0.0], np.cumsum(alpha ** 2 * (1 + steps[:-1] * beta) ** 2)))
+    half_width = z * sigma[:, None] * np.sqrt(factor)
+    return mean, mean - half_width, mean + half_width
+
+
+def log_linear_forecast(Y, horizon: int, z: float):
+    """Линейная регрессия log-цены по дню по строкам Y: (mean, lower, upper), интервал - прогнозный."""
+    import numpy as np
+
+    log_y = np.log(Y)
+    n = Y.shape[1]
+    x = np.arange(n, dtype=float)
+    x_mean = x.mean()
+    sxx = ((x - x_mean) ** 2).sum()
+    y_mean = log_y.mean(axis=1)
+    slope = ((log_y - y_mean[:, None]) * (x - x_mean)).sum(axis=1) / sxx
+    intercept = y_mean - slope * x_mean
+    residuals = log_y - (intercept[:, None] + slope[:, None] * x)
+    s = np.sqrt((residuals ** 2).sum(axis=1) / (n - 2))
+    x_future = n - 1 + np.arange(1, horizon + 1)
+    center = intercept[:, None] + slope[:, None] * x_future
+    se = s[:, None] * np.sqrt(1 + 1 / n + (x_future - x_mean) ** 2 / sxx)
+    return np.exp(center), np.exp(center - z * se), np.exp(center + z * se)
+
+
+def daily_matrix(series: Sequence[Sequence], window_days: int):
+    """Ряды [(dates, prices)] -> матрица M x window_days дневных цен до последнего дня каждого ряда.
+
+    Берется последняя цена дня; дни без цены заполняются предыдущей ценой, дни до первой
+    цены в окне - первой ценой.
+    """
+    import numpy as np
+
+    Y = np.full((len(series), window_days), np.nan)
+    for row, (dates, prices) in enumerate(series):
+        last_day = dates[-1]
+        offsets = np.array([(day - last_day).days for day in dates]) + window_days - 1
+        inside = offsets >= 0
+        # Ряд отсортирован по времени: при повторе дня остается последняя цена
+        Y[row, offsets[inside]] = np.asarray(prices, dtype=float)[inside]
+    observed = ~np.isnan(Y)
+    index = np.where(observed, np.arange(window_days), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    Y = Y[np.arange(len(series))[:, None], index]
+    first = Y[np.arange(len(series)), observed.argmax(axis=1)]
+    return np.where(np.isnan(Y), first[:, None], Y), observed.sum(axis=1)
+
+
+class ForecastBatch:
+    """Подгонка всех моделей для набора металлов за один проход и запись прогнозов в MetalForecast."""
+
+    def __init__(self, window_days: int = 90, horizon_days: int = 7, alpha: float = 0.3, beta: float = 0.1,
+                 confidence: float = 0.95, min_points: int = 10):
+        if window_days < 3 or horizon_days < 1:
+            raise ValueError('window_days must be at least 3 and horizon_days at least 1')
+        if not 0 < confidence < 1:
+            raise ValueError('confidence must be between 0 and 1')
+        self.window_days = window_days
+        self.horizon_days = horizon_days
+        self.alpha = alpha
+        self.beta = beta
+        self.confidence = confidence
+        self.min_points = min_points
+
+    def run(self, symbols: Optional[Sequence[str]] = None) -> Dict:
+        """Пересчитать прогнозы металлов symbols (по умолчанию всех); вызывается в контексте приложения."""
+        started = time.perf_counter()
+        query = Metal.query
+        if symbols is not None:
+            query = query.filter(Metal.symbol.in_([symbol.upper() for symbol in symbols]))
+        metals = {metal.id: metal for metal in query.all()}
+        series = self._load_series(metals)
+        fitted = list(series)
+        results = {}
+        if fitted:
+            Y, observed = daily_matrix([series[metal_id] for metal_id in fitted], self.window_days)
+            keep = observed >= self.min_points
+            fitted = [metal_id for metal_id, ok in zip(fitted, keep) if ok]
+            Y = Y[keep]
+        if fitted:
+            z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+            models = {
+                'ewma': ewma_forecast(Y, self.horizon_days, self.alpha, z),
+                'holt': holt_forecast(Y, self.horizon_days, self.alpha, self.beta, z),
+                'log_linear': log_linear_forecast(Y, self.horizon_days, z),
+            }
+            created_at = datetime.utcnow()
+            for row, metal_id in enumerate(fitted):
+                as_of = series[metal_id][0][-1]
+                dates = [(as_of + timedelta(days=step)).isoformat() for step in range(1, self.horizon_days + 1)]
+                results[metal_id] = {
+                    'metal': metals[metal_id].symbol,
+                    'unit': metals[metal_id].unit,
+                    'as_of': as_of.isoformat(),
+                    'last_price': round(float(Y[row, -1]), 6),
+                    'window_days': self.window_days,
+                    'horizon_days': self.horizon_days,
+                    'confidence': self.confidence,
+                    'created_at': created_at.isoformat(),
+                    'models': {name: [{
+                        'date': day,
+                        'value': round(float(mean[row, step]), 6),
+                        'lower': round(float(lower[row, step]), 6),
+                        'upper': round(float(upper[row, step]), 6)
+                    } for step, day in enumerate(dates)] for name, (mean, lower, upper) in models.items()}
+                }
+            self._store(results, created_at)
+
+        report = {
+            'metals': len(metals),
+            'forecasts': len(results),
+            'window_days': self.window_days,
+            'horizon_days': self.horizon_days,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+        logger.info(f"Пакетный прогноз цен: {report}")
+        return report
+
+    def _load_series(self, metals: Dict[int, Metal]) -> Dict[int, tuple]:
+        """Ряды (даты, цены) металлов за окно до последней цены каждого - одним запросом."""
+        if not metals:
+            return {}
+        # Окно отсчитывается от последней цены металла, а не от сегодня: история могла отстать
+        last = dict(db.session.query(MetalPrice.metal_id, db.func.max(MetalPrice.timestamp))
+                    .filter(MetalPrice.metal_id.in_(list(metals))).group_by(MetalPrice.metal_id).all())
+        if not last:
+            return {}
+        start = min(last.values()) - timedelta(days=self.window_days)
+        rows = db.session.query(MetalPrice.metal_id, MetalPrice.timestamp, MetalPrice.price)\
+            .filter(MetalPrice.metal_id.in_(list(last)), MetalPrice.timestamp >= start)\
+            .order_by(MetalPrice.metal_id, MetalPrice.timestamp.asc()).all()
+        series: Dict[int, tuple] = {}
+        for metal_id, timestamp, price in rows:
+            if price > 0:
+                dates, prices = series.setdefault(metal_id, ([], []))
+                dates.append(timestamp.date())
+                prices.append(price)
+        return series
+
+    @staticmethod
+    def _store(results: Dict[int, Dict], created_at: datetime) -> None:
+        MetalForecast.query.filter(MetalForecast.metal_id.in_(list(results))).delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(MetalForecast, [{
+            'metal_id': metal_id,
+            'as_of': date.fromisoformat(forecast['as_of']),
+            'window_days': forecast['window_days'],
+            'horizon_days': forecast['horizon_days'],
+            'payload': json.dumps(forecast, separators=(',', ':')),
+            'created_at': created_at
+        } for metal_id, forecast in results.items()])
+        db.session.commit()
+        cache.delete_many(*(FORECAST_CACHE_KEY.format(forecast['metal']) for forecast in results.values()))
+
+
+class ForecastService:
+    """Чтение прогнозов для /api/metals/forecast: кэш, затем строка MetalForecast."""
+
+    @staticmethod
+    def get(metal_symbol: str, model: Optional[str] = None) -> Optional[Dict]:
+        if model is not None and model not in FORECAST_MODELS:
+            raise ValueError(f"Invalid model. Use one of: {', '.join(FORECAST_MODELS)}")
+        symbol = metal_symbol.upper()
+        cache_key = FORECAST_CACHE_KEY.format(symbol)
+        forecast = cache.get(cache_key)
+        if forecast is None:
+            row = db.session.query(MetalForecast.payload).join(Metal, MetalForecast.metal_id == Metal.id)\
+                .filter(Metal.symbol == symbol).first()
+            # Запрос не запускает расчет: прогнозы считают загрузка цен и ночной пакет. Отсутствие
+            # прогноза (мало точек, новая база) тоже кэшируется - пустым dict, до записи прогноза
+            # металла (ForecastBatch._store сбрасывает ключ) или истечения FORECAST_CACHE_SECONDS
+            forecast = json.loads(row[0]) if row is not None else {}
+            cache.set(cache_key, forecast, timeout=current_app.config['FORECAST_CACHE_SECONDS'])
+        if not forecast:
+            return None
+        if model is not None:
+            forecast = dict(forecast, models={model: forecast['models'][model]})
+        return forecast
+
+
+def forecast_batch_from_config(config) -> ForecastBatch:
+    return ForecastBatch(
+        window_days=config['FORECAST_WINDOW_DAYS'],
+        horizon_days=config['FORECAST_HORIZON_DAYS'],
+        alpha=config['FORECAST_ALPHA'],
+        beta=config['FORECAST_BETA'],
+        confidence=config['FORECAST_CONFIDENCE'],
+        min_points=config['FORECAST_MIN_POINTS']
+    )
+
+
+def refresh_forecasts(saved_prices: List[Dict]) -> None:
+    """Пересчет прогнозов металлов, цены которых только что записаны; ошибки не прерывают загрузку цен."""
+    if not current_app.config['FORECAST_ON_INGEST']:
+        return
+    try:
+        forecast_batch_from_config(current_app.config).run(
+            sorted({price_data['symbol'].upper() for price_data in saved_prices}))
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Ошибка пересчета прогнозов: {e}", exc_info=True)
@@ -0,0 +1,115 @@
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import json
+import logging
+import threading
+import time
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.exchange_rate import ExchangeRate
+
+logger = logging.getLogger(__name__)
+
+
+class RateQuote(NamedTuple):
+    """Курс с датой, на которую он опубликован; stale - API недоступен и отдан последний известный курс."""
+    rate: float
+    date: date
+    stale: bool = False
+
+
+class FxRateHistory:
+    """История таблиц курсов (таблица ExchangeRate) с поиском курса "на дату" бинарным поиском.
+
+    Для каждой базовой валюты в памяти держится отсортированный список дат и параллельный
+    список таблиц курсов. Индекс строится из БД при первом обращении и перечитывается не
+    реже раза в max_age секунд, чтобы увидеть строки, записанные другими воркерами.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._series: Dict[str, Tuple[List[date], List[Dict[str, float]]]] = {}
+        self._loaded_at: Dict[str, float] = {}
+
+    def as_of(self, base: str, target: str, day: date) -> Optional[RateQuote]:
+        """Последний сохраненный курс base/target на дату day или раньше; None, если его нет."""
+        dates, tables = self._get_series(base)
+        # Идем назад от найденной даты: в старой таблице валюты могло не быть
+        for i in range(bisect_right(dates, day) - 1, -1, -1):
+            rate = tables[i].get(target)
+            if rate is not None:
+                return RateQuote(float(rate), dates[i])
+        return None
+
+    def rate_series(self, base: str, target: str) -> Tuple[List[date], List[float]]:
+        """Даты и курсы base/target по возрастанию даты - только таблицы, в которых есть target."""
+        dates, tables = self._get_series(base)
+        pairs = [(day, float(table[target])) for day, table in zip(dates, tables) if table.get(target) is not None]
+        return [day for day, _ in pairs], [rate for _, rate in pairs]
+
+    def latest(self, base: str) -> Optional[ExchangeRate]:
+        """Самая свежая сохраненная таблица курсов base."""
+        return ExchangeRate.query.filter_by(base=base)\
+            .order_by(ExchangeRate.date.desc(), ExchangeRate.fetched_at.desc()).first()
+
+    def record(self, base: str, day: date, rates: Dict[str, float]) -> None:
+        """Сохранить таблицу курсов base на дату day (повторная загрузка за тот же день перезаписывает ее).
+
+        Запись идет отдельной транзакцией (db.engine.begin()): сессия вызывающего кода не
+        коммитится и не откатывается.
+        """
+        update, insert = rate_table_statements(base, day, rates)
+        try:
+            with db.engine.begin() as connection:
+                if not connection.execute(update).rowcount:
+                    connection.execute(insert)
+        except IntegrityError:
+            # Эту же таблицу одновременно записал другой воркер
+            logger.info(f"Таблица курсов {base} на {day} уже сохранена другим процессом")
+
+        with self._lock:
+            series = self._series.get(base)
+            if series is None:
+                return
+            # Новые списки вместо изменения на месте: as_of читает индекс без блокировки
+            dates, tables = list(series[0]), list(series[1])
+            i = bisect_right(dates, day)
+            if i and dates[i - 1] == day:
+                tables[i - 1] = rates
+            else:
+                dates.insert(i, day)
+                tables.insert(i, rates)
+            self._series[base] = (dates, tables)
+
+    def _get_series(self, base: str) -> Tuple[List[date], List[Dict[str, float]]]:
+        with self._lock:
+            series = self._series.get(base)
+            if series is not None and time.monotonic() - self._loaded_at[base] < self.max_age:
+                return series
+        rows = db.session.query(ExchangeRate.date, ExchangeRate.rates)\
+            .filter(ExchangeRate.base == base).order_by(ExchangeRate.date).all()
+        series = ([row.date for row in rows], [json.loads(row.rates) for row in rows])
+        with self._lock:
+            self._series[base] = series
+            self._loaded_at[base] = time.monotonic()
+        return series
+
+
+def rate_table_statements(base: str, day: date, rates: Dict[str, float]):
+    """UPDATE и INSERT строки ExchangeRate (base, day): INSERT выполняется, если UPDATE не нашел строку."""
+    table = ExchangeRate.__table__
+    values = {'rates': json.dumps(rates, separators=(',', ':'), sort_keys=True), 'fetched_at': datetime.utcnow()}
+    update = table.update().where(table.c.base == base, table.c.date == day).values(**values)
+    return update, table.insert().values(base=base, date=day, **values)
+
+
+def get_fx_rate_history() -> FxRateHistory:
+    """История курсов текущего приложения (создается при первом обращении)."""
+    from app.services.exchange_rate_service import EXCHANGE_RATE_CACHE_SECONDS
+    history = current_app.extensions.get('fx_rate_history')
+    if history is None:
+        history = current_app.extensions.setdefault('fx_rate_history', FxRateHistory(EXCHANGE_RATE_CACHE_SECONDS))
+    return history
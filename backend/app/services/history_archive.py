@@ -0,0 +1,231 @@
+"""Бинарный архив истории цен, читаемый через mmap.
+
+Формат файла (little-endian):
+
+    заголовок   32 байта   magic 'MPHA', version u16, n_series u16, reserved u32, body_end u64
+    индекс      32 байта на металл: symbol (16 байт ASCII), offset u64, count u64
+    тело        на каждый металл: count * int64 (микросекунды от эпохи, по возрастанию),
+                затем count * float64 (цены)
+    хвост       append-only записи по 24 байта: slot u32, reserved u32, int64 ts, float64 price
+
+Читатели мапят файл и получают memoryview-срезы тела без разбора и копирования;
+все воркеры разделяют одну копию страниц в page cache. Ингест дописывает хвост,
+а compact() сливает хвост в тело и атомарно подменяет файл (os.replace).
+"""
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import mmap
+import os
+import struct
+import threading
+from flask import current_app
+from app.services.price_store import to_epoch_us
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка записи недоступна
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MPHA'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIQ')
+HEADER_SIZE = 32
+INDEX_ENTRY = struct.Struct('<16sQQ')
+TAIL_RECORD = struct.Struct('<IIqd')
+
+
+@contextmanager
+def _exclusive_lock(path: str):
+    """Блокировка записи в архив между процессами (через файл <archive>.lock)."""
+    with open(path + '.lock', 'a+b') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def write_archive(path: str, series: Dict[str, Tuple[List[int], List[float]]]) -> int:
+    """Записывает архив целиком (во временный файл с последующей атомарной подменой).
+
+    series: symbol -> (отсортированные timestamps в мкс, цены). Возвращает число точек.
+    """
+    symbols = sorted(series)
+    offset = HEADER_SIZE + INDEX_ENTRY.size * len(symbols)
+    index = []
+    for symbol in symbols:
+        count = len(series[symbol][0])
+        index.append((symbol, offset, count))
+        offset += count * 16
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        header = HEADER.pack(MAGIC, VERSION, len(symbols), 0, offset)
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        for symbol, entry_offset, count in index:
+            f.write(INDEX_ENTRY.pack(symbol.encode('ascii'), entry_offset, count))
+        for symbol in symbols:
+            timestamps, prices = series[symbol]
+            f.write(struct.pack(f'<{len(timestamps)}q', *timestamps))
+            f.write(struct.pack(f'<{len(prices)}d', *prices))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return sum(len(ts) for ts, _ in series.values())
+
+
+def build_from_db(path: str) -> int:
+    """Строит архив из таблицы MetalPrice (после Excel/mfd бэкфилла или при первом запуске)."""
+    from app import db
+    from app.models.metal import Metal, MetalPrice
+
+    symbols = dict(db.session.query(Metal.id, Metal.symbol))
+    series = {symbol: ([], []) for symbol in symbols.values()}
+    rows = db.session.query(MetalPrice.metal_id, MetalPrice.timestamp, MetalPrice.price)\
+        .order_by(MetalPrice.metal_id, MetalPrice.timestamp)
+    for metal_id, timestamp, price in rows.yield_per(10000):
+        timestamps, prices = series[symbols[metal_id]]
+        timestamps.append(to_epoch_us(timestamp))
+        prices.append(price)
+    with _exclusive_lock(path):
+        total = write_archive(path, series)
+    logger.info(f"Архив истории {path} построен из БД: {total} точек")
+    return total
+
+
+class HistoryArchive:
+    """Читатель (и писатель хвоста) архива истории; общий для потоков одного процесса."""
+
+    def __init__(self, path: str, max_tail: int = 4096):
+        self.path = path
+        self.max_tail = max_tail
+        self._lock = threading.Lock()
+        self._file = None
+        self._inode = None
+        # (mmap, индекс symbol -> (slot, offset, count), хвост slot -> [(ts, price)]);
+        # хранится одним кортежем, чтобы читатели видели согласованное состояние
+        self._state: Tuple[mmap.mmap, Dict[str, Tuple[int, int, int]], Dict[int, List[Tuple[int, float]]]] = None
+        self._open()
+
+    def _open(self):
+        f = open(self.path, 'rb')
+        stat = os.fstat(f.fileno())
+        mm = mmap.mmap(f.fileno(), stat.st_size, access=mmap.ACCESS_READ)
+        magic, version, n_series, _, body_end = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Файл {self.path} не является архивом истории цен версии {VERSION}")
+        index = {}
+        for slot in range(n_series):
+            raw_symbol, offset, count = INDEX_ENTRY.unpack_from(mm, HEADER_SIZE + slot * INDEX_ENTRY.size)
+            index[raw_symbol.rstrip(b'\0').decode('ascii')] = (slot, offset, count)
+        tail = {}
+        tail_bytes = (stat.st_size - body_end) // TAIL_RECORD.size * TAIL_RECORD.size
+        for slot, _, ts, price in TAIL_RECORD.iter_unpack(mm[body_end:body_end + tail_bytes]):
+            tail.setdefault(slot, []).append((ts, price))
+        for points in tail.values():
+            points.sort()
+        # Старый mmap не закрываем явно: на него могут ссылаться выданные читателям memoryview
+        old_file = self._file
+        self._file, self._inode = f, stat.st_ino
+        self._state = (mm, index, tail)
+        if old_file:
+            old_file.close()
+
+    def _refresh_if_changed(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size != len(self._state[0]):
+            with self._lock:
+                if stat.st_ino != self._inode or stat.st_size != len(self._state[0]):
+                    self._open()
+
+    @property
+    def tail_size(self) -> int:
+        return sum(len(points) for points in self._state[2].values())
+
+    def has_metal(self, symbol: str) -> bool:
+        return symbol.upper() in self._state[1]
+
+    def range(self, symbol: str, date_from: datetime, date_to: datetime) -> Tuple[Iterable[int], Iterable[float]]:
+        """(timestamps, prices) за [date_from, date_to].
+
+        Без записей в хвосте это memoryview-срезы mmap без копирования;
+        при наличии хвоста по металлу результат сливается в списки.
+        """
+        self._refresh_if_changed()
+        mm, index, tail = self._state
+        entry = index.get(symbol.upper())
+        if entry is None:
+            return [], []
+        slot, offset, count = entry
+        timestamps = memoryview(mm)[offset:offset + count * 8].cast('q')
+        prices = memoryview(mm)[offset + count * 8:offset + count * 16].cast('d')
+        start_us, end_us = to_epoch_us(date_from), to_epoch_us(date_to)
+        lo = bisect_left(timestamps, start_us)
+        hi = bisect_right(timestamps, end_us)
+        tail_points = [p for p in tail.get(slot, ()) if start_us <= p[0] <= end_us]
+        if not tail_points:
+            return timestamps[lo:hi], prices[lo:hi]
+        merged = dict(zip(timestamps[lo:hi], prices[lo:hi]))
+        merged.update(tail_points)
+        ordered = sorted(merged.items())
+        return [ts for ts, _ in ordered], [price for _, price in ordered]
+
+    def append(self, points: Iterable[Tuple[str, datetime, float]]) -> None:
+        """Дописывает цены в хвост архива; при переполнении хвоста выполняет compact()."""
+        points = list(points)
+        if not points:
+            return
+        with _exclusive_lock(self.path):
+            self._refresh_if_changed()
+            index = self._state[1]
+            if any(symbol.upper() not in index for symbol, _, _ in points):
+                # Новый металл: индекс фиксирован, поэтому пересобираем файл целиком
+                self._compact_locked(extra=points)
+                return
+            records = b''.join(TAIL_RECORD.pack(index[symbol.upper()][0], 0, to_epoch_us(ts), float(price))
+                               for symbol, ts, price in points)
+            with open(self.path, 'ab') as f:
+                f.write(records)
+                f.flush()
+                os.fsync(f.fileno())
+            self._refresh_if_changed()
+            if self.tail_size > self.max_tail:
+                self._compact_locked()
+
+    def compact(self) -> int:
+        """Сливает хвост в тело архива."""
+        with _exclusive_lock(self.path):
+            self._refresh_if_changed()
+            return self._compact_locked()
+
+    def _compact_locked(self, extra: Iterable[Tuple[str, datetime, float]] = ()) -> int:
+        mm, index, tail = self._state
+        series = {}
+        for symbol, (slot, offset, count) in index.items():
+            merged = dict(zip(memoryview(mm)[offset:offset + count * 8].cast('q'),
+                              memoryview(mm)[offset + count * 8:offset + count * 16].cast('d')))
+            merged.update(tail.get(slot, ()))
+            series[symbol] = merged
+        for symbol, ts, price in extra:
+            series.setdefault(symbol.upper(), {})[to_epoch_us(ts)] = float(price)
+        ordered = {}
+        for symbol, merged in series.items():
+            items = sorted(merged.items())
+            ordered[symbol] = ([ts for ts, _ in items], [price for _, price in items])
+        total = write_archive(self.path, ordered)
+        self._refresh_if_changed()
+        return total
+
+
+def get_history_archive() -> Optional[HistoryArchive]:
+    """Архив текущего приложения или None, если он не настроен."""
+    return current_app.extensions.get('history_archive')
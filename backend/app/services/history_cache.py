@@ -0,0 +1,180 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+import threading
+import time
+from flask import current_app
+
+# Разрешения истории: размер корзины в микросекундах (0 - все точки без прореживания)
+RESOLUTIONS = {'raw': 0, 'hour': 3600 * 1_000_000, 'day': 86400 * 1_000_000}
+
+
+def normalize_range(start_us: int, end_us: int, bucket_us: int) -> Tuple[int, int]:
+    """Границы запроса, выровненные по корзинам: начало - к началу корзины, конец - к ее концу.
+
+    Так '2024-01-01' и '2024-01-01T00:00:00', а для day и любые моменты внутри дня, дают один ключ кэша.
+    """
+    if not bucket_us:
+        return start_us, end_us
+    return start_us - start_us % bucket_us, end_us - end_us % bucket_us + bucket_us - 1
+
+
+def downsample(timestamps: Sequence[int], prices: Sequence[float], bucket_us: int) -> Tuple[List[int], List[float]]:
+    """Последняя цена (close) в каждой корзине; момент точки - начало корзины."""
+    out_timestamps: List[int] = []
+    out_prices: List[float] = []
+    for ts, price in zip(timestamps, prices):
+        bucket = ts - ts % bucket_us
+        if out_timestamps and out_timestamps[-1] == bucket:
+            out_prices[-1] = price
+        else:
+            out_timestamps.append(bucket)
+            out_prices.append(price)
+    return out_timestamps, out_prices
+
+
+class _IntervalIndex:
+    """Интервалы [start, end] одного металла, отсортированные по началу.
+
+    max_end[i] - максимум концов среди первых i+1 интервалов: поиск пересечений идет назад
+    от последнего интервала, начавшегося не позже точки, и останавливается, как только
+    ни один из оставшихся слева интервалов не может до нее дотянуться.
+    """
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.keys: List[Hashable] = []
+        self.max_end: List[int] = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, start: int, end: int, key: Hashable) -> None:
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.keys.insert(i, key)
+        self.max_end.insert(i, 0)
+        self._rebuild_max_end(i)
+
+    def remove(self, start: int, key: Hashable) -> None:
+        i = bisect_left(self.starts, start)
+        while self.keys[i] != key:
+            i += 1
+        del self.starts[i], self.ends[i], self.keys[i], self.max_end[i]
+        self._rebuild_max_end(i)
+
+    def overlapping(self, lo: int, hi: int) -> List[Hashable]:
+        """Ключи интервалов, пересекающихся с [lo, hi]."""
+        found = []
+        for i in range(bisect_right(self.starts, hi) - 1, -1, -1):
+            if self.max_end[i] < lo:
+                break
+            if self.ends[i] >= lo:
+                found.append(self.keys[i])
+        return found
+
+    def _rebuild_max_end(self, i: int) -> None:
+        running = self.max_end[i - 1] if i else -1
+        for j in range(i, len(self.ends)):
+            running = max(running, self.ends[j])
+            self.max_end[j] = running
+
+
+class HistoryRangeCache:
+    """Кэш результатов запросов истории по ключу (metal, нормализованный диапазон, разрешение).
+
+    Запись цен сбрасывает только те закэшированные диапазоны, которые содержат записанные
+    моменты (индекс интервалов по каждому металлу), поэтому новый тик за сегодня не
+    затрагивает многолетние графики, закончившиеся раньше. Кэш живет в памяти процесса:
+    записи других воркеров он не видит, поэтому каждая запись живет не дольше ttl секунд.
+    Объем ограничен max_points точками, вытесняются давно не использованные записи.
+    """
+
+    def __init__(self, ttl: float = 300, max_points: int = 2_000_000):
+        self.ttl = ttl
+        self.max_points = max_points
+        self._lock = threading.Lock()
+        # key -> (start, end, expires_at, series)
+        self._entries: 'OrderedDict[Tuple, Tuple[int, int, float, Tuple[Sequence[int], Sequence[float]]]]' = OrderedDict()
+        self._indexes: Dict[str, _IntervalIndex] = {}
+        self._points = 0
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    @property
+    def version(self) -> int:
+        """Счетчик сбросов; put() с версией до сброса не сохраняет (возможно устаревший) результат."""
+        return self._version
+
+    def get(self, key: Tuple) -> Optional[Tuple[Sequence[int], Sequence[float]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, key: Tuple, start: int, end: int, series: Tuple[Sequence[int], Sequence[float]],
+            version: int) -> None:
+        size = len(series[0])
+        if size > self.max_points:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (start, end, time.monotonic() + self.ttl, series)
+            self._indexes.setdefault(key[0], _IntervalIndex()).add(start, end, key)
+            self._points += size
+            while self._points > self.max_points:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_points(self, symbol: str, timestamps: Iterable[int]) -> int:
+        """Сбросить диапазоны металла, содержащие любой из моментов timestamps (микросекунды)."""
+        return self.invalidate_ranges(symbol, ((ts, ts) for ts in timestamps))
+
+    def invalidate_ranges(self, symbol: Optional[str], ranges: Iterable[Tuple[int, int]]) -> int:
+        """Сбросить диапазоны, пересекающиеся с ranges; symbol=None - для всех металлов."""
+        ranges = list(ranges)
+        with self._lock:
+            self._version += 1
+            indexes = [self._indexes.get(symbol)] if symbol else list(self._indexes.values())
+            keys = {key for index in indexes if index for lo, hi in ranges for key in index.overlapping(lo, hi)}
+            for key in keys:
+                self._drop(key)
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._indexes.clear()
+            self._points = 0
+
+    def _drop(self, key: Tuple) -> None:
+        start, _, _, series = self._entries.pop(key)
+        index = self._indexes[key[0]]
+        index.remove(start, key)
+        if not len(index):
+            del self._indexes[key[0]]
+        self._points -= len(series[0])
+
+
+def get_history_cache() -> Optional[HistoryRangeCache]:
+    """Кэш истории текущего приложения или None, если он выключен (HISTORY_CACHE_SECONDS=0)."""
+    cache = current_app.extensions.get('history_cache')
+    if cache is None and current_app.config['HISTORY_CACHE_SECONDS'] > 0:
+        cache = current_app.extensions.setdefault('history_cache', HistoryRangeCache(
+            ttl=current_app.config['HISTORY_CACHE_SECONDS'],
+            max_points=current_app.config['HISTORY_CACHE_MAX_POINTS']))
+    return cache
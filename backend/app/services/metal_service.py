@@ -1,168 +1,485 @@
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Tuple
 import statistics
 import json
+import logging
 import os
 from flask import current_app
-from app import db
-from app.models.metal import Metal, MetalPrice, MetalAnalysis
-from app.services.alpha_vantage_service import MetalParserService
+from app import db, cache
+from app.models.metal import Metal, MetalPrice, MetalAnalysis, QuarantinedPrice
+from app.services.alert_engine import evaluate_alerts
 from app.services.exchange_rate_service import ExchangeRateService
+from app.services.forecast_service import refresh_forecasts
+from app.services.price_store import get_price_store, from_epoch_us, to_epoch_us
+from app.services.history_archive import get_history_archive
+from app.services.history_cache import RESOLUTIONS, downsample, get_history_cache, normalize_range
+from app.services.price_stream import price_stream_hub, record_price_changes
+from app.services.price_filter import get_price_filter
+from app.services.single_flight import SingleFlight
+from app.tasks.partitions import get_price_partitions
+
+logger = logging.getLogger(__name__)
 
 # Определяем путь к директории Data Lake и файлу лога
-DATA_LAKE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data_lake') # Папка data_lake будет в backend/data_lake
+DATA_LAKE_DIR = os.getenv('DATA_LAKE_DIR', os.path.join(os.path.dirname(__file__), '..', 'data_lake')) # Папка data_lake будет в backend/data_lake
 PRICE_LOG_FILE = os.path.join(DATA_LAKE_DIR, 'price_log.json')
 
 # Базовая валюта, в которой хранятся цены в БД (по умолчанию)
 DEFAULT_BASE_CURRENCY = "USD"
+# Валюта цен металлов с единицей 'gram' (init_db.py загружает учетные цены ЦБ РФ в рублях за грамм)
+GRAM_PRICE_CURRENCY = os.getenv('GRAM_PRICE_CURRENCY', 'RUB')
+
+# Граммов в единице массы; цены хранятся за тройскую унцию ('USD/oz') или за грамм ('gram')
+GRAMS_PER_UNIT = {'g': 1.0, 'gram': 1.0, 'kg': 1000.0, 'oz': 31.1034768, 'troy_oz': 31.1034768}
+
+# Ключи кэша последних цен и результатов анализа; сбрасываются в update_prices
+SNAPSHOT_CACHE_KEY = 'metal_price_snapshot'
+ANALYSIS_CACHE_KEY = 'metal_analysis:{}:{}'
+# Окна анализа в днях: считаются ночным пакетом (app/tasks/analytics.py), по запросу - любое из них
+ANALYSIS_WINDOWS = (7, 30, 90, 365)
+DEFAULT_ANALYSIS_WINDOW = 30
+
+# Способы выбора цены "на момент" для MetalService.get_prices_as_of
+AS_OF_METHODS = ('previous', 'next', 'interpolate')
+
+# Одновременные запросы анализа одного металла выполняются один раз
+_analysis_flight = SingleFlight()
+
+def price_currency(unit: str) -> str:
+    """Валюта цены по единице измерения металла: 'USD/oz' -> 'USD', 'gram' -> GRAM_PRICE_CURRENCY."""
+    if '/' in unit:
+        return unit.split('/')[0]
+    return GRAM_PRICE_CURRENCY if unit == 'gram' else DEFAULT_BASE_CURRENCY
+
+def price_mass_unit(unit: str) -> str:
+    """Единица массы, за которую указана цена: 'USD/oz' -> 'oz', 'gram' -> 'gram'."""
+    mass_unit = unit.split('/', 1)[1] if '/' in unit else unit
+    if mass_unit not in GRAMS_PER_UNIT:
+        raise ValueError(f"Unknown mass unit in metal unit: {unit}")
+    return mass_unit
+
+def converted_unit(unit: str, target_currency: str) -> str:
+    """Единица измерения после конвертации: ('USD/oz', 'RUB') -> 'RUB/oz'."""
+    if '/' in unit:
+        return f"{target_currency}/{unit.split('/', 1)[1]}"
+    return target_currency
+
+def analysis_is_fresh(created_at: datetime, period_end: datetime, latest_price_at: Optional[datetime],
+                      max_age_seconds: float, now: datetime) -> bool:
+    """Сохраненный анализ можно отдавать: он не старше max_age_seconds и учитывает последнюю цену."""
+    if created_at < now - timedelta(seconds=max_age_seconds):
+        return False
+    return latest_price_at is None or period_end >= latest_price_at
+
+def compute_analysis(price_values) -> Dict:
+    """Trend, volatility and sentiment of a chronologically ordered price series.
+
+    Pure function shared by the sync and async (app/asgi.py) read paths; returns {} for an empty series.
+    """
+    if not price_values:
+        return {}
+
+    # Calculate trend
+    first_price = price_values[0]
+    last_price = price_values[-1]
+    price_change = ((last_price - first_price) / first_price) * 100
+
+    if price_change > 1:
+        trend = 'up'
+    elif price_change < -1:
+        trend = 'down'
+    else:
+        trend = 'unchanged'
+
+    # Calculate volatility
+    returns = [(price_values[i] - price_values[i-1])/price_values[i-1] 
+              for i in range(1, len(price_values))]
+    volatility_value = statistics.stdev(returns) if len(returns) > 1 else 0
+
+    if volatility_value > 0.02:  # 2% daily volatility threshold
+        volatility = 'high'
+    elif volatility_value > 0.01:  # 1% daily volatility threshold
+        volatility = 'medium'
+    else:
+        volatility = 'low'
+
+    # Determine sentiment based on trend and volatility
+    if trend == 'up' and volatility != 'high':
+        sentiment = 'positive'
+    elif trend == 'down' and volatility != 'high':
+        sentiment = 'negative'
+    else:
+        sentiment = 'neutral'
+
+    return {'trend': trend, 'volatility': volatility, 'sentiment': sentiment}
+
+def lookup_as_of(timestamps: Sequence[int], prices: Sequence[float], queries: Sequence[int],
+                 method: str = 'previous') -> List[Tuple[Optional[float], Optional[int]]]:
+    """Цены ряда (timestamps по возрастанию) на моменты queries (по возрастанию), все в микросекундах.
+
+    Один проход слиянием: позиция в ряду только растет, а бинарный поиск от нее пропускает
+    участки ряда между далекими моментами. Возвращает [(цена, момент точки ряда)]:
+    previous - последняя точка не позже момента, next - первая не раньше, interpolate - линейная
+    интерполяция между ними (момент точки - только при точном совпадении). Вне ряда - (None, None).
+    """
+    results = []
+    position = 0
+    count = len(timestamps)
+    for query in queries:
+        # position - число точек ряда не позже query
+        position = bisect_right(timestamps, query, position)
+        before = position - 1 if position else None
+        if before is not None and timestamps[before] == query:
+            results.append((prices[before], query))
+            continue
+        after = position if position < count else None
+        if method == 'previous':
+            results.append((prices[before], timestamps[before]) if before is not None else (None, None))
+        elif method == 'next':
+            results.append((prices[after], timestamps[after]) if after is not None else (None, None))
+        elif before is not None and after is not None:
+            weight = (query - timestamps[before]) / (timestamps[after] - timestamps[before])
+            results.append((prices[before] + (prices[after] - prices[before]) * weight, None))
+        else:
+            results.append((None, None))
+    return results
 
 class MetalService:
     @staticmethod
-    def get_current_prices(target_currency: Optional[str] = None) -> List[Dict]:
-        """Get current prices for all metals, optionally converting to a target currency."""
-        metals = Metal.query.all()
+    def get_current_prices(target_currency: Optional[str] = None, quotes: Optional[Dict] = None) -> List[Dict]:
+        """Get current prices for all metals, optionally converting to a target currency.
+
+        quotes: already fetched rates {source currency: RateQuote or ValueError} (dashboard).
+        """
         current_prices_output = []
         
         # Определяем целевую валюту. Если не указана, используем базовую (USD).
         final_target_currency = target_currency.upper() if target_currency else DEFAULT_BASE_CURRENCY
 
-        for metal in metals:
-            latest_price_record = MetalPrice.query.filter_by(metal_id=metal.id)\
-                .order_by(MetalPrice.timestamp.desc())\
-                .first()
-            
-            if latest_price_record:
-                price_value = latest_price_record.price
-                price_unit = metal.unit # Изначально, например, "USD/oz"
+        for metal in MetalService.get_price_snapshot():
+            if metal['price'] is not None:
+                price_value = metal['price']
+                price_unit = metal['unit'] # Изначально, например, "USD/oz"
                 # Предполагаем, что metal.unit всегда содержит базовую валюту в начале, например, "USD/oz"
                 # Это нужно для корректной конвертации.
                 # Если metal.unit может быть другим, логику извлечения базовой валюты нужно будет усложнить.
-                original_price_currency = metal.unit.split('/')[0] if '/' in metal.unit else DEFAULT_BASE_CURRENCY
+                original_price_currency = price_currency(metal['unit'])
+                quote = None
 
                 if final_target_currency != original_price_currency:
                     try:
                         # Получаем курс для конвертации из исходной валюты цены в целевую
-                        rate = ExchangeRateService.get_exchange_rate(original_price_currency, final_target_currency)
+                        if quotes is not None and original_price_currency in quotes:
+                            quote = quotes[original_price_currency]
+                            if isinstance(quote, ValueError):
+                                raise quote
+                        else:
+                            quote = ExchangeRateService.get_rate_quote(original_price_currency, final_target_currency)
+                        rate = quote.rate
                         price_value = round(price_value * rate, 2) # Округляем до 2 знаков после запятой
                         # Обновляем единицу измерения
-                        if '/' in price_unit:
-                            price_suffix = price_unit.split('/', 1)[1]
-                            price_unit = f"{final_target_currency}/{price_suffix}"
-                        else:
-                            price_unit = final_target_currency # Если не было суффикса, просто ставим валюту
-                        current_app.logger.info(f"Конвертирована цена для {metal.symbol}: {latest_price_record.price} {original_price_currency} -> {price_value} {final_target_currency} (курс: {rate})")
+                        price_unit = converted_unit(price_unit, final_target_currency)
+                        logger.debug("Конвертирована цена для %s: %s %s -> %s %s (курс: %s)", metal['symbol'],
+                                     metal['price'], original_price_currency, price_value, final_target_currency, rate,
+                                     extra={'per_row': True})
                     except ValueError as e:
                         # Если не удалось получить курс, логгируем ошибку и возвращаем цену в исходной валюте
-                        current_app.logger.error(f"Не удалось конвертировать цену для {metal.symbol} в {final_target_currency}: {e}. Возвращаем исходную цену.")
+                        logger.error(f"Не удалось конвертировать цену для {metal['symbol']} в {final_target_currency}: {e}. Возвращаем исходную цену.")
                         # price_value и price_unit остаются без изменений
-                current_prices_output.append({
-                    'symbol': metal.symbol,
-                    'name': metal.name,
+                price_output = {
+                    'symbol': metal['symbol'],
+                    'name': metal['name'],
                     'price': price_value,
                     'unit': price_unit,
-                    'timestamp': latest_price_record.timestamp.isoformat()
-                })
+                    'timestamp': metal['timestamp']
+                }
+                if quote is not None and quote.stale:
+                    # API курсов недоступен: цена посчитана по последнему сохраненному курсу
+                    price_output['fx_stale'] = True
+                    price_output['fx_rate_date'] = quote.date.isoformat()
+                current_prices_output.append(price_output)
             else:
                 # Если для металла нет цен, можно добавить запись с None или пропустить
-                current_app.logger.warn(f"Нет данных о ценах для металла: {metal.symbol}")
+                logger.warning(f"Нет данных о ценах для металла: {metal['symbol']}")
                 current_prices_output.append({
-                    'symbol': metal.symbol,
-                    'name': metal.name,
+                    'symbol': metal['symbol'],
+                    'name': metal['name'],
                     'price': None,
-                    'unit': f"{final_target_currency}/oz" if '/' in metal.unit else final_target_currency, # Попытка указать целевую валюту
+                    'unit': f"{final_target_currency}/oz" if '/' in metal['unit'] else final_target_currency, # Попытка указать целевую валюту
                     'timestamp': None
                 })
         
         return current_prices_output
 
     @staticmethod
-    def get_historical_prices(metal_symbol: str, date_from: datetime, date_to: datetime) -> List[Dict]:
+    def get_price_snapshot() -> List[Dict]:
+        """Latest stored price of every metal in its base currency, cached for PRICE_SNAPSHOT_CACHE_SECONDS."""
+        snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+        if snapshot is not None:
+            return snapshot
+        snapshot = []
+        for metal in Metal.query.all():
+            latest_price_record = MetalPrice.query.filter_by(metal_id=metal.id)\
+                .order_by(MetalPrice.timestamp.desc())\
+                .first()
+            snapshot.append({
+                'symbol': metal.symbol,
+                'name': metal.name,
+                'unit': metal.unit,
+                'price': latest_price_record.price if latest_price_record else None,
+                'timestamp': latest_price_record.timestamp.isoformat() if latest_price_record else None
+            })
+        cache.set(SNAPSHOT_CACHE_KEY, snapshot, timeout=current_app.config['PRICE_SNAPSHOT_CACHE_SECONDS'])
+        return snapshot
+
+    @staticmethod
+    def _invalidate_caches(symbols) -> None:
+        """Сбрасывает снимок последних цен и анализ изменившихся металлов в кэше этого процесса."""
+        cache.delete_many(SNAPSHOT_CACHE_KEY, *(ANALYSIS_CACHE_KEY.format(symbol, window)
+                                                for symbol in symbols for window in ANALYSIS_WINDOWS))
+
+    @staticmethod
+    def _invalidate_history_cache(saved_prices_info: List[Dict]) -> None:
+        """Сбрасывает закэшированные диапазоны истории, в которые попали записанные цены."""
+        history_cache = get_history_cache()
+        if not history_cache:
+            return
+        written: Dict[str, List[int]] = {}
+        for price_data in saved_prices_info:
+            written.setdefault(price_data['symbol'].upper(), []).append(
+                to_epoch_us(datetime.fromisoformat(price_data['timestamp'])))
+        for symbol, timestamps in written.items():
+            history_cache.invalidate_points(symbol, timestamps)
+
+    @staticmethod
+    def _series_source(metal_symbol: str):
+        """In-memory хранилище или mmap-архив с рядом металла; None - читать из БД."""
+        for source in (get_price_store(), get_history_archive()):
+            if source and source.has_metal(metal_symbol):
+                return source
+        return None
+
+    @staticmethod
+    def get_historical_prices(metal_symbol: str, date_from: datetime, date_to: datetime,
+                              resolution: str = 'raw') -> List[Dict]:
         """Get historical prices for a specific metal within a date range."""
+        timestamps, prices = MetalService.get_historical_series(metal_symbol, date_from, date_to, resolution)
+        return [{
+            'price': price,
+            'timestamp': from_epoch_us(ts).isoformat()
+        } for ts, price in zip(timestamps, prices)]
+
+    @staticmethod
+    def get_historical_series(metal_symbol: str, date_from: datetime, date_to: datetime,
+                              resolution: str = 'raw') -> Tuple[Sequence[int], Sequence[float]]:
+        """Ряд металла за период в колоночном виде: (моменты в микросекундах от эпохи, цены).
+
+        resolution: raw - все точки, hour/day - последняя цена каждого часа/дня (границы периода
+        расширяются до целых корзин). Результат кэшируется в HistoryRangeCache.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}. Use one of: {', '.join(RESOLUTIONS)}")
+        bucket_us = RESOLUTIONS[resolution]
+        start_us, end_us = normalize_range(to_epoch_us(date_from), to_epoch_us(date_to), bucket_us)
+        history_cache = get_history_cache()
+        key = (metal_symbol.upper(), start_us, end_us, resolution)
+        if history_cache:
+            cached = history_cache.get(key)
+            if cached is not None:
+                return cached
+            version = history_cache.version
+
+        series = MetalService._load_series(metal_symbol, from_epoch_us(start_us), from_epoch_us(end_us))
+        if bucket_us:
+            series = downsample(series[0], series[1], bucket_us)
+        if history_cache:
+            history_cache.put(key, start_us, end_us, series, version)
+        return series
+
+    @staticmethod
+    def _load_series(metal_symbol: str, date_from: datetime, date_to: datetime) -> Tuple[Sequence[int], Sequence[float]]:
+        source = MetalService._series_source(metal_symbol)
+        if source:
+            return source.range(metal_symbol, date_from, date_to)
+
         metal = Metal.query.filter_by(symbol=metal_symbol.upper()).first()
         if not metal:
-            return []
+            return [], []
 
-        prices = MetalPrice.query.filter(
+        rows = db.session.query(MetalPrice.timestamp, MetalPrice.price).filter(
             MetalPrice.metal_id == metal.id,
             MetalPrice.timestamp >= date_from,
             MetalPrice.timestamp <= date_to
         ).order_by(MetalPrice.timestamp.asc()).all()
+        return [to_epoch_us(row.timestamp) for row in rows], [row.price for row in rows]
 
-        return [{
-            'price': price.price,
-            'timestamp': price.timestamp.isoformat()
-        } for price in prices]
+    @staticmethod
+    def get_prices_as_of(queries: List[Tuple[str, datetime]], method: str = 'previous',
+                         target_currency: Optional[str] = None) -> List[Dict]:
+        """Цены металлов на заданные моменты для пачки пар (metal, timestamp).
+
+        Запросы группируются по металлу и сортируются; ряд каждого металла читается один раз
+        и обходится слиянием с моментами (lookup_as_of). С target_currency цена пересчитывается
+        по курсу на дату момента (ExchangeRateService.get_rate_quote с as_of). Ответ идет в
+        порядке запросов.
+        """
+        if method not in AS_OF_METHODS:
+            raise ValueError(f"Unknown method: {method}. Use one of: {', '.join(AS_OF_METHODS)}")
+        units = {metal.symbol: metal.unit for metal in Metal.query.all()}
+        unknown = sorted({symbol.upper() for symbol, _ in queries} - set(units))
+        if unknown:
+            raise ValueError(f"Unknown metal: {', '.join(unknown)}")
+        final_target_currency = target_currency.upper() if target_currency else None
+
+        by_metal: Dict[str, List[Tuple[int, int]]] = {}
+        for index, (symbol, moment) in enumerate(queries):
+            by_metal.setdefault(symbol.upper(), []).append((to_epoch_us(moment), index))
+
+        results: List[Optional[Dict]] = [None] * len(queries)
+        rates: Dict[Tuple[str, object], object] = {}
+        for symbol, points in by_metal.items():
+            points.sort()
+            moments = [moment for moment, _ in points]
+            timestamps, prices = MetalService._series_around(symbol, moments[0], moments[-1])
+            unit = units[symbol]
+            for (moment, index), (price, matched) in zip(points, lookup_as_of(timestamps, prices, moments, method)):
+                item = {
+                    'metal': symbol,
+                    'timestamp': from_epoch_us(moment).isoformat(),
+                    'price': price,
+                    'unit': unit,
+                    'price_timestamp': from_epoch_us(matched).isoformat() if matched is not None else None
+                }
+                base_currency = price_currency(unit)
+                if price is not None and final_target_currency and final_target_currency != base_currency:
+                    day = from_epoch_us(moment).date()
+                    key = (base_currency, day)
+                    if key not in rates:
+                        # Один поиск курса на валюту и день, а не на каждую пару
+                        try:
+                            rates[key] = ExchangeRateService.get_rate_quote(base_currency, final_target_currency, as_of=day)
+                        except ValueError as e:
+                            rates[key] = e
+                    quote = rates[key]
+                    if isinstance(quote, ValueError):
+                        item['price'] = None
+                        item['error'] = str(quote)
+                    else:
+                        item['price'] = price * quote.rate
+                        item['fx_rate_date'] = quote.date.isoformat()
+                    item['unit'] = converted_unit(unit, final_target_currency)
+                if item['price'] is not None:
+                    item['price'] = round(item['price'], 4)
+                results[index] = item
+        return results
 
     @staticmethod
-    def analyze_metal(metal_symbol: str) -> Dict:
-        """Analyze metal price trends, volatility, and sentiment."""
+    def _series_around(metal_symbol: str, start_us: int, end_us: int) -> Tuple[Sequence[int], Sequence[float]]:
+        """Ряд металла (микросекунды, цены) за [start_us, end_us] плюс соседние точки по краям."""
+        source = MetalService._series_source(metal_symbol)
+        if source:
+            # Ряд в хранилище и архиве - срезы без копирования, поэтому берем его целиком
+            return source.range(metal_symbol, from_epoch_us(0), datetime.max)
+
         metal = Metal.query.filter_by(symbol=metal_symbol.upper()).first()
-        if not metal:
-            return {}
+        start, end = from_epoch_us(start_us), from_epoch_us(end_us)
+        columns = (MetalPrice.timestamp, MetalPrice.price)
+        before = db.session.query(*columns).filter(MetalPrice.metal_id == metal.id, MetalPrice.timestamp < start)\
+            .order_by(MetalPrice.timestamp.desc()).first()
+        rows = db.session.query(*columns).filter(MetalPrice.metal_id == metal.id,
+                                                 MetalPrice.timestamp >= start, MetalPrice.timestamp <= end)\
+            .order_by(MetalPrice.timestamp.asc()).all()
+        after = db.session.query(*columns).filter(MetalPrice.metal_id == metal.id, MetalPrice.timestamp > end)\
+            .order_by(MetalPrice.timestamp.asc()).first()
+        rows = ([before] if before else []) + rows + ([after] if after else [])
+        return [to_epoch_us(row.timestamp) for row in rows], [row.price for row in rows]
 
-        # Get prices for the last 30 days
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)
-        
-        prices = MetalPrice.query.filter(
-            MetalPrice.metal_id == metal.id,
-            MetalPrice.timestamp >= start_date,
-            MetalPrice.timestamp <= end_date
-        ).order_by(MetalPrice.timestamp.asc()).all()
+    @staticmethod
+    def analyze_metal(metal_symbol: str, window_days: int = DEFAULT_ANALYSIS_WINDOW) -> Dict:
+        """Analyze metal price trends, volatility, and sentiment over the last window_days days."""
+        if window_days not in ANALYSIS_WINDOWS:
+            raise ValueError(f"Invalid window. Use one of: {', '.join(map(str, ANALYSIS_WINDOWS))}")
+        cache_key = ANALYSIS_CACHE_KEY.format(metal_symbol.upper(), window_days)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            # Анализ этого окна уже посчитан и сохранен в MetalAnalysis
+            return cached
+        return _analysis_flight.do((metal_symbol.upper(), window_days), MetalService._analyze_uncached,
+                                   metal_symbol, window_days)
 
-        if not prices:
+    @staticmethod
+    def _analyze_uncached(metal_symbol: str, window_days: int) -> Dict:
+        cache_key = ANALYSIS_CACHE_KEY.format(metal_symbol.upper(), window_days)
+        metal = Metal.query.filter_by(symbol=metal_symbol.upper()).first()
+        if not metal:
             return {}
 
-        # Calculate trend
-        price_values = [p.price for p in prices]
-        first_price = price_values[0]
-        last_price = price_values[-1]
-        price_change = ((last_price - first_price) / first_price) * 100
+        analysis_data = MetalService._precomputed_analysis(metal, window_days)
+        if analysis_data is None:
+            analysis_data = MetalService._compute_and_store_analysis(metal, window_days)
+        if analysis_data:
+            cache.set(cache_key, analysis_data, timeout=current_app.config['ANALYSIS_CACHE_SECONDS'])
+        return analysis_data
 
-        if price_change > 1:
-            trend = 'up'
-        elif price_change < -1:
-            trend = 'down'
-        else:
-            trend = 'unchanged'
+    @staticmethod
+    def _precomputed_analysis(metal: Metal, window_days: int) -> Optional[Dict]:
+        """Последний сохраненный анализ окна (обычно из ночного пакета), если он свежий."""
+        analysis = MetalAnalysis.query.filter_by(metal_id=metal.id, window_days=window_days)\
+            .order_by(MetalAnalysis.created_at.desc()).first()
+        if analysis is None:
+            return None
+        latest = next((item for item in MetalService.get_price_snapshot() if item['symbol'] == metal.symbol), None)
+        latest_price_at = datetime.fromisoformat(latest['timestamp']) if latest and latest['timestamp'] else None
+        if not analysis_is_fresh(analysis.created_at, analysis.period_end, latest_price_at,
+                                 current_app.config['ANALYSIS_FRESH_SECONDS'], datetime.utcnow()):
+            return None
+        return {
+            'metal': metal.symbol,
+            'trend': analysis.trend,
+            'volatility': analysis.volatility,
+            'sentiment': analysis.sentiment,
+            'window_days': window_days,
+            'period_start': analysis.period_start.isoformat(),
+            'period_end': analysis.period_end.isoformat()
+        }
 
-        # Calculate volatility
-        returns = [(price_values[i] - price_values[i-1])/price_values[i-1] 
-                  for i in range(1, len(price_values))]
-        volatility_value = statistics.stdev(returns) if len(returns) > 1 else 0
+    @staticmethod
+    def _compute_and_store_analysis(metal: Metal, window_days: int) -> Dict:
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=window_days)
 
-        if volatility_value > 0.02:  # 2% daily volatility threshold
-            volatility = 'high'
-        elif volatility_value > 0.01:  # 1% daily volatility threshold
-            volatility = 'medium'
+        source = MetalService._series_source(metal.symbol)
+        if source:
+            # memoryview-срез из хранилища/архива, без копирования и ORM-объектов
+            _, price_values = source.range(metal.symbol, start_date, end_date)
         else:
-            volatility = 'low'
+            price_values = [price for (price,) in db.session.query(MetalPrice.price).filter(
+                MetalPrice.metal_id == metal.id,
+                MetalPrice.timestamp >= start_date,
+                MetalPrice.timestamp <= end_date
+            ).order_by(MetalPrice.timestamp.asc())]
 
-        # Determine sentiment based on trend and volatility
-        if trend == 'up' and volatility != 'high':
-            sentiment = 'positive'
-        elif trend == 'down' and volatility != 'high':
-            sentiment = 'negative'
-        else:
-            sentiment = 'neutral'
+        result = compute_analysis(price_values)
+        if not result:
+            return {}
 
-        # Store analysis in database
+        # Store analysis in database, replacing the previous one for this window
+        MetalAnalysis.query.filter_by(metal_id=metal.id, window_days=window_days).delete(synchronize_session=False)
         analysis = MetalAnalysis(
             metal_id=metal.id,
-            trend=trend,
-            volatility=volatility,
-            sentiment=sentiment,
+            window_days=window_days,
             period_start=start_date,
-            period_end=end_date
+            period_end=end_date,
+            **result
         )
         db.session.add(analysis)
         db.session.commit()
 
         return {
-            'metal': metal_symbol,
-            'trend': trend,
-            'volatility': volatility,
-            'sentiment': sentiment,
+            'metal': metal.symbol,
+            **result,
+            'window_days': window_days,
             'period_start': start_date.isoformat(),
             'period_end': end_date.isoformat()
         }
@@ -174,7 +491,7 @@ class MetalService:
             # Создаем директорию data_lake, если она не существует
             if not os.path.exists(DATA_LAKE_DIR):
                 os.makedirs(DATA_LAKE_DIR)
-                print(f"Создана директория Data Lake: {DATA_LAKE_DIR}")
+                logger.info(f"Создана директория Data Lake: {DATA_LAKE_DIR}")
             
             # Записываем данные в файл. Каждая новая порция данных добавляется в виде нового объекта JSON.
             # Для простоты, будем дописывать в файл как последовательность JSON объектов (или список JSON объектов)
@@ -201,19 +518,57 @@ class MetalService:
             
             with open(PRICE_LOG_FILE, 'w', encoding='utf-8') as f:
                 json.dump(current_log, f, ensure_ascii=False, indent=4)
-            print(f"Данные о ценах залогированы в {PRICE_LOG_FILE}")
+            logger.debug(f"Данные о ценах залогированы в {PRICE_LOG_FILE}")
 
         except Exception as e:
-            print(f"Ошибка при логировании цен в Data Lake: {e}")
+            logger.error(f"Ошибка при логировании цен в Data Lake: {e}")
+
+    @staticmethod
+    def _apply_to_series_sources(saved_prices: List[Dict]):
+        """Поддерживает in-memory хранилище и mmap-архив в актуальном состоянии после коммита."""
+        store = get_price_store()
+        archive = get_history_archive()
+        if not store and not archive:
+            return
+        by_symbol = {}
+        for price_data in saved_prices:
+            by_symbol.setdefault(price_data['symbol'].upper(), []).append(
+                (datetime.fromisoformat(price_data['timestamp']), price_data['price']))
+        if store:
+            for symbol, points in by_symbol.items():
+                store.apply(symbol, points)
+        if archive:
+            try:
+                archive.append((symbol, ts, price) for symbol, points in by_symbol.items() for ts, price in points)
+            except OSError as e:
+                logger.error(f"Не удалось дописать цены в архив истории: {e}")
 
     @staticmethod
-    def update_prices(prices_data: List[Dict]) -> None:
-        """Update metal prices in the database."""
+    def update_prices(prices_data: List[Dict], screen: bool = True) -> int:
+        """Update metal prices in the database. Returns the number of rows inserted or updated.
+
+        With screen=True prices go through the ingest anomaly filter first; rejected rows are
+        written to QuarantinedPrice instead (see app/services/price_filter.py).
+        """
+        quarantined = []
+        price_filter = get_price_filter() if screen else None
+        if price_filter:
+            prices_data, quarantined = price_filter.screen(prices_data)
+            if quarantined:
+                db.session.bulk_insert_mappings(QuarantinedPrice, quarantined)
+        partitions = get_price_partitions()
+        if partitions:
+            # PostgreSQL с секциями по месяцам: секция месяца должна существовать до вставки
+            partitions.ensure_for(datetime.fromisoformat(price_data['timestamp']) for price_data in prices_data)
         saved_prices_info = []
+        new_prices = []
+        updated = skipped = 0
         for price_data in prices_data:
             metal = Metal.query.filter_by(symbol=price_data['symbol'].upper()).first()
             if not metal:
-                print(f"Металл с символом {price_data['symbol']} не найден в БД. Пропускаем обновление цены.")
+                logger.warning("Металл с символом %s не найден в БД. Пропускаем обновление цены.",
+                               price_data['symbol'], extra={'per_row': True})
+                skipped += 1
                 continue
 
             # Проверяем, есть ли уже цена для этого металла с такой же временной меткой
@@ -225,7 +580,8 @@ class MetalService:
             if existing_price:
                 # Если цена существует, обновляем ее
                 existing_price.price = price_data['price']
-                print(f"Обновлена цена для {metal.symbol} на {price_data['timestamp']}")
+                updated += 1
+                logger.info("Обновлена цена для %s на %s", metal.symbol, price_data['timestamp'], extra={'per_row': True})
             else:
                 # Если цены нет, создаем новую запись
                 price = MetalPrice(
@@ -235,25 +591,48 @@ class MetalService:
                     timestamp=datetime.fromisoformat(price_data['timestamp']) 
                 )
                 db.session.add(price)
-                print(f"Добавлена новая цена для {metal.symbol} на {price_data['timestamp']}")
+                new_prices.append(price)
+                logger.info("Добавлена новая цена для %s на %s", metal.symbol, price_data['timestamp'],
+                            extra={'per_row': True})
             saved_prices_info.append(price_data)
         
         if saved_prices_info: # Только если были данные для сохранения/обновления
+             # Журнал для SSE других процессов пишется в той же транзакции, что и цены
+             max_change_id = record_price_changes(saved_prices_info)
              db.session.commit()
-             print(f"Обновление цен в БД завершено для {len(saved_prices_info)} записей.")
+             logger.info(f"Обновление цен в БД завершено для {len(saved_prices_info)} записей.",
+                         extra={'inserted': len(new_prices), 'updated': updated, 'skipped': skipped,
+                                'quarantined': len(quarantined),
+                                'metals': sorted({price_data['symbol'].upper() for price_data in saved_prices_info})})
+             MetalService._invalidate_caches({price_data['symbol'].upper() for price_data in saved_prices_info})
+             MetalService._invalidate_history_cache(saved_prices_info)
+             MetalService._apply_to_series_sources(saved_prices_info)
+             price_stream_hub.publish([{
+                 'symbol': price_data['symbol'].upper(),
+                 'price': price_data['price'],
+                 'timestamp': price_data['timestamp']
+             } for price_data in saved_prices_info], max_change_id=max_change_id)
+             evaluate_alerts(saved_prices_info)
+             refresh_forecasts(saved_prices_info)
              # Логирование в Data Lake после успешного коммита в БД
              MetalService._log_prices_to_data_lake(saved_prices_info)
         else:
-            print("Нет данных для обновления цен в БД.")
+            if quarantined:
+                db.session.commit()
+            logger.info("Нет данных для обновления цен в БД.", extra={'skipped': skipped, 'quarantined': len(quarantined)})
+        return len(saved_prices_info)
 
     @staticmethod
-    def update_prices_from_parser():
-        """Обновить цены на металлы через парсинг сайтов."""
-        print("Запрос на обновление цен от парсера...")
+    def update_prices_from_parser(raise_errors: bool = False) -> int:
+        """Обновить цены на металлы через парсинг сайтов. Возвращает число записанных строк."""
+        # Парсер (requests + bs4) импортируется при первом использовании, а не при старте воркера
+        from app.services.alpha_vantage_service import MetalParserService
+
+        logger.info("Запрос на обновление цен от парсера...")
         try:
             prices_data_from_parser = MetalParserService.get_all_current_prices()
             if prices_data_from_parser:
-                print(f"Получено {len(prices_data_from_parser)} записей от парсера.")
+                logger.info(f"Получено {len(prices_data_from_parser)} записей от парсера.")
                 # Трансформируем данные, если нужно, и обновляем в БД
                 # Метод update_prices ожидает 'symbol', 'price', 'timestamp' (ISO формат)
                 # Вроде get_all_current_prices уже возвращает это, но проверим
@@ -262,9 +641,33 @@ class MetalService:
                 # Парсер mfd.ru может возвращать только дату. Для консистентности, если время 00:00:00, 
                 # можно оставить или добавить текущее время UTC, если это более правильно.
                 # Пока что оставим как есть, предполагая, что парсер дает достаточно точный timestamp.
-                MetalService.update_prices(prices_data_from_parser)
-            else:
-                print("Парсер не вернул данных для обновления.")
+                return MetalService.update_prices(prices_data_from_parser)
+            logger.warning("Парсер не вернул данных для обновления.")
+            if raise_errors:
+                raise ValueError("Парсер не вернул данных для обновления")
         except Exception as e:
-            print(f"Ошибка при обновлении цен от парсера: {e}")
-            # В реальном приложении здесь может быть более детальное логирование ошибки 
\ No newline at end of file
+            logger.error(f"Ошибка при обновлении цен от парсера: {e}", exc_info=True)
+            if raise_errors:
+                raise
+        return 0
+
+    @staticmethod
+    def backfill_from_mfd(metal_symbols: List[str], date_from: str, date_to: str, progress=None) -> int:
+        """Загрузить исторические цены с mfd.ru за период [date_from, date_to] (YYYY-MM-DD).
+
+        progress(done, total) вызывается после каждого металла. Возвращает число записанных строк.
+        """
+        from app.services.alpha_vantage_service import MetalParserService
+
+        rows = 0
+        for done, symbol in enumerate(metal_symbols, start=1):
+            history = MetalParserService.get_historical_prices_from_mfd(symbol, date_from, date_to)
+            if history:
+                rows += MetalService.update_prices([{
+                    'symbol': symbol,
+                    'price': point['price'],
+                    'timestamp': datetime.fromisoformat(point['date']).isoformat()
+                } for point in history])
+            if progress:
+                progress(done, len(metal_symbols))
+        return rows 
\ No newline at end of file
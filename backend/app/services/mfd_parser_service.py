@@ -2,13 +2,12 @@ import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 import logging
+import os
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class MfdParserService:
-    BASE_URL = "https://mfd.ru/centrobank/preciousmetals/"
+    BASE_URL = os.getenv('MFD_URL', "https://mfd.ru/centrobank/preciousmetals/")
 
     # Используем фиксированный порядок и имена металлов, как они обычно идут на сайте ЦБ
     # Первый столбец (индекс 0) - Дата
@@ -117,7 +116,8 @@ class MfdParserService:
         return historical_prices
 
 if __name__ == '__main__':
-    # Пример использования
+    # Пример использования (при импорте логирование настраивает приложение, см. app/logging_setup.py)
+    logging.basicConfig(level=logging.INFO)
     parser = MfdParserService()
     data = parser.fetch_historical_data()
     if data:
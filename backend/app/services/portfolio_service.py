@@ -0,0 +1,153 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+from app.models.metal import Metal
+from app.services.exchange_rate_service import ExchangeRateService
+from app.services.fx_rate_history import get_fx_rate_history
+from app.services.metal_service import (DEFAULT_BASE_CURRENCY, GRAMS_PER_UNIT, MetalService,
+                                        price_currency, price_mass_unit)
+from app.services.price_store import from_epoch_us
+
+logger = logging.getLogger(__name__)
+
+DAY_US = 86400 * 1_000_000
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class PortfolioService:
+    """Оценка портфеля позиций в металлах: текущая стоимость и ряд стоимости за период.
+
+    Количество позиции и цена металла приводятся к граммам (позиции задаются в g/kg/oz,
+    цены хранятся за унцию 'USD/oz' или за грамм 'gram'), цены переводятся в валюту портфеля.
+    Ряд считается векторно (numpy): цены металлов выравниваются на общую ось времени через
+    searchsorted (последняя известная цена), курсы - массивом по дням оси.
+    """
+
+    @staticmethod
+    def value(holdings: List[Dict], currency: Optional[str], date_from: datetime, date_to: datetime,
+              resolution: str = 'day') -> Dict:
+        # numpy нужен только для оценки портфеля; не замедляем им старт воркера
+        import numpy as np
+
+        target_currency = (currency or DEFAULT_BASE_CURRENCY).upper()
+        metals = {metal.symbol: metal.unit for metal in Metal.query.all()}
+        grams = PortfolioService._grams_by_metal(holdings, metals)
+        symbols = sorted(grams)
+
+        # Цена за грамм в валюте цены металла
+        per_gram = {symbol: 1.0 / GRAMS_PER_UNIT[price_mass_unit(metals[symbol])] for symbol in symbols}
+
+        # Текущая стоимость
+        quotes = {}
+        positions = []
+        snapshot = {metal['symbol']: metal for metal in MetalService.get_price_snapshot()}
+        for symbol in symbols:
+            base = price_currency(metals[symbol])
+            if base not in quotes:
+                quotes[base] = ExchangeRateService.get_rate_quote(base, target_currency)
+            latest = snapshot.get(symbol, {})
+            price = latest.get('price')
+            value = price * per_gram[symbol] * grams[symbol] * quotes[base].rate if price is not None else None
+            positions.append({
+                'metal': symbol,
+                'grams': round(grams[symbol], 6),
+                'price_per_gram': round(price * per_gram[symbol] * quotes[base].rate, 6) if price is not None else None,
+                'value': round(value, 2) if value is not None else None,
+                'price_timestamp': latest.get('timestamp'),
+                'fx_stale': quotes[base].stale
+            })
+        values = [position['value'] for position in positions]
+        current = {
+            'total': round(sum(values), 2) if None not in values else None,
+            'positions': positions
+        }
+
+        # Ряд стоимости: общая ось - объединение моментов рядов всех металлов
+        series = {symbol: MetalService.get_historical_series(symbol, date_from, date_to, resolution)
+                  for symbol in symbols}
+        arrays = {symbol: (np.asarray(timestamps, dtype=np.int64), np.asarray(prices, dtype=np.float64))
+                  for symbol, (timestamps, prices) in series.items()}
+        axis = np.unique(np.concatenate([timestamps for timestamps, _ in arrays.values()])) \
+            if arrays else np.empty(0, dtype=np.int64)
+
+        fx, missing_days = PortfolioService._fx_by_day(np, axis, {price_currency(metals[s]) for s in symbols},
+                                                        target_currency, quotes)
+        position_values = {}
+        for symbol in symbols:
+            timestamps, prices = arrays[symbol]
+            # Последняя известная цена не позже каждого момента оси; до первой цены - NaN
+            index = np.searchsorted(timestamps, axis, side='right') - 1
+            aligned = np.where(index >= 0, prices[np.clip(index, 0, None)] if len(prices) else np.nan, np.nan)
+            position_values[symbol] = aligned * (per_gram[symbol] * grams[symbol]) * fx[price_currency(metals[symbol])]
+        total = np.sum(np.vstack(list(position_values.values())), axis=0) if position_values else np.empty(0)
+
+        return {
+            'currency': target_currency,
+            'current': current,
+            'series': {
+                'resolution': resolution,
+                'timestamps': [from_epoch_us(int(ts)).isoformat() for ts in axis],
+                'total': PortfolioService._to_list(np, total),
+                'positions': {symbol: PortfolioService._to_list(np, values) for symbol, values in position_values.items()},
+                'fx_missing_days': missing_days
+            }
+        }
+
+    @staticmethod
+    def _grams_by_metal(holdings: List[Dict], metals: Dict[str, str]) -> Dict[str, float]:
+        """Проверяет позиции и суммирует их количество в граммах по металлам."""
+        if not holdings:
+            raise ValueError('Missing required parameter: holdings')
+        grams: Dict[str, float] = {}
+        for holding in holdings:
+            if not isinstance(holding, dict):
+                raise ValueError(f'Invalid holding: {holding}')
+            symbol = str(holding.get('metal') or '').upper()
+            if symbol not in metals:
+                raise ValueError(f'Unknown metal: {symbol}')
+            unit = holding.get('unit', 'oz')
+            if unit not in GRAMS_PER_UNIT:
+                raise ValueError(f"Unknown unit: {unit}. Use one of: {', '.join(GRAMS_PER_UNIT)}")
+            try:
+                quantity = float(holding['quantity'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f'Invalid quantity in holding: {holding}')
+            if quantity < 0:
+                raise ValueError(f'Quantity must not be negative: {holding}')
+            grams[symbol] = grams.get(symbol, 0.0) + quantity * GRAMS_PER_UNIT[unit]
+        return grams
+
+    @staticmethod
+    def _fx_by_day(np, axis, bases, target_currency: str, current_quotes: Dict) -> Tuple[Dict, List[str]]:
+        """Массивы курсов base -> target_currency на каждый момент оси.
+
+        Для прошедших дней курс берется из истории курсов (последний опубликованный не позже
+        дня, searchsorted по датам истории), с сегодняшнего дня - текущий курс. Дни раньше
+        начала истории получают NaN (стоимость в ряду - null); они возвращаются вторым
+        значением списком ISO дат.
+        """
+        days = axis // DAY_US
+        today = datetime.utcnow().date().toordinal() - EPOCH_ORDINAL
+        history = get_fx_rate_history()
+        fx = {}
+        missing = np.zeros(len(axis), dtype=bool)
+        for base in bases:
+            if base == target_currency:
+                fx[base] = np.ones(len(axis))
+                continue
+            history_dates, history_rates = history.rate_series(base, target_currency)
+            history_days = np.asarray([day.toordinal() - EPOCH_ORDINAL for day in history_dates], dtype=np.int64)
+            index = np.searchsorted(history_days, days, side='right') - 1
+            rates = np.full(len(axis), np.nan)
+            if len(history_days):
+                found = index >= 0
+                rates[found] = np.asarray(history_rates, dtype=np.float64)[index[found]]
+            rates[days >= today] = current_quotes[base].rate
+            missing |= np.isnan(rates)
+            fx[base] = rates
+        missing_days = [from_epoch_us(int(day) * DAY_US).date().isoformat() for day in np.unique(days[missing])]
+        return fx, missing_days
+
+    @staticmethod
+    def _to_list(np, values) -> List[Optional[float]]:
+        return [None if np.isnan(value) else round(float(value), 2) for value in values]
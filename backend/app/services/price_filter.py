@@ -0,0 +1,256 @@
+"""Проверка новых цен при загрузке: некорректные и аномальные цены уходят в карантин.
+
+Для каждого металла фильтр хранит O(1) состояние: последнюю принятую цену и EWMA среднего и
+дисперсии дневного изменения логарифма цены. Новая цена сравнивается с последней принятой:
+изменение нормируется на корень из числа дней между ними (случайное блуждание), и цена
+считается выбросом, если она отклоняется больше чем на ANOMALY_Z стандартных отклонений и
+больше чем на ANOMALY_MIN_CHANGE_PERCENT процентов. Так ловятся ошибки разбора (запятая
+в дробной части, не та таблица на странице), которые дают цену в разы больше или меньше.
+
+Выбросы и нечисловые/неположительные цены записываются в QuarantinedPrice, а не в
+MetalPrice; их можно выпустить (release) или отклонить (reject) через /api/quarantine.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import threading
+from flask import current_app
+from app import db
+from app.models.metal import Metal, MetalPrice, QuarantinedPrice
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_STATUSES = ('pending', 'released', 'rejected')
+
+
+class _MetalState:
+    """Состояние фильтра одного металла."""
+    __slots__ = ('last_log', 'last_timestamp', 'mean', 'var', 'count')
+
+    def __init__(self):
+        self.last_log = 0.0
+        self.last_timestamp: Optional[datetime] = None
+        self.mean = 0.0  # EWMA нормированного изменения log-цены
+        self.var = 0.0  # EWMA его дисперсии
+        self.count = 0
+
+
+def _days_between(a: datetime, b: datetime) -> float:
+    # Меньше суток (тики внутри дня) считается как сутки: дисперсия хранится на день
+    return max(abs((a - b).total_seconds()) / 86400, 1.0)
+
+
+class PriceAnomalyFilter:
+    """Потоковый фильтр цен по металлам; одно обновление состояния на строку, без запросов к БД.
+
+    Состояние металла при первом обращении восстанавливается по последним seed_rows ценам
+    из БД; первые warmup наблюдений принимаются без проверки. Цены старше последней
+    принятой (загрузка истории) проверяются по ней же с поправкой на расстояние в днях,
+    но состояние не сдвигают.
+    """
+
+    def __init__(self, alpha: float = 0.05, z_threshold: float = 6.0, min_change_percent: float = 5.0,
+                 warmup: int = 20, seed_rows: int = 100):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_log_change = math.log1p(min_change_percent / 100)
+        self.warmup = warmup
+        self.seed_rows = seed_rows
+        self._lock = threading.Lock()
+        self._states: Dict[str, _MetalState] = {}
+        self._metal_ids: Dict[str, int] = {}
+        self.screened = 0
+        self.quarantined = 0
+
+    def screen(self, prices_data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """Разделить цены [{'symbol', 'price', 'timestamp'}] на принятые и строки для QuarantinedPrice.
+
+        Принятые возвращаются в исходном порядке; цены одного металла проверяются по
+        возрастанию времени. Неизвестные металлы пропускаются без проверки (их отбросит
+        update_prices).
+        """
+        with self._lock:
+            if not self._metal_ids:
+                self._metal_ids = dict(db.session.query(Metal.symbol, Metal.id).all())
+            rejected = set()
+            quarantined = []
+            order = sorted(range(len(prices_data)), key=lambda i: prices_data[i]['timestamp'])
+            for i in order:
+                price_data = prices_data[i]
+                symbol = price_data['symbol'].upper()
+                metal_id = self._metal_ids.get(symbol)
+                if metal_id is None:
+                    continue
+                timestamp = datetime.fromisoformat(price_data['timestamp'])
+                verdict = self._check(self._state(symbol, metal_id), timestamp, price_data['price'])
+                if verdict is None:
+                    continue
+                reason, expected, score = verdict
+                rejected.add(i)
+                quarantined.append({
+                    'metal_id': metal_id,
+                    'price': self._as_float(price_data['price']),
+                    'timestamp': timestamp,
+                    'reason': reason,
+                    'expected_price': expected,
+                    'score': score,
+                    'status': 'pending',
+                    'created_at': datetime.utcnow()
+                })
+            self.screened += len(prices_data)
+            self.quarantined += len(quarantined)
+        if quarantined:
+            logger.warning(f"В карантин отправлено {len(quarantined)} из {len(prices_data)} цен",
+                           extra={'quarantined': len(quarantined)})
+        return [price_data for i, price_data in enumerate(prices_data) if i not in rejected], quarantined
+
+    def accept(self, symbol: str, timestamp: datetime, price: float) -> None:
+        """Учесть цену, принятую вручную (выпущенную из карантина), как последнюю известную."""
+        symbol = symbol.upper()
+        with self._lock:
+            if not self._metal_ids:
+                self._metal_ids = dict(db.session.query(Metal.symbol, Metal.id).all())
+            if symbol in self._metal_ids:
+                self._observe(self._state(symbol, self._metal_ids[symbol]), timestamp, math.log(price))
+
+    def stats(self) -> Dict:
+        return {'screened': self.screened, 'quarantined': self.quarantined, 'metals': len(self._states)}
+
+    def _state(self, symbol: str, metal_id: int) -> _MetalState:
+        state = self._states.get(symbol)
+        if state is None:
+            state = self._states[symbol] = _MetalState()
+            rows = db.session.query(MetalPrice.timestamp, MetalPrice.price)\
+                .filter(MetalPrice.metal_id == metal_id)\
+                .order_by(MetalPrice.timestamp.desc()).limit(self.seed_rows).all()
+            for timestamp, price in reversed(rows):
+                if price > 0:
+                    self._observe(state, timestamp, math.log(price))
+        return state
+
+    def _check(self, state: _MetalState, timestamp: datetime, raw_price) -> Optional[Tuple[str, Optional[float], Optional[float]]]:
+        """None, если цена принята (и учтена в состоянии), иначе (reason, expected_price, score)."""
+        price = self._as_float(raw_price)
+        if price is None or not math.isfinite(price) or price <= 0:
+            return 'invalid', None, None
+        log_price = math.log(price)
+        if state.count < self.warmup:
+            self._observe(state, timestamp, log_price)
+            return None
+
+        forward = timestamp >= state.last_timestamp
+        scale = math.sqrt(_days_between(timestamp, state.last_timestamp))
+        # Снос учитывается только вперед по времени; для старых цен ожидается последняя цена
+        drift = state.mean * scale if forward else 0.0
+        change = log_price - state.last_log - drift
+        score = abs(change) / (math.sqrt(state.var) * scale) if state.var > 0 else math.inf
+        if score > self.z_threshold and abs(change) > self.min_log_change:
+            return 'outlier', math.exp(state.last_log + drift), (score if math.isfinite(score) else None)
+        if forward:
+            self._observe(state, timestamp, log_price)
+        return None
+
+    def _observe(self, state: _MetalState, timestamp: datetime, log_price: float) -> None:
+        if state.count:
+            step = (log_price - state.last_log) / math.sqrt(_days_between(timestamp, state.last_timestamp))
+            delta = step - state.mean
+            state.mean += self.alpha * delta
+            state.var = (1 - self.alpha) * (state.var + self.alpha * delta * delta)
+        state.last_log = log_price
+        state.last_timestamp = timestamp
+        state.count += 1
+
+    @staticmethod
+    def _as_float(value) -> Optional[float]:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+
+class QuarantineService:
+    """Просмотр и разбор цен в карантине для /api/quarantine."""
+
+    @staticmethod
+    def list(status: Optional[str] = 'pending', metal: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        query = QuarantinedPrice.query
+        if status:
+            if status not in QUARANTINE_STATUSES:
+                raise ValueError(f"Invalid status. Use one of: {', '.join(QUARANTINE_STATUSES)}")
+            query = query.filter(QuarantinedPrice.status == status)
+        if metal:
+            query = query.join(Metal, QuarantinedPrice.metal_id == Metal.id).filter(Metal.symbol == metal.upper())
+        return [row.to_dict() for row in query.order_by(QuarantinedPrice.id.desc()).limit(limit).all()]
+
+    @staticmethod
+    def counts() -> Dict:
+        """Число строк по статусам и ожидающих разбора - по металлам и причинам."""
+        by_status = dict(db.session.query(QuarantinedPrice.status, db.func.count(QuarantinedPrice.id))
+                         .group_by(QuarantinedPrice.status).all())
+        pending: Dict[str, Dict[str, int]] = {}
+        rows = db.session.query(Metal.symbol, QuarantinedPrice.reason, db.func.count(QuarantinedPrice.id))\
+            .join(Metal, QuarantinedPrice.metal_id == Metal.id)\
+            .filter(QuarantinedPrice.status == 'pending')\
+            .group_by(Metal.symbol, QuarantinedPrice.reason).all()
+        for symbol, reason, count in rows:
+            pending.setdefault(symbol, {})[reason] = count
+        price_filter = get_price_filter()
+        return {
+            'total': sum(by_status.values()),
+            'by_status': {status: by_status.get(status, 0) for status in QUARANTINE_STATUSES},
+            'pending_by_metal': pending,
+            'filter': dict(price_filter.stats(), enabled=True) if price_filter else {'enabled': False}
+        }
+
+    @staticmethod
+    def release(row_id: int) -> Optional[Dict]:
+        """Записать цену из карантина в MetalPrice (без повторной проверки фильтром)."""
+        from app.services.metal_service import MetalService
+
+        row = QuarantinedPrice.query.get(row_id)
+        if row is None:
+            return None
+        if row.status != 'pending':
+            raise ValueError(f'Quarantined price {row_id} is already {row.status}')
+        if row.price is None or not math.isfinite(row.price) or row.price <= 0:
+            raise ValueError(f'Quarantined price {row_id} is not a valid price and can only be rejected')
+        row.status = 'released'
+        row.reviewed_at = datetime.utcnow()
+        MetalService.update_prices([{
+            'symbol': row.metal.symbol,
+            'price': row.price,
+            'timestamp': row.timestamp.isoformat()
+        }], screen=False)
+        price_filter = get_price_filter()
+        if price_filter:
+            # Выпущенная цена - настоящая (например, резкое движение рынка): дальше сравниваем с ней
+            price_filter.accept(row.metal.symbol, row.timestamp, row.price)
+        return row.to_dict()
+
+    @staticmethod
+    def reject(row_id: int) -> Optional[Dict]:
+        row = QuarantinedPrice.query.get(row_id)
+        if row is None:
+            return None
+        if row.status != 'pending':
+            raise ValueError(f'Quarantined price {row_id} is already {row.status}')
+        row.status = 'rejected'
+        row.reviewed_at = datetime.utcnow()
+        db.session.commit()
+        return row.to_dict()
+
+
+def get_price_filter() -> Optional[PriceAnomalyFilter]:
+    """Фильтр цен текущего приложения или None, если он выключен (ANOMALY_FILTER_ENABLED=0)."""
+    price_filter = current_app.extensions.get('price_filter')
+    if price_filter is None and current_app.config['ANOMALY_FILTER_ENABLED']:
+        config = current_app.config
+        price_filter = current_app.extensions.setdefault('price_filter', PriceAnomalyFilter(
+            alpha=config['ANOMALY_ALPHA'],
+            z_threshold=config['ANOMALY_Z'],
+            min_change_percent=config['ANOMALY_MIN_CHANGE_PERCENT'],
+            warmup=config['ANOMALY_WARMUP'],
+            seed_rows=config['ANOMALY_SEED_ROWS']
+        ))
+    return price_filter
@@ -0,0 +1,145 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+import threading
+import time
+from flask import current_app
+from app import db
+from app.models.metal import Metal, MetalPrice
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_us(value: datetime) -> int:
+    """Переводит naive UTC datetime в микросекунды от эпохи (без потери точности)."""
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_epoch_us(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+class _Series:
+    """Отсортированный по времени ряд цен одного металла.
+
+    После публикации в хранилище массивы не изменяются: запись создает новый ряд,
+    поэтому выданные читателям memoryview остаются валидными.
+    """
+    __slots__ = ('timestamps', 'prices')
+
+    def __init__(self, timestamps: array = None, prices: array = None):
+        self.timestamps = timestamps if timestamps is not None else array('q')
+        self.prices = prices if prices is not None else array('d')
+
+    def merged(self, points: Iterable[Tuple[int, float]]) -> '_Series':
+        timestamps = array('q', self.timestamps)
+        prices = array('d', self.prices)
+        for ts, price in sorted(points):
+            if not timestamps or ts > timestamps[-1]:
+                timestamps.append(ts)
+                prices.append(price)
+                continue
+            index = bisect_left(timestamps, ts)
+            if index < len(timestamps) and timestamps[index] == ts:
+                prices[index] = price
+            else:
+                timestamps.insert(index, ts)
+                prices.insert(index, price)
+        return _Series(timestamps, prices)
+
+
+class PriceSeriesStore:
+    """Хранилище истории цен в памяти на типизированных массивах.
+
+    Каждый металл хранится как два массива: int64 (микросекунды от эпохи) и float64 (цена),
+    т.е. 16 байт на точку вместо ORM-объекта MetalPrice. Диапазонные запросы решаются
+    бинарным поиском и возвращают memoryview-срезы без копирования.
+    """
+
+    def __init__(self, refresh_interval: float = 60.0):
+        self.refresh_interval = refresh_interval
+        self._series: Dict[str, _Series] = {}
+        self._metal_symbols: Dict[int, str] = {}
+        self._write_lock = threading.Lock()
+        self._last_price_id = 0
+        self._last_refresh = 0.0
+
+    def load(self) -> int:
+        """Загружает всю историю из БД. Возвращает число загруженных точек."""
+        with self._write_lock:
+            self._metal_symbols = {metal_id: symbol for metal_id, symbol in
+                                   db.session.query(Metal.id, Metal.symbol)}
+            series = {symbol: _Series() for symbol in self._metal_symbols.values()}
+            rows = db.session.query(MetalPrice.id, MetalPrice.metal_id, MetalPrice.timestamp, MetalPrice.price)\
+                .order_by(MetalPrice.metal_id, MetalPrice.timestamp)
+            last_id = 0
+            total = 0
+            for price_id, metal_id, timestamp, price in rows.yield_per(10000):
+                target = series.get(self._metal_symbols.get(metal_id))
+                if target is None:
+                    continue
+                target.timestamps.append(to_epoch_us(timestamp))
+                target.prices.append(price)
+                last_id = max(last_id, price_id)
+                total += 1
+            self._series = series
+            self._last_price_id = last_id
+            self._last_refresh = time.monotonic()
+        logger.info(f"Хранилище цен загружено: {total} точек, {self.memory_bytes()} байт")
+        return total
+
+    def apply(self, symbol: str, points: Iterable[Tuple[datetime, float]]) -> None:
+        """Вливает новые/обновленные цены металла (вызывается после коммита в БД)."""
+        converted = [(to_epoch_us(ts), float(price)) for ts, price in points]
+        if not converted:
+            return
+        symbol = symbol.upper()
+        with self._write_lock:
+            current = self._series.get(symbol, _Series())
+            self._series[symbol] = current.merged(converted)
+
+    def _refresh(self) -> None:
+        """Догружает строки, вставленные другими процессами, по возрастанию MetalPrice.id."""
+        with self._write_lock:
+            self._last_refresh = time.monotonic()
+            rows = db.session.query(MetalPrice.id, MetalPrice.metal_id, MetalPrice.timestamp, MetalPrice.price)\
+                .filter(MetalPrice.id > self._last_price_id).all()
+            if not rows:
+                return
+            grouped = {}
+            for price_id, metal_id, timestamp, price in rows:
+                symbol = self._metal_symbols.get(metal_id)
+                if symbol:
+                    grouped.setdefault(symbol, []).append((to_epoch_us(timestamp), price))
+                self._last_price_id = max(self._last_price_id, price_id)
+            for symbol, points in grouped.items():
+                self._series[symbol] = self._series.get(symbol, _Series()).merged(points)
+
+    def has_metal(self, symbol: str) -> bool:
+        return symbol.upper() in self._series
+
+    def range(self, symbol: str, date_from: datetime, date_to: datetime) -> Tuple[memoryview, memoryview]:
+        """Возвращает (timestamps, prices) за [date_from, date_to] как срезы memoryview без копирования."""
+        if self.refresh_interval and time.monotonic() - self._last_refresh > self.refresh_interval:
+            self._refresh()
+        series = self._series.get(symbol.upper())
+        if series is None:
+            return memoryview(array('q')), memoryview(array('d'))
+        lo = bisect_left(series.timestamps, to_epoch_us(date_from))
+        hi = bisect_right(series.timestamps, to_epoch_us(date_to))
+        return memoryview(series.timestamps)[lo:hi], memoryview(series.prices)[lo:hi]
+
+    def memory_bytes(self) -> int:
+        """Объем данных массивов (без учета накладных расходов Python-объектов)."""
+        return sum(s.timestamps.itemsize * len(s.timestamps) + s.prices.itemsize * len(s.prices)
+                   for s in self._series.values())
+
+
+def get_price_store() -> Optional[PriceSeriesStore]:
+    """Хранилище текущего приложения или None, если оно выключено."""
+    return current_app.extensions.get('price_store')
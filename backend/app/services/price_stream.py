@@ -0,0 +1,249 @@
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Сколько хранится журнал изменений цен: его читают только опросы SSE раз в несколько секунд
+PRICE_CHANGE_KEEP = timedelta(hours=1)
+
+
+class Subscription:
+    """Ограниченная очередь событий одного SSE-клиента."""
+
+    def __init__(self, max_queue: int):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = False
+
+    def offer(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self) -> None:
+        """Отключает медленного клиента: очищает очередь и кладет маркер конца потока."""
+        self.dropped = True
+        try:
+            while True:
+                self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.queue.put_nowait(None)
+
+    def get(self, timeout: float) -> Optional[str]:
+        """Следующее сообщение, комментарий-heartbeat по таймауту или None, если клиент отключен."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return ': heartbeat\n\n'
+
+
+class AsyncSubscription:
+    """Очередь SSE-клиента, которого обслуживает event loop (app/asgi.py), а не поток.
+
+    offer() и close() вызываются из любых потоков (PriceUpdater, опрос БД, Flask) и будят
+    ожидающий get() через call_soon_threadsafe; клиент не занимает поток на время подключения.
+    """
+
+    def __init__(self, max_queue: int, loop: asyncio.AbstractEventLoop):
+        self.max_queue = max_queue
+        self.loop = loop
+        self.dropped = False
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+
+    def offer(self, message: str) -> bool:
+        with self._lock:
+            if len(self._items) >= self.max_queue:
+                return False
+            self._items.append(message)
+        self._wake()
+        return True
+
+    def close(self) -> None:
+        self.dropped = True
+        with self._lock:
+            self._items.clear()
+            self._items.append(None)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Event loop уже остановлен (завершение процесса)
+            pass
+
+    async def get(self, timeout: float) -> Optional[str]:
+        while True:
+            with self._lock:
+                if self._items:
+                    return self._items.popleft()
+                self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return ': heartbeat\n\n'
+
+
+class PriceStreamHub:
+    """Внутрипроцессная рассылка обновлений цен SSE-клиентам.
+
+    Каждое обновление сериализуется один раз и раскладывается по ограниченным очередям
+    подписчиков; если очередь клиента переполнена, клиент отключается, а не тормозит
+    остальных. Обновления, записанные другими процессами (PriceUpdater работает только
+    в процессе-лидере), подхватываются фоновым опросом журнала PriceChange по возрастанию id,
+    который работает, пока есть подписчики. В журнал попадают и новые цены, и исправления
+    уже записанных (например, ЦБ уточнил курс за тот же день).
+    """
+
+    def __init__(self, max_queue: int = 16, max_subscribers: int = 10000, poll_interval: float = 5.0,
+                 max_thread_subscribers: int = 0):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self.max_thread_subscribers = max_thread_subscribers
+        self._thread_subscribers = 0
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._last_change_id = None
+        self._poller = None
+        self._app = None
+        self.published = 0
+        self.dropped = 0
+
+    def init_app(self, app) -> None:
+        self._app = app
+        self.max_queue = app.config['PRICE_STREAM_QUEUE_SIZE']
+        self.max_subscribers = app.config['PRICE_STREAM_MAX_CLIENTS']
+        self.max_thread_subscribers = app.config['PRICE_STREAM_MAX_THREAD_CLIENTS']
+        self.poll_interval = app.config['PRICE_STREAM_POLL_SECONDS']
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, factory: Optional[Callable] = None) -> Optional[Subscription]:
+        """Новый подписчик или None, если достигнут лимит клиентов.
+
+        factory() создает очередь подписчика с методами offer/close (по умолчанию Subscription
+        для потоков WSGI; ASGI передает AsyncSubscription). Подписчики-потоки дополнительно
+        ограничены max_thread_subscribers, чтобы SSE не занял все потоки sync-воркера.
+        """
+        subscription = factory() if factory else Subscription(self.max_queue)
+        holds_thread = isinstance(subscription, Subscription)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            if holds_thread and self.max_thread_subscribers and self._thread_subscribers >= self.max_thread_subscribers:
+                return None
+            self._subscribers.add(subscription)
+            if holds_thread:
+                self._thread_subscribers += 1
+            if self._app is not None and self.poll_interval and self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, daemon=True)
+                self._poller.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.discard(subscription)
+                if isinstance(subscription, Subscription):
+                    self._thread_subscribers -= 1
+
+    def publish(self, prices: List[Dict], max_change_id: Optional[int] = None) -> int:
+        """Рассылает изменившиеся цены всем подписчикам. Возвращает число получателей.
+
+        max_change_id - id записей PriceChange этих цен: опрос журнала не разошлет их повторно.
+        """
+        if max_change_id is not None:
+            with self._lock:
+                self._last_change_id = max(self._last_change_id or 0, max_change_id)
+        if not prices or not self._subscribers:
+            return 0
+        message = f"event: prices\ndata: {json.dumps(prices, ensure_ascii=False)}\n\n"
+        with self._lock:
+            subscribers = list(self._subscribers)
+        delivered = 0
+        for subscription in subscribers:
+            if subscription.offer(message):
+                delivered += 1
+            else:
+                self.unsubscribe(subscription)
+                subscription.close()
+                self.dropped += 1
+        self.published += 1
+        return delivered
+
+    def _poll_loop(self) -> None:
+        from app import db
+        from app.models.price_change import PriceChange
+
+        with self._app.app_context():
+            if self._last_change_id is None:
+                current_max = db.session.query(db.func.max(PriceChange.id)).scalar() or 0
+                db.session.remove()
+                with self._lock:
+                    # publish() мог уже сдвинуть отметку, пока шел запрос
+                    self._last_change_id = max(self._last_change_id or 0, current_max)
+            while True:
+                time.sleep(self.poll_interval)
+                with self._lock:
+                    if not self._subscribers:
+                        self._poller = None
+                        return
+                self.poll()
+
+    def poll(self) -> int:
+        """Разослать цены из журнала PriceChange, записанные после последней отметки."""
+        from app import db
+        from app.models.price_change import PriceChange
+
+        try:
+            rows = db.session.query(PriceChange.id, PriceChange.symbol, PriceChange.price, PriceChange.timestamp)\
+                .filter(PriceChange.id > (self._last_change_id or 0))\
+                .order_by(PriceChange.id).all()
+        except Exception as e:
+            logger.error(f"Ошибка опроса новых цен для SSE: {e}")
+            return 0
+        finally:
+            db.session.remove()
+        if not rows:
+            return 0
+        return self.publish([{'symbol': symbol, 'price': price, 'timestamp': timestamp.isoformat()}
+                             for _, symbol, price, timestamp in rows], max_change_id=rows[-1][0])
+
+
+def record_price_changes(prices: List[Dict]) -> Optional[int]:
+    """Записать цены [{'symbol', 'price', 'timestamp'}] в журнал PriceChange в текущей транзакции.
+
+    Возвращает наибольший id записи (для publish) или None, если опрос выключен
+    (PRICE_STREAM_POLL_SECONDS=0) и журнал не ведется. Заодно удаляет записи старше PRICE_CHANGE_KEEP.
+    """
+    from flask import current_app
+    from app import db
+    from app.models.price_change import PriceChange
+
+    if not prices or not current_app.config['PRICE_STREAM_POLL_SECONDS']:
+        return None
+    PriceChange.query.filter(PriceChange.created_at < datetime.utcnow() - PRICE_CHANGE_KEEP)\
+        .delete(synchronize_session=False)
+    changes = [PriceChange(symbol=price['symbol'].upper(), price=price['price'],
+                           timestamp=datetime.fromisoformat(price['timestamp'])) for price in prices]
+    db.session.add_all(changes)
+    db.session.flush()
+    return max(change.id for change in changes)
+
+
+# Единственный экземпляр на процесс, как и расширения в app/__init__.py
+price_stream_hub = PriceStreamHub()
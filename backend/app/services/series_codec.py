@@ -0,0 +1,114 @@
+"""Компактное колоночное представление рядов цен для ответов API.
+
+Вместо списка {'price': ..., 'timestamp': '...'} на каждую точку ряд передается так:
+
+    {"count": 3, "time_unit": "s", "t0": 1733270400, "dt": [86400, 86400],
+     "decimals": 2, "p0": 265123, "dp": [-310, 1204]}
+
+- timestamps: t0 (от эпохи в единицах time_unit) и целые приращения dt между соседними точками;
+- prices: целые price * 10**decimals, первое значение p0 и приращения dp.
+
+decimals подбирается минимальным (не больше MAX_DECIMALS), при котором все цены восстанавливаются
+без потерь, time_unit - самым крупным из s/ms/us, в котором все моменты целые. Для равномерных
+рядов dt состоит из одинаковых небольших чисел и хорошо сжимается gzip; в msgpack небольшие
+целые занимают 1-3 байта.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+COMPACT_JSON_MIMETYPE = 'application/vnd.metals.series+json'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+ENCODING = 'delta-v1'
+MAX_DECIMALS = 6
+
+TIME_UNITS = (('s', 1_000_000), ('ms', 1_000), ('us', 1))
+
+
+def _time_unit(timestamps_us: Sequence[int]) -> Tuple[str, int]:
+    for name, size in TIME_UNITS:
+        if all(ts % size == 0 for ts in timestamps_us):
+            return name, size
+    return TIME_UNITS[-1]
+
+
+def _decimals(prices: Sequence[float]) -> int:
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10 ** decimals
+        if all(abs(round(price * scale) / scale - price) <= 1e-9 * max(1.0, abs(price)) for price in prices):
+            return decimals
+    return MAX_DECIMALS
+
+
+def _deltas(values: List[int]) -> List[int]:
+    return [values[i] - values[i - 1] for i in range(1, len(values))]
+
+
+def _cumulative(first: int, deltas: Sequence[int]) -> List[int]:
+    values = [first]
+    for delta in deltas:
+        first += delta
+        values.append(first)
+    return values
+
+
+def encode_series(timestamps_us: Sequence[int], prices: Sequence[float]) -> Dict:
+    """Ряд (микросекунды от эпохи по возрастанию, цены) -> компактный словарь."""
+    if not len(timestamps_us):
+        return {'count': 0}
+    unit, size = _time_unit(timestamps_us)
+    times = [ts // size for ts in timestamps_us]
+    decimals = _decimals(prices)
+    scale = 10 ** decimals
+    scaled = [round(price * scale) for price in prices]
+    return {
+        'count': len(times),
+        'time_unit': unit,
+        't0': times[0],
+        'dt': _deltas(times),
+        'decimals': decimals,
+        'p0': scaled[0],
+        'dp': _deltas(scaled),
+    }
+
+
+def decode_series(payload: Dict) -> Tuple[List[int], List[float]]:
+    """Обратное преобразование encode_series: (микросекунды от эпохи, цены)."""
+    if not payload.get('count'):
+        return [], []
+    size = dict(TIME_UNITS)[payload['time_unit']]
+    scale = 10 ** payload['decimals']
+    timestamps = [value * size for value in _cumulative(payload['t0'], payload['dt'])]
+    prices = [value / scale for value in _cumulative(payload['p0'], payload['dp'])]
+    return timestamps, prices
+
+
+def negotiate(accept_mimetypes, format_param: Optional[str]) -> Optional[str]:
+    """Компактный mimetype ответа или None для обычного JSON.
+
+    Компактный формат включается явно: ?format=compact (JSON) или Accept с
+    application/vnd.metals.series+json / application/x-msgpack. msgpack предлагается,
+    только если установлен пакет msgpack.
+    """
+    if format_param == 'compact':
+        return COMPACT_JSON_MIMETYPE
+    offered = ['application/json', COMPACT_JSON_MIMETYPE]
+    if msgpack_available():
+        offered.append(MSGPACK_MIMETYPE)
+    best = accept_mimetypes.best_match(offered, default='application/json')
+    return best if best != 'application/json' else None
+
+
+def msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def serialize(payload: Dict, mimetype: str) -> bytes:
+    """Тело ответа в выбранном компактном формате."""
+    if mimetype == MSGPACK_MIMETYPE:
+        import msgpack
+        return msgpack.packb(payload, use_bin_type=True)
+    import json
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
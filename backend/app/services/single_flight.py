@@ -0,0 +1,99 @@
+from typing import Any, Callable, Dict, Hashable, Tuple
+import asyncio
+import threading
+import time
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединение одновременных вызовов с одинаковым ключом (single-flight).
+
+    Первый вызов с ключом выполняет функцию, остальные, пришедшие пока она работает,
+    ждут и получают тот же результат (или то же исключение). Дополнительно do() может
+    вернуть результат завершенного вызова, если он моложе reuse_for секунд - это окно
+    антидребезга для дорогих действий.
+
+    Объединение работает внутри процесса: воркеры gunicorn не видят вызовы друг друга.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._recent: Dict[Hashable, Tuple[float, Any]] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, reuse_for: float = 0, **kwargs):
+        with self._lock:
+            if reuse_for:
+                recent = self._recent.get(key)
+                if recent and time.monotonic() - recent[0] < reuse_for:
+                    self.shared += 1
+                    return recent[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if reuse_for and call.error is None:
+                    self._recent[key] = (time.monotonic(), call.result)
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """SingleFlight для корутин одного event loop (асинхронный режим app/asgi.py)."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        pending = self._calls.get(key)
+        if pending is not None:
+            self.shared += 1
+            # shield: отмена одного ожидающего запроса не должна отменять общий вызов
+            return await asyncio.shield(pending)
+
+        self.executed += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение получают ожидающие; помечаем его прочитанным, если их не было
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
@@ -0,0 +1,103 @@
+"""Производственный режим SQLite: WAL, настроенные PRAGMA и раздельные движки чтения/записи.
+
+Включается SQLITE_PRODUCTION_MODE=1. Все записи идут через движок db.engine с пулом
+из одного соединения (сериализованный писатель), чтения - через пул read-only соединений,
+которые в режиме WAL не блокируются писателем.
+"""
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.pool import QueuePool
+
+
+def sqlite_engine_options(app) -> dict:
+    """Опции движка-писателя: одно соединение, которое ждут остальные писатели."""
+    return {
+        'poolclass': QueuePool,
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': app.config['SQLITE_WRITE_TIMEOUT'],
+        'connect_args': {
+            'check_same_thread': False,
+            'timeout': app.config['SQLITE_WRITE_TIMEOUT'],
+        },
+    }
+
+
+def _pragma_listener(app, read_only: bool):
+    pragmas = [
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA mmap_size={app.config['SQLITE_MMAP_SIZE']}",
+        # Отрицательное значение cache_size задается в КиБ
+        f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_SIZE_KB']}",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_WRITE_TIMEOUT'] * 1000)}",
+    ]
+    if read_only:
+        pragmas.append('PRAGMA query_only=1')
+    else:
+        pragmas.insert(0, 'PRAGMA journal_mode=WAL')
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return on_connect
+
+
+def init_sqlite_production_mode(app, db) -> None:
+    """Настраивает PRAGMA писателя и создает пул read-only соединений для чтения."""
+    write_engine = db.get_engine(app)
+    event.listen(write_engine, 'connect', _pragma_listener(app, read_only=False))
+    # Первое соединение переводит базу в WAL до появления читателей
+    with write_engine.connect():
+        pass
+
+    database_path = write_engine.url.database
+    read_engine = create_engine(
+        f'sqlite:///file:{database_path}?mode=ro&uri=true',
+        poolclass=QueuePool,
+        pool_size=app.config['SQLITE_READ_POOL_SIZE'],
+        max_overflow=0,
+        pool_timeout=app.config['SQLITE_WRITE_TIMEOUT'],
+        connect_args={'check_same_thread': False},
+    )
+    event.listen(read_engine, 'connect', _pragma_listener(app, read_only=True))
+    app.extensions['sqlite_read_engine'] = read_engine
+
+
+class RoutingSession(SignallingSession):
+    """Сессия, направляющая SELECT в пул читателей, а все остальное - в писателя.
+
+    Как только сессия что-то записала (flush), до конца транзакции она читает
+    через писателя, чтобы видеть собственные незакоммиченные изменения.
+    """
+
+    def __init__(self, db, **options):
+        SignallingSession.__init__(self, db, **options)
+        self._read_engine = self.app.extensions.get('sqlite_read_engine')
+        if self._read_engine is not None:
+            event.listen(self, 'after_flush', RoutingSession._mark_writing)
+            for name in ('after_commit', 'after_rollback'):
+                event.listen(self, name, RoutingSession._clear_writing)
+
+    @staticmethod
+    def _mark_writing(session, flush_context):
+        session.info['writing'] = True
+
+    @staticmethod
+    def _clear_writing(session):
+        session.info.pop('writing', None)
+
+    def get_bind(self, mapper=None, clause=None):
+        if (self._read_engine is not None and not self._flushing and not self.info.get('writing')
+                and getattr(clause, 'is_select', False)
+                and not (self.new or self.dirty or self.deleted)):
+            return self._read_engine
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy с маршрутизацией чтения/записи для производственного режима SQLite."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -0,0 +1,131 @@
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence
+import logging
+import multiprocessing
+import os
+import time
+from sqlalchemy import create_engine, select
+from app import cache, db
+from app.models.metal import Metal, MetalAnalysis, MetalPrice
+from app.services.metal_service import ANALYSIS_CACHE_KEY, ANALYSIS_WINDOWS, compute_analysis
+
+logger = logging.getLogger(__name__)
+
+price_table = MetalPrice.__table__
+
+# Движок БД процесса пула (создается в initializer, у каждого процесса свой)
+_worker_engine = None
+
+
+def analyze_windows(timestamps: Sequence[datetime], prices: Sequence[float], end: datetime,
+                    windows: Sequence[int]) -> Dict[int, Dict]:
+    """Анализ каждого окна по одному ряду: окно - срез [end - window_days, end], найденный bisect."""
+    results = {}
+    for window_days in windows:
+        start = bisect_left(timestamps, end - timedelta(days=window_days))
+        result = compute_analysis(prices[start:])
+        if result:
+            results[window_days] = result
+    return results
+
+
+def _init_worker(database_uri: str) -> None:
+    global _worker_engine
+    _worker_engine = create_engine(database_uri)
+
+
+def _load_series(connection, metal_id: int, start: datetime, end: datetime):
+    rows = connection.execute(select(price_table.c.timestamp, price_table.c.price).where(
+        price_table.c.metal_id == metal_id,
+        price_table.c.timestamp >= start,
+        price_table.c.timestamp <= end
+    ).order_by(price_table.c.timestamp.asc())).all()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def _analyze_metal_in_worker(metal_id: int, end: datetime, windows: Sequence[int]) -> Dict[int, Dict]:
+    """Задача процесса пула: один раз прочитать ряд металла за самое длинное окно и посчитать все окна."""
+    with _worker_engine.connect() as connection:
+        timestamps, prices = _load_series(connection, metal_id, end - timedelta(days=max(windows)), end)
+    return analyze_windows(timestamps, prices, end, windows)
+
+
+class AnalyticsBatch:
+    """Пакетный расчет анализа всех металлов по всем окнам (по умолчанию 7/30/90/365 дней).
+
+    Металлы распределяются по пулу из workers процессов (расчет упирается в CPU, а не в
+    ожидание); каждый процесс читает ряд металла из БД один раз - за самое длинное окно - и
+    считает по нему все окна. Результаты записываются в MetalAnalysis одной пачкой, откуда
+    MetalService.analyze_metal отдает их, пока они свежие. workers по умолчанию - число CPU;
+    при одном процессе расчет идет в текущем процессе, без пула (запуск процесса spawn
+    стоит дороже, чем расчет нескольких металлов).
+    """
+
+    def __init__(self, windows: Sequence[int] = ANALYSIS_WINDOWS, workers: Optional[int] = None):
+        if not windows or any(window not in ANALYSIS_WINDOWS for window in windows):
+            raise ValueError(f"Окна анализа должны быть из {ANALYSIS_WINDOWS}")
+        self.windows = tuple(sorted(set(windows)))
+        self.workers = workers or os.cpu_count() or 1
+
+    def run(self) -> Dict:
+        """Посчитать и сохранить анализ; возвращает отчет. Должен вызываться в контексте приложения."""
+        started = time.perf_counter()
+        end = datetime.utcnow()
+        metals = Metal.query.all()
+        database_uri = db.engine.url.render_as_string(hide_password=False)
+        workers = min(self.workers, len(metals))
+        if workers > 1 and (database_uri == 'sqlite://' or ':memory:' in database_uri):
+            # Процессы пула не видят базу в памяти
+            workers = 1
+
+        if workers > 1:
+            # spawn, а не fork: в процессе работают потоки (PriceUpdater, очередь задач) и открыты соединения
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(database_uri,)) as executor:
+                futures = {metal.id: executor.submit(_analyze_metal_in_worker, metal.id, end, self.windows)
+                           for metal in metals}
+                results = {metal_id: future.result() for metal_id, future in futures.items()}
+        else:
+            results = {}
+            with db.engine.connect() as connection:
+                for metal in metals:
+                    timestamps, prices = _load_series(connection, metal.id, end - timedelta(days=max(self.windows)), end)
+                    results[metal.id] = analyze_windows(timestamps, prices, end, self.windows)
+
+        rows = [{
+            'metal_id': metal_id,
+            'window_days': window_days,
+            'period_start': end - timedelta(days=window_days),
+            'period_end': end,
+            'created_at': end,
+            **result
+        } for metal_id, by_window in results.items() for window_days, result in by_window.items()]
+        if rows:
+            # Строка на (металл, окно): прежний анализ заменяется в той же транзакции, таблица не растет
+            db.session.query(MetalAnalysis).filter(
+                MetalAnalysis.metal_id.in_(list(results)),
+                MetalAnalysis.window_days.in_(self.windows)
+            ).delete(synchronize_session=False)
+            db.session.bulk_insert_mappings(MetalAnalysis, rows)
+            db.session.commit()
+        cache.delete_many(*(ANALYSIS_CACHE_KEY.format(metal.symbol, window)
+                            for metal in metals for window in self.windows))
+
+        report = {
+            'metals': len(metals),
+            'windows': list(self.windows),
+            'rows': len(rows),
+            'workers': workers,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+        logger.info(f"Пакетный анализ металлов: {report}")
+        return report
+
+
+def analytics_batch_from_config(config) -> Optional[AnalyticsBatch]:
+    """AnalyticsBatch по настройкам приложения или None, если ночной пакет выключен."""
+    if not config.get('ANALYTICS_BATCH_ENABLED'):
+        return None
+    return AnalyticsBatch(workers=config['ANALYTICS_WORKERS'] or None)
@@ -0,0 +1,275 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import socket
+import uuid
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.logging_setup import current_request_id, request_id_var
+from app.models.job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Процесс, выполняющий задачу: попадает в статус задачи, чтобы было видно, какой воркер ее ведет
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobQueueFull(Exception):
+    """В очереди уже max_pending незавершенных задач."""
+
+
+class Job:
+    """Фоновая задача: состояние, прогресс и результат для GET /api/jobs/<id>."""
+
+    def __init__(self, job_type: str, params: Dict, key_hash: str):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.params = params
+        self.key_hash = key_hash
+        # Запрос, поставивший задачу: его request_id попадает в логи задачи
+        self.request_id = current_request_id()
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message: Optional[str] = None
+        self.rows: Optional[int] = None
+        self.error: Optional[str] = None
+        self.worker: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._on_progress: Optional[Callable] = None
+
+    @classmethod
+    def from_row(cls, row) -> 'Job':
+        job = cls.__new__(cls)
+        job.id = row.id
+        job.type = row.type
+        job.params = json.loads(row.params)
+        job.key_hash = row.key_hash
+        job.request_id = row.request_id
+        job.status = row.status
+        job.progress = row.progress
+        job.message = row.message
+        job.rows = row.rows
+        job.error = row.error
+        job.worker = row.worker
+        job.created_at = row.created_at
+        job.started_at = row.started_at
+        job.finished_at = row.finished_at
+        job._on_progress = None
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return round(((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds(), 3)
+
+    def set_progress(self, done: int, total: int, message: Optional[str] = None):
+        self.progress = round(done / total, 3) if total else 1.0
+        if message is not None:
+            self.message = message
+        if self._on_progress:
+            self._on_progress(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'type': self.type,
+            'params': self.params,
+            'request_id': self.request_id,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'rows': self.rows,
+            'error': self.error,
+            'worker': self.worker,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_seconds': self.duration,
+        }
+
+
+class JobQueue:
+    """Очередь фоновых задач: состояние в таблице BackgroundJob, выполнение - пулом потоков процесса.
+
+    - Задача выполняется в процессе, который ее поставил, а статус читается из БД, поэтому
+      GET /api/jobs/<id> отвечает одинаково на любом воркере gunicorn.
+    - Задачи с одинаковым ключом (тип + параметры) не дублируются между всеми воркерами:
+      пока задача в очереди или выполняется, submit() возвращает ее же (уникальный
+      active_key); с reuse_for > 0 так же возвращается успешная задача, завершившаяся не
+      раньше reuse_for секунд назад.
+    - В одном процессе одновременно выполняется не больше max_workers задач, остальные ждут;
+      при max_pending незавершенных задачах во всех процессах submit() выбрасывает JobQueueFull.
+    - Незавершенная задача, которая не обновлялась stale_after секунд (процесс упал или был
+      перезапущен), помечается failed, и ее ключ освобождается.
+    - Обработчик получает (job, **params) и возвращает число записанных строк; он выполняется
+      в контексте приложения.
+
+    Состояние пишется через отдельные транзакции db.engine.begin() и не затрагивает сессию
+    запроса или обработчика.
+    """
+
+    def __init__(self, app, max_workers: int = 2, max_pending: int = 100, history_size: int = 200,
+                 stale_after: float = 3600):
+        self.app = app
+        self.max_pending = max_pending
+        self.history_size = history_size
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._handlers: Dict[str, Callable] = {}
+
+    def register(self, job_type: str, handler: Callable):
+        self._handlers[job_type] = handler
+
+    def submit(self, job_type: str, params: Optional[Dict] = None, reuse_for: float = 0) -> Tuple[Job, bool]:
+        """Поставить задачу в очередь. Возвращает (задача, создана ли новая)."""
+        if job_type not in self._handlers:
+            raise ValueError(f"Неизвестный тип задачи: {job_type}")
+        params = params or {}
+        key_hash = hashlib.sha1(json.dumps([job_type, params], sort_keys=True).encode('utf-8')).hexdigest()
+        table = BackgroundJob.__table__
+        now = datetime.utcnow()
+        with db.engine.begin() as connection:
+            connection.execute(table.update()
+                               .where(table.c.active_key.isnot(None), table.c.updated_at < now - timedelta(seconds=self.stale_after))
+                               .values(status=FAILED, error='Воркер, выполнявший задачу, не отвечает',
+                                       active_key=None, finished_at=now, updated_at=now))
+            existing = self._find(connection, table.c.active_key == key_hash)
+            if existing is None and reuse_for:
+                existing = self._find(connection, (table.c.key_hash == key_hash) & (table.c.status == SUCCEEDED)
+                                      & (table.c.finished_at >= now - timedelta(seconds=reuse_for)))
+            if existing is not None:
+                return existing, False
+            pending = connection.execute(select(func.count()).select_from(table)
+                                         .where(table.c.active_key.isnot(None))).scalar()
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"В очереди уже {pending} задач")
+        job = Job(job_type, params, key_hash)
+        job.worker = WORKER_ID
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.insert().values(
+                    id=job.id, type=job.type, params=json.dumps(params), active_key=key_hash, key_hash=key_hash,
+                    request_id=job.request_id, status=QUEUED, progress=0.0, worker=job.worker,
+                    created_at=job.created_at, updated_at=job.created_at))
+        except IntegrityError:
+            # Ту же задачу между проверкой и вставкой поставил другой воркер
+            with db.engine.begin() as connection:
+                existing = self._find(connection, table.c.active_key == key_hash)
+            if existing is not None:
+                return existing, False
+            raise
+        self._trim()
+        job._on_progress = self._save
+        self._executor.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with db.engine.begin() as connection:
+            return self._find(connection, BackgroundJob.__table__.c.id == job_id)
+
+    def recent(self, limit: int = 50) -> List[Job]:
+        table = BackgroundJob.__table__
+        with db.engine.begin() as connection:
+            rows = connection.execute(select(table).order_by(table.c.created_at.desc()).limit(limit)).all()
+        return [Job.from_row(row) for row in rows]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    @staticmethod
+    def _find(connection, condition) -> Optional[Job]:
+        table = BackgroundJob.__table__
+        row = connection.execute(select(table).where(condition).order_by(table.c.created_at.desc()).limit(1)).first()
+        return Job.from_row(row) if row is not None else None
+
+    def _trim(self):
+        # Старые завершенные задачи удаляются; незавершенные остаются, пока не закончатся
+        table = BackgroundJob.__table__
+        with db.engine.begin() as connection:
+            boundary = connection.execute(select(table.c.created_at).order_by(table.c.created_at.desc())
+                                          .offset(self.history_size).limit(1)).scalar()
+            if boundary is not None:
+                connection.execute(table.delete().where(table.c.active_key.is_(None), table.c.created_at <= boundary))
+
+    def _save(self, job: Job, **extra):
+        table = BackgroundJob.__table__
+        with db.engine.begin() as connection:
+            connection.execute(table.update().where(table.c.id == job.id).values(
+                status=job.status, progress=job.progress, message=job.message, rows=job.rows, error=job.error,
+                worker=job.worker, started_at=job.started_at, finished_at=job.finished_at,
+                updated_at=datetime.utcnow(), **extra))
+
+    def _run(self, job: Job):
+        job.status = RUNNING
+        job.started_at = datetime.utcnow()
+        request_id_token = request_id_var.set(job.request_id or job.id)
+        try:
+            with self.app.app_context():
+                self._save(job)
+                job.rows = self._handlers[job.type](job, **job.params) or 0
+            job.progress = 1.0
+            job.status = SUCCEEDED
+        except Exception as e:
+            logger.error(f"Задача {job.type} {job.id} завершилась с ошибкой: {e}", exc_info=True)
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = datetime.utcnow()
+            try:
+                with self.app.app_context():
+                    self._save(job, active_key=None)
+            except Exception as e:
+                logger.error(f"Не удалось сохранить состояние задачи {job.id}: {e}")
+        logger.info(f"Задача {job.type} {job.id}: {job.status}, строк: {job.rows}, {job.duration} с")
+        request_id_var.reset(request_id_token)
+
+
+def run_update(job: Job) -> int:
+    """Обновление текущих цен парсером (POST /api/metals/update)."""
+    from app.services.metal_service import MetalService
+
+    job.message = 'Парсинг текущих цен'
+    return MetalService.update_prices_from_parser(raise_errors=True)
+
+
+def run_backfill(job: Job, metals: List[str], date_from: str, date_to: str) -> int:
+    """Загрузка истории с mfd.ru (POST /api/metals/backfill), прогресс - по металлам."""
+    from app.services.metal_service import MetalService
+
+    return MetalService.backfill_from_mfd(
+        list(metals), date_from, date_to,
+        progress=lambda done, total: job.set_progress(done, total, f"Загружено металлов: {done} из {total}"))
+
+
+def create_job_queue(app) -> JobQueue:
+    queue = JobQueue(app,
+                     max_workers=app.config['JOB_WORKERS'],
+                     max_pending=app.config['JOB_MAX_PENDING'],
+                     history_size=app.config['JOB_HISTORY_SIZE'],
+                     stale_after=app.config['JOB_STALE_SECONDS'])
+    queue.register('update', run_update)
+    queue.register('backfill', run_backfill)
+    return queue
+
+
+def get_job_queue() -> JobQueue:
+    """Очередь задач текущего приложения."""
+    from flask import current_app
+    return current_app.extensions['job_queue']
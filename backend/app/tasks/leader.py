@@ -0,0 +1,62 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LeaderLock:
+    """Межпроцессная блокировка «лидера» на основе файловой блокировки ОС.
+
+    Блокировку держит не более одного процесса; если лидер завершается (в том числе аварийно),
+    ОС снимает блокировку и ее может захватить другой воркер.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_held(self) -> bool:
+        return self._file is not None
+
+    def try_acquire(self) -> bool:
+        """Неблокирующая попытка стать лидером. Возвращает True, если блокировка у нас."""
+        with self._lock:
+            if self._file is not None:
+                return True
+            lock_file = open(self.path, 'a+')
+            try:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            except OSError:
+                lock_file.close()
+                return False
+            # PID лидера - для диагностики
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(str(os.getpid()))
+            lock_file.flush()
+            self._file = lock_file
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                if fcntl:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,313 @@
+"""Секционирование MetalPrice по месяцам в PostgreSQL (PRICE_PARTITIONING=1).
+
+Таблица metal_price становится секционированной по диапазону timestamp (PARTITION BY
+RANGE), по одной секции metal_price_pYYYY_MM на месяц. Запрос истории за период читает
+только секции своих месяцев (partition pruning), а удаление старых цен - это DETACH и
+DROP целой секции вместо DELETE по строкам.
+
+- Секции создаются заранее на PRICE_PARTITION_MONTHS_AHEAD месяцев вперед (при старте и
+  в ежедневном обслуживании PriceUpdater), а для месяцев из загружаемой пачки цен - перед
+  записью (загрузка истории за прошлые годы).
+- При PRICE_PARTITION_RETENTION_MONTHS > 0 секции старше этого числа месяцев отсоединяются
+  и удаляются; перед удалением дневные OHLC их цен записываются в MetalPriceDaily.
+- Существующая несекционированная таблица переводится командой flask partition-prices
+  --convert (при старте - автоматически, только если она пустая).
+
+На SQLite и других СУБД модуль ничего не делает.
+"""
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set
+import json
+import logging
+import re
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from app import db
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'metal_price'
+PARTITION_NAME = re.compile(r'^metal_price_p(\d{4})_(\d{2})$')
+# Ключи session.info: месяцы, созданные в открытой транзакции сессии, и признак подписки на ее коммит
+PENDING_MONTHS_KEY = 'price_partitions_pending'
+LISTENING_KEY = 'price_partitions_listening'
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{PARENT_TABLE}_p{month.year:04d}_{month.month:02d}'
+
+
+class PricePartitions:
+    """Создание, перевод и удаление месячных секций metal_price."""
+
+    def __init__(self, months_ahead: int = 3, retention_months: int = 0):
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        # Месяцы, для которых секция точно есть: проверка пачки цен без запросов к БД
+        self._known: Set[date] = set()
+
+    def is_partitioned(self) -> bool:
+        return bool(db.session.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :name AND pg_table_is_visible(c.oid))"
+        ), {'name': PARENT_TABLE}).scalar())
+
+    def partitions(self) -> List[Dict]:
+        """Секции metal_price по возрастанию месяца с оценкой числа строк (pg_class.reltuples)."""
+        rows = db.session.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name AND pg_table_is_visible(p.oid) ORDER BY c.relname"
+        ), {'name': PARENT_TABLE}).all()
+        result = []
+        for name, bound, estimated_rows in rows:
+            match = PARTITION_NAME.match(name)
+            result.append({
+                'name': name,
+                'month': date(int(match.group(1)), int(match.group(2)), 1).isoformat() if match else None,
+                'bound': bound,
+                'estimated_rows': max(int(estimated_rows), 0)
+            })
+        return result
+
+    def ensure(self, months: Iterable[date] = ()) -> List[str]:
+        """Создать недостающие секции: месяцы months и от текущего на months_ahead вперед."""
+        current = month_start(datetime.utcnow())
+        wanted = {add_months(current, offset) for offset in range(self.months_ahead + 1)}
+        wanted.update(month_start(month) for month in months)
+        missing = sorted(wanted - self._known)
+        if not missing:
+            return []
+        session = db.session()
+        in_transaction = session.in_transaction()
+        if not self._known:
+            self._known.update(date.fromisoformat(p['month']) for p in self.partitions() if p['month'])
+            missing = sorted(wanted - self._known)
+            if not in_transaction:
+                # Чтение каталога открыло транзакцию сессии; закрываем ее, чтобы не держать снимок
+                session.commit()
+            if not missing:
+                return []
+        if in_transaction:
+            # Сессия уже читала metal_price (фильтр цен, проверка дубликатов) и держит блокировку
+            # до конца транзакции: DDL в отдельном соединении ждал бы ее вечно. Секции создаются
+            # в той же транзакции и появятся вместе с ценами; в _known месяцы попадают после
+            # коммита этой транзакции (если ее откатят, откатятся и секции).
+            created = []
+            for month in missing:
+                with session.begin_nested():
+                    if session.execute(text('SELECT to_regclass(:name)'), {'name': partition_name(month)}).scalar() is None:
+                        session.execute(text(self._create_sql(month)))
+                        created.append(partition_name(month))
+            self._remember_after_commit(session, missing)
+            if created:
+                logger.info(f"Созданы секции {PARENT_TABLE} в транзакции загрузки: {', '.join(created)}")
+            return created
+        created = []
+        # Отдельное соединение в autocommit: DDL не держит блокировку до конца транзакции загрузки цен
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            for month in missing:
+                name = partition_name(month)
+                # CREATE ... IF NOT EXISTS не сообщает, была ли секция: проверяем заранее
+                if connection.execute(text('SELECT to_regclass(:name)'), {'name': name}).scalar() is None:
+                    try:
+                        connection.execute(text(self._create_sql(month)))
+                        created.append(name)
+                    except DBAPIError as e:
+                        # Ту же секцию одновременно создал другой процесс
+                        if 'already exists' not in str(e.orig):
+                            raise
+                self._known.add(month)
+        if created:
+            logger.info(f"Созданы секции {PARENT_TABLE}: {', '.join(created)}")
+        return created
+
+    def _remember_after_commit(self, session, months: List[date]) -> None:
+        """Добавить months в _known после коммита транзакции session; при откате - забыть."""
+        pending = session.info.setdefault(PENDING_MONTHS_KEY, set())
+        pending.update(months)
+        if not session.info.get(LISTENING_KEY):
+            session.info[LISTENING_KEY] = True
+            event.listen(session, 'after_commit',
+                         lambda committed: self._known.update(committed.info.pop(PENDING_MONTHS_KEY, ())))
+            event.listen(session, 'after_rollback', lambda rolled_back: rolled_back.info.pop(PENDING_MONTHS_KEY, None))
+
+    @staticmethod
+    def _create_sql(month: date) -> str:
+        return (f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')")
+
+    def ensure_for(self, timestamps: Iterable[datetime]) -> List[str]:
+        """Секции для месяцев пачки цен перед записью; без запросов, если все месяцы уже известны."""
+        months = {month_start(timestamp) for timestamp in timestamps}
+        if months <= self._known:
+            return []
+        return self.ensure(months)
+
+    def convert(self, keep_old: bool = False) -> Dict:
+        """Перевести несекционированную metal_price в секционированную одной транзакцией.
+
+        Старая таблица переименовывается, новая создается с первичным ключом (id, timestamp)
+        (ключ секционированной таблицы обязан включать ключ секционирования), строки копируются
+        в секции своих месяцев. id сохраняются, последовательность id переходит к новой таблице.
+        """
+        if self.is_partitioned():
+            return {'converted': False, 'reason': 'already partitioned', 'partitions': len(self.partitions())}
+        legacy = f'{PARENT_TABLE}_unpartitioned'
+        session = db.session
+        session.execute(text(f'LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE'))
+        sequence = session.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                                   {'table': PARENT_TABLE}).scalar()
+        first, last, rows = session.execute(text(
+            f'SELECT min("timestamp"), max("timestamp"), count(*) FROM {PARENT_TABLE}')).one()
+
+        session.execute(text(f'ALTER TABLE {PARENT_TABLE} RENAME TO {legacy}'))
+        for index in session.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = :table AND schemaname = current_schema()"),
+                {'table': legacy}).scalars().all():
+            # metal_price_pkey, ix_metal_price_timestamp: имена освобождаются для индексов новой таблицы
+            if PARENT_TABLE in index:
+                session.execute(text(f'ALTER INDEX {index} RENAME TO {index.replace(PARENT_TABLE, legacy, 1)}'))
+        if sequence is None:
+            sequence = f'{PARENT_TABLE}_id_seq'
+            session.execute(text(f'CREATE SEQUENCE {sequence}'))
+        session.execute(text(
+            f'CREATE TABLE {PARENT_TABLE} ('
+            f"id integer NOT NULL DEFAULT nextval('{sequence}'), "
+            f'metal_id integer NOT NULL REFERENCES metal (id), '
+            f'price double precision NOT NULL, '
+            f'"timestamp" timestamp without time zone NOT NULL, '
+            f'created_at timestamp without time zone, '
+            f'PRIMARY KEY (id, "timestamp")'
+            f') PARTITION BY RANGE ("timestamp")'
+        ))
+        session.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id'))
+        session.execute(text(f'CREATE INDEX ix_{PARENT_TABLE}_timestamp ON {PARENT_TABLE} ("timestamp")'))
+        session.execute(text(f'CREATE INDEX ix_{PARENT_TABLE}_metal_id_timestamp ON {PARENT_TABLE} (metal_id, "timestamp")'))
+
+        months = []
+        if rows:
+            month = month_start(first)
+            while month <= month_start(last):
+                months.append(month)
+                month = add_months(month, 1)
+        current = month_start(datetime.utcnow())
+        months.extend(add_months(current, offset) for offset in range(self.months_ahead + 1))
+        for month in sorted(set(months)):
+            session.execute(text(
+                f"CREATE TABLE {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+        session.execute(text(
+            f'INSERT INTO {PARENT_TABLE} (id, metal_id, price, "timestamp", created_at) '
+            f'SELECT id, metal_id, price, "timestamp", created_at FROM {legacy}'
+        ))
+        session.execute(text(f"SELECT setval('{sequence}', (SELECT coalesce(max(id), 0) + 1 FROM {PARENT_TABLE}), false)"))
+        if not keep_old:
+            session.execute(text(f'DROP TABLE {legacy}'))
+        session.commit()
+        self._known = set(months)
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text(f'ANALYZE {PARENT_TABLE}'))
+
+        report = {
+            'converted': True,
+            'rows': rows,
+            'partitions': len(set(months)),
+            'legacy_table': legacy if keep_old else None
+        }
+        logger.info(f"Таблица {PARENT_TABLE} переведена на месячные секции: {report}")
+        return report
+
+    def drop_expired(self) -> Dict:
+        """Отсоединить и удалить секции старше retention_months месяцев (0 - ничего не удалять)."""
+        if not self.retention_months:
+            return {'dropped': []}
+        cutoff = add_months(month_start(datetime.utcnow()), -self.retention_months)
+        expired = [p for p in self.partitions() if p['month'] and date.fromisoformat(p['month']) < cutoff]
+        dropped = []
+        for partition in expired:
+            name = partition['name']
+            # Дневные OHLC сохраняются; дни, уже свернутые RetentionJob, остаются как есть
+            db.session.execute(text(
+                'INSERT INTO metal_price_daily (metal_id, date, open, high, low, close, tick_count, created_at) '
+                'SELECT metal_id, "timestamp"::date, (array_agg(price ORDER BY "timestamp"))[1], max(price), min(price), '
+                '(array_agg(price ORDER BY "timestamp" DESC))[1], count(*), now() AT TIME ZONE \'utc\' '
+                f'FROM {name} GROUP BY metal_id, "timestamp"::date '
+                'ON CONFLICT (metal_id, date) DO NOTHING'
+            ))
+            db.session.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}'))
+            db.session.execute(text(f'DROP TABLE {name}'))
+            db.session.commit()
+            self._known.discard(date.fromisoformat(partition['month']))
+            dropped.append(name)
+        if dropped:
+            from app.tasks.retention import refresh_series_sources
+            refresh_series_sources(datetime.combine(cutoff, datetime.min.time()))
+            logger.info(f"Удалены секции {PARENT_TABLE} старше {cutoff}: {', '.join(dropped)}")
+        return {'cutoff': cutoff.isoformat(), 'dropped': dropped}
+
+    def explain_history(self, metal_id: int, start: datetime, end: datetime) -> Dict:
+        """Какие секции читает запрос истории за [start, end] (проверка partition pruning)."""
+        plan = db.session.execute(text(
+            'EXPLAIN (FORMAT JSON) SELECT "timestamp", price FROM metal_price '
+            'WHERE metal_id = :metal_id AND "timestamp" >= :start AND "timestamp" <= :end ORDER BY "timestamp"'
+        ), {'metal_id': metal_id, 'start': start, 'end': end}).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scanned = sorted(set(_relations(plan[0]['Plan'])))
+        return {'scanned': scanned, 'total_partitions': len(self.partitions())}
+
+
+def _relations(node: Dict) -> List[str]:
+    names = [node['Relation Name']] if 'Relation Name' in node else []
+    for child in node.get('Plans', []):
+        names.extend(_relations(child))
+    return names
+
+
+def partitions_enabled(config) -> bool:
+    return bool(config.get('PRICE_PARTITIONING')) and db.engine.dialect.name == 'postgresql'
+
+
+def price_partitions_from_config(config) -> PricePartitions:
+    return PricePartitions(months_ahead=config['PRICE_PARTITION_MONTHS_AHEAD'],
+                           retention_months=config['PRICE_PARTITION_RETENTION_MONTHS'])
+
+
+def get_price_partitions() -> Optional[PricePartitions]:
+    """Менеджер секций текущего приложения или None (секционирование выключено или не PostgreSQL)."""
+    partitions = current_app.extensions.get('price_partitions')
+    if partitions is None and partitions_enabled(current_app.config):
+        partitions = current_app.extensions.setdefault('price_partitions', price_partitions_from_config(current_app.config))
+    return partitions
+
+
+def init_price_partitions(app) -> Optional[Dict]:
+    """При старте: перевести пустую metal_price на секции и создать секции вперед."""
+    if app.config.get('PRICE_PARTITIONING') and db.engine.dialect.name != 'postgresql':
+        logger.warning("PRICE_PARTITIONING=1 поддерживается только для PostgreSQL; секционирование не включено")
+        return None
+    partitions = get_price_partitions()
+    if partitions is None:
+        return None
+    report = {}
+    if not partitions.is_partitioned():
+        if db.session.execute(text(f'SELECT EXISTS (SELECT 1 FROM {PARENT_TABLE})')).scalar():
+            logger.warning(f"{PARENT_TABLE} не секционирована и содержит данные: "
+                           "выполните flask --app run partition-prices --convert")
+            db.session.rollback()
+            return report
+        report = partitions.convert()
+    report['created'] = partitions.ensure()
+    return report
@@ -1,16 +1,35 @@
-import time
-from datetime import datetime
+from datetime import date, datetime
+import logging
+import os
 import threading
 from app.services.metal_service import MetalService
 from app.services.alpha_vantage_service import MetalParserService
+from app.services.forecast_service import forecast_batch_from_config
+from app.tasks.analytics import analytics_batch_from_config
+from app.tasks.partitions import get_price_partitions
+from app.tasks.retention import retention_job_from_config
+from app.tasks.leader import LeaderLock
+from app.tasks.scheduler import AdaptiveSchedule
+
+logger = logging.getLogger(__name__)
 
 class PriceUpdater:
-    def __init__(self, app, update_interval=600):  # 600 seconds = 10 minutes
+    def __init__(self, app, update_interval=600, lock_path=None, leader_retry_interval=30):  # 600 seconds = 10 minutes
         self.app = app
         self.update_interval = update_interval
+        # Под gunicorn PriceUpdater стартует в каждом воркере; цены обновляет только держатель блокировки
+        self.leader_lock = LeaderLock(lock_path) if lock_path else None
+        self.leader_retry_interval = min(leader_retry_interval, update_interval)
+        self.schedule = AdaptiveSchedule.from_config(app.config, base_interval=update_interval)
         self.running = False
+        self._stop_event = threading.Event()
+        self._last_signature = None
         self.thread = None
         self.parser_service = MetalParserService()
+        self.maintenance_hour = app.config['MAINTENANCE_HOUR_UTC']
+        # Дата последнего обслуживания переживает перезапуск и смену лидера
+        self.maintenance_state_path = f'{lock_path}.maintenance' if lock_path else None
+        self.last_maintenance_date = self._load_maintenance_date()
 
     def start(self):
         """Start the price update thread."""
@@ -18,6 +37,7 @@ class PriceUpdater:
             return
 
         self.running = True
+        self._stop_event.clear()
         self.thread = threading.Thread(target=self._update_loop)
         self.thread.daemon = True
         self.thread.start()
@@ -25,35 +45,121 @@ class PriceUpdater:
     def stop(self):
         """Stop the price update thread."""
         self.running = False
+        # Прерывает ожидание следующего опроса сразу, без досыпания интервала
+        self._stop_event.set()
         if self.thread:
             self.thread.join()
+        if self.leader_lock:
+            self.leader_lock.release()
+
+    @property
+    def is_leader(self):
+        return self.leader_lock is None or self.leader_lock.is_held
 
     def _update_loop(self):
         """Main update loop."""
         with self.app.app_context():
             while self.running:
+                if self.leader_lock and not self.leader_lock.try_acquire():
+                    # Лидер - другой процесс; ждем, пока блокировка не освободится
+                    self._stop_event.wait(self.leader_retry_interval)
+                    continue
+                changed, error = False, False
+                # Первый успешный опрос сравнивать не с чем: это не момент публикации
+                had_signature = self._last_signature is not None
+                try:
+                    changed = self._fetch_and_update_prices()
+                except Exception as e:
+                    error = True
+                    logger.error(f"Error updating prices: {e}")
+                now = datetime.utcnow()
+                self.schedule.record(now, changed, error, learn=had_signature)
                 try:
-                    self._fetch_and_update_prices()
+                    self._run_daily_maintenance(now)
                 except Exception as e:
-                    print(f"Error updating prices: {e}")
-                time.sleep(self.update_interval)
+                    logger.error(f"Error running daily maintenance: {e}", exc_info=True)
+                self._stop_event.wait(self.schedule.next_delay(now))
+
+    def _run_daily_maintenance(self, now):
+        """Run once-a-day jobs (partitions, tick retention, analytics batch, forecasts).
+
+        They run on the first loop iteration at or after MAINTENANCE_HOUR_UTC, once per UTC day.
+        The date of the last run is kept in a file next to the leader lock, so restarts and a new
+        leader do not repeat it.
+        """
+        today = now.date()
+        if self.last_maintenance_date == today or now.hour < self.maintenance_hour:
+            return
+        # Обслуживание мог уже выполнить предыдущий лидер
+        self.last_maintenance_date = self._load_maintenance_date()
+        if self.last_maintenance_date == today:
+            return
+        # Дата записывается до запуска: упавшее обслуживание не повторяется на каждом перезапуске
+        self._save_maintenance_date(today)
+        partitions = get_price_partitions()
+        if partitions:
+            partitions.ensure()
+            report = partitions.drop_expired()
+            if report['dropped']:
+                logger.info(f"Partitions: dropped {len(report['dropped'])} expired months")
+        retention_job = retention_job_from_config(self.app.config)
+        if retention_job:
+            report = retention_job.run()
+            logger.info(f"Retention: deleted {report['rows_deleted']} ticks, compacted {report['days_to_compact']} days")
+        analytics_batch = analytics_batch_from_config(self.app.config)
+        if analytics_batch:
+            report = analytics_batch.run()
+            logger.info(f"Analytics batch: {report['rows']} rows for {report['metals']} metals in {report['duration_ms']} ms")
+        report = forecast_batch_from_config(self.app.config).run()
+        logger.info(f"Forecast batch: {report['forecasts']} metals in {report['duration_ms']} ms")
+
+    def _load_maintenance_date(self):
+        if not self.maintenance_state_path:
+            return None
+        try:
+            with open(self.maintenance_state_path) as f:
+                return date.fromisoformat(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _save_maintenance_date(self, day):
+        self.last_maintenance_date = day
+        if not self.maintenance_state_path:
+            return
+        tmp_path = f'{self.maintenance_state_path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(day.isoformat())
+            os.replace(tmp_path, self.maintenance_state_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить дату обслуживания: {e}")
 
     def _fetch_and_update_prices(self):
-        """Fetch prices from web and update the database."""
+        """Fetch prices from web and update the database. Returns True if the content changed."""
         try:
             # Get current prices for all metals
             prices_data = self.parser_service.get_all_current_prices()
+            if not prices_data:
+                # Парсер проглатывает сетевые ошибки и возвращает пустой список
+                raise ValueError("Парсер не вернул цен")
+            signature = tuple(sorted((p['symbol'], p['price'], p.get('timestamp')) for p in prices_data))
+            if signature == self._last_signature:
+                logger.info("Prices unchanged since the last fetch, skipping database update")
+                return False
             # Transform the data to match our database format
             db_prices_data = []
             for price_data in prices_data:
                 db_prices_data.append({
                     'symbol': price_data['symbol'],
                     'price': price_data['price'],
-                    'timestamp': datetime.utcnow()
+                    # update_prices ожидает timestamp в ISO формате
+                    'timestamp': datetime.utcnow().isoformat()
                 })
             # Update prices in the database
             MetalService.update_prices(db_prices_data)
-            print(f"Successfully updated prices at {datetime.utcnow()}")
+            self._last_signature = signature
+            logger.info(f"Successfully updated prices at {datetime.utcnow()}")
+            return True
         except Exception as e:
-            print(f"Error fetching prices: {e}")
+            logger.error(f"Error fetching prices: {e}")
             raise 
\ No newline at end of file
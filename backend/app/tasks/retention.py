@@ -0,0 +1,209 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+import logging
+import time as time_module
+from sqlalchemy import func, text
+from app import db
+from app.models.metal import MetalPrice, MetalPriceDaily
+
+logger = logging.getLogger(__name__)
+
+# Оценка размера строки MetalPrice вместе с индексом, если dbstat/pg_total_relation_size недоступны
+DEFAULT_BYTES_PER_ROW = 64
+
+
+class RetentionJob:
+    """Сворачивает внутридневные тики MetalPrice старше retention_days в дневные OHLC строки.
+
+    От каждого такого дня в MetalPrice остается только последний тик (цена закрытия),
+    поэтому история и анализ продолжают работать с дневным разрешением, а полные
+    OHLC значения сохраняются в MetalPriceDaily. Тики удаляются пачками по batch_size
+    с коммитом после каждой пачки, чтобы не держать долгую блокировку записи.
+    """
+
+    def __init__(self, retention_days: int, batch_size: int = 1000, vacuum_pages: int = 1000,
+                 pause: float = 0.0):
+        if retention_days < 1:
+            raise ValueError("retention_days должен быть не меньше 1")
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.pause = pause
+
+    @property
+    def cutoff(self) -> datetime:
+        return datetime.combine(datetime.utcnow().date() - timedelta(days=self.retention_days), time.min)
+
+    def _day_groups(self) -> List[tuple]:
+        """(metal_id, день, число тиков) для дней старше cutoff, где больше одного тика."""
+        day = func.date(MetalPrice.timestamp)
+        rows = db.session.query(MetalPrice.metal_id, day, func.count(MetalPrice.id))\
+            .filter(MetalPrice.timestamp < self.cutoff)\
+            .group_by(MetalPrice.metal_id, day)\
+            .having(func.count(MetalPrice.id) > 1)\
+            .order_by(day)\
+            .all()
+        return [(metal_id, date.fromisoformat(str(value)[:10]), count) for metal_id, value, count in rows]
+
+    def _bytes_per_row(self) -> float:
+        dialect = db.engine.dialect.name
+        try:
+            if dialect == 'sqlite':
+                size = db.session.execute(text(
+                    "SELECT sum(pgsize) FROM dbstat WHERE name IN ('metal_price', 'ix_metal_price_timestamp')"
+                )).scalar()
+            elif dialect == 'postgresql':
+                size = db.session.execute(text("SELECT pg_total_relation_size('metal_price')")).scalar()
+            else:
+                size = None
+        except Exception:
+            # dbstat есть не во всех сборках SQLite
+            db.session.rollback()
+            size = None
+        rows = db.session.query(func.count(MetalPrice.id)).scalar()
+        if not size or not rows:
+            return float(DEFAULT_BYTES_PER_ROW)
+        return size / rows
+
+    def plan(self) -> Dict:
+        """Отчет dry-run: сколько строк и байт освободит компактизация."""
+        groups = self._day_groups()
+        rows_to_delete = sum(count - 1 for _, _, count in groups)
+        bytes_per_row = self._bytes_per_row()
+        return {
+            'cutoff': self.cutoff.isoformat(),
+            'days_to_compact': len(groups),
+            'ticks_scanned': sum(count for _, _, count in groups),
+            'rows_to_delete': rows_to_delete,
+            'daily_rows_to_write': len(groups),
+            'bytes_per_row': round(bytes_per_row, 1),
+            'estimated_bytes_reclaimed': int(rows_to_delete * bytes_per_row),
+        }
+
+    def run(self, dry_run: bool = False) -> Dict:
+        report = self.plan()
+        if dry_run:
+            report['dry_run'] = True
+            return report
+
+        deleted = 0
+        pending_ids: List[int] = []
+        started = time_module.perf_counter()
+        for metal_id, day, _ in self._day_groups():
+            day_start = datetime.combine(day, time.min)
+            ticks = db.session.query(MetalPrice.id, MetalPrice.price)\
+                .filter(MetalPrice.metal_id == metal_id,
+                        MetalPrice.timestamp >= day_start,
+                        MetalPrice.timestamp < day_start + timedelta(days=1))\
+                .order_by(MetalPrice.timestamp.asc()).all()
+            if len(ticks) < 2:
+                continue
+            prices = [price for _, price in ticks]
+            self._upsert_daily(metal_id, day, prices)
+            # Последний тик дня (close) остается в MetalPrice
+            pending_ids.extend(price_id for price_id, _ in ticks[:-1])
+            if len(pending_ids) >= self.batch_size:
+                deleted += self._delete_batch(pending_ids)
+                pending_ids = []
+        if pending_ids:
+            deleted += self._delete_batch(pending_ids)
+        db.session.commit()
+
+        report.update({
+            'dry_run': False,
+            'rows_deleted': deleted,
+            'duration_seconds': round(time_module.perf_counter() - started, 3),
+        })
+        if deleted:
+            refresh_series_sources(self.cutoff)
+        report['vacuum'] = self.vacuum_and_analyze()
+        logger.info(f"Компактизация тиков завершена: {report}")
+        return report
+
+    def _upsert_daily(self, metal_id: int, day: date, prices: List[float]) -> None:
+        daily = MetalPriceDaily.query.filter_by(metal_id=metal_id, date=day).first()
+        if daily is None:
+            db.session.add(MetalPriceDaily(
+                metal_id=metal_id, date=day, open=prices[0], high=max(prices), low=min(prices),
+                close=prices[-1], tick_count=len(prices)))
+            return
+        # День уже компактизировался раньше: его оставшийся close-тик входит в prices
+        daily.high = max(daily.high, max(prices))
+        daily.low = min(daily.low, min(prices))
+        daily.close = prices[-1]
+        daily.tick_count += len(prices) - 1
+
+    def _delete_batch(self, ids: List[int]) -> int:
+        deleted = 0
+        for offset in range(0, len(ids), self.batch_size):
+            chunk = ids[offset:offset + self.batch_size]
+            deleted += MetalPrice.query.filter(MetalPrice.id.in_(chunk)).delete(synchronize_session=False)
+            db.session.commit()
+            if self.pause:
+                time_module.sleep(self.pause)
+        return deleted
+
+    def vacuum_and_analyze(self) -> Dict:
+        """Инкрементально возвращает свободные страницы и обновляет статистику планировщика."""
+        dialect = db.engine.dialect.name
+        result = {'dialect': dialect}
+        if dialect == 'sqlite':
+            auto_vacuum = db.session.execute(text('PRAGMA auto_vacuum')).scalar()
+            freelist = db.session.execute(text('PRAGMA freelist_count')).scalar()
+            result['freelist_pages_before'] = freelist
+            if auto_vacuum == 2:  # INCREMENTAL
+                while freelist:
+                    db.session.execute(text(f'PRAGMA incremental_vacuum({self.vacuum_pages})'))
+                    db.session.commit()
+                    remaining = db.session.execute(text('PRAGMA freelist_count')).scalar()
+                    if remaining >= freelist:
+                        break
+                    freelist = remaining
+                    if self.pause:
+                        time_module.sleep(self.pause)
+            elif freelist:
+                logger.info("auto_vacuum не в режиме INCREMENTAL: свободные страницы будут переиспользованы "
+                            "новыми вставками; для возврата места диску выполните compact-prices --enable-incremental-vacuum")
+            db.session.execute(text('ANALYZE metal_price'))
+            db.session.commit()
+            result['freelist_pages_after'] = db.session.execute(text('PRAGMA freelist_count')).scalar()
+        elif dialect == 'postgresql':
+            # VACUUM нельзя выполнять внутри транзакции
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                connection.execute(text('VACUUM (ANALYZE) metal_price'))
+        return result
+
+    @staticmethod
+    def enable_incremental_vacuum() -> None:
+        """Однократно переводит SQLite в auto_vacuum=INCREMENTAL (требует полного VACUUM)."""
+        if db.engine.dialect.name != 'sqlite':
+            return
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('PRAGMA auto_vacuum=INCREMENTAL'))
+            connection.execute(text('VACUUM'))
+
+
+def refresh_series_sources(cutoff: datetime) -> None:
+    """Перечитывает in-memory хранилище и mmap-архив после удаления цен старше cutoff."""
+    from flask import current_app
+    from app.services.history_archive import build_from_db
+    from app.services.price_store import to_epoch_us
+
+    store = current_app.extensions.get('price_store')
+    if store:
+        store.load()
+    history_cache = current_app.extensions.get('history_cache')
+    if history_cache:
+        # Удалены цены до cutoff всех металлов
+        history_cache.invalidate_ranges(None, [(0, to_epoch_us(cutoff))])
+    archive = current_app.extensions.get('history_archive')
+    if archive:
+        build_from_db(archive.path)
+
+
+def retention_job_from_config(config) -> Optional[RetentionJob]:
+    """RetentionJob по настройкам приложения или None, если ретенция выключена."""
+    if not config.get('RETENTION_DAYS'):
+        return None
+    return RetentionJob(config['RETENTION_DAYS'], batch_size=config['RETENTION_BATCH_SIZE'],
+                        vacuum_pages=config['RETENTION_VACUUM_PAGES'])
@@ -0,0 +1,119 @@
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+import random
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_publish_times(value: Optional[str]) -> List[int]:
+    """'13:30,16:00' -> минуты от полуночи UTC."""
+    minutes = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        hours, mins = part.split(':')
+        minutes.append(int(hours) * 60 + int(mins))
+    return sorted(minutes)
+
+
+def circular_median(minutes: Iterable[int], period: int = MINUTES_PER_DAY) -> int:
+    """Медиана минут дня на окружности: наблюдение с наименьшей суммой расстояний до остальных.
+
+    Обычная медиана [23:50, 23:55, 00:05] дает 23:50 вместо 23:55, а при поровну точек по обе
+    стороны полуночи - середину дня.
+    """
+    minutes = list(minutes)
+
+    def distance(a: int, b: int) -> int:
+        d = abs(a - b) % period
+        return min(d, period - d)
+
+    return min(minutes, key=lambda m: sum(distance(m, other) for other in minutes))
+
+
+class AdaptiveSchedule:
+    """Расписание опроса источника цен с учетом времени публикации и отката.
+
+    - Вокруг ожидаемого времени публикации (настроенного или выученного по моментам,
+      когда данные действительно менялись) опрос идет каждые fast_interval секунд.
+    - Если содержимое не изменилось или источник вернул ошибку, интервал растет
+      экспоненциально (factor) до max_interval; изменение сбрасывает его к base_interval.
+    - К каждой задержке добавляется случайный разброс +-jitter, чтобы воркеры разных
+      инстансов не опрашивали источник синхронно.
+    """
+
+    def __init__(self, base_interval: float = 600, fast_interval: float = 60, max_interval: float = 3600,
+                 publish_times: Iterable[int] = (), publish_window: float = 1800,
+                 publish_weekdays: Iterable[int] = range(5), factor: float = 2.0, jitter: float = 0.1,
+                 learn_size: int = 20):
+        self.base_interval = base_interval
+        self.fast_interval = min(fast_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self.configured_times = sorted(publish_times)
+        self.publish_window = publish_window
+        self.publish_weekdays = set(publish_weekdays)
+        self.factor = factor
+        self.jitter = jitter
+        self.current_interval = base_interval
+        # Минуты дня (UTC), в которые наблюдались изменения данных
+        self.observed_changes = deque(maxlen=learn_size)
+
+    @property
+    def publish_times(self) -> List[int]:
+        if self.configured_times:
+            return self.configured_times
+        if len(self.observed_changes) >= 3:
+            return [circular_median(self.observed_changes)]
+        return []
+
+    def record(self, now: datetime, changed: bool, error: bool = False, learn: bool = True) -> None:
+        """Учитывает результат очередного опроса.
+
+        learn=False - изменение не учитывается при выучивании времени публикации (первый опрос
+        после старта "меняет" данные всегда, независимо от времени публикации).
+        """
+        if changed and not error:
+            self.current_interval = self.base_interval
+            if learn:
+                self.observed_changes.append(now.hour * 60 + now.minute)
+        else:
+            self.current_interval = min(self.current_interval * self.factor, self.max_interval)
+
+    def _next_window_start(self, now: datetime) -> Optional[datetime]:
+        """Начало ближайшего окна публикации (окно = [время - window/2, время + window/2])."""
+        half = timedelta(seconds=self.publish_window / 2)
+        for day_offset in range(8):
+            day = (now + timedelta(days=day_offset)).replace(hour=0, minute=0, second=0, microsecond=0)
+            if day.weekday() not in self.publish_weekdays:
+                continue
+            for minute in self.publish_times:
+                start = day + timedelta(minutes=minute) - half
+                if start + 2 * half > now:
+                    return start
+        return None
+
+    def next_delay(self, now: datetime) -> float:
+        """Секунды до следующего опроса."""
+        delay = self.current_interval
+        window_start = self._next_window_start(now)
+        if window_start is not None:
+            if window_start <= now:
+                delay = self.fast_interval
+            else:
+                delay = min(delay, max((window_start - now).total_seconds(), self.fast_interval))
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+    @classmethod
+    def from_config(cls, config, base_interval: Optional[float] = None) -> 'AdaptiveSchedule':
+        return cls(
+            base_interval=base_interval or config['UPDATER_BASE_INTERVAL'],
+            fast_interval=config['UPDATER_FAST_INTERVAL'],
+            max_interval=config['UPDATER_MAX_INTERVAL'],
+            publish_times=parse_publish_times(config['PRICE_PUBLISH_TIMES']),
+            publish_window=config['PRICE_PUBLISH_WINDOW_MINUTES'] * 60,
+            jitter=config['UPDATER_JITTER'],
+        )
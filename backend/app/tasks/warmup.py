@@ -0,0 +1,83 @@
+from typing import Dict, List
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState:
+    """Состояние прогрева воркера для эндпоинта /api/ready."""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.report: Dict = {}
+
+
+def parse_currencies(value: str) -> List[str]:
+    """'RUB, eur' -> ['RUB', 'EUR']."""
+    return [code.strip().upper() for code in (value or '').split(',') if code.strip()]
+
+
+def run_warmup(app, currencies: List[str]) -> Dict:
+    """Заполняет кэши процесса до приема трафика.
+
+    1. Снимок последних цен (и прогрев страниц БД с ними).
+    2. Курсы из базовых валют металлов во все currencies.
+    3. Анализ за стандартное 30-дневное окно для каждого металла.
+
+    Ошибки шагов (например, недоступный API курсов) не прерывают прогрев, а попадают в отчет:
+    воркер с частично теплым кэшем лучше, чем воркер, который никогда не станет готовым.
+    """
+    from app.services.exchange_rate_service import ExchangeRateService
+    from app.services.metal_service import MetalService, price_currency
+
+    report = {'steps': {}, 'errors': []}
+    started = time.perf_counter()
+    with app.app_context():
+        step_started = time.perf_counter()
+        snapshot = MetalService.get_price_snapshot()
+        report['steps']['snapshot_ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+
+        step_started = time.perf_counter()
+        rates = 0
+        for base in sorted({price_currency(metal['unit']) for metal in snapshot}):
+            for currency in currencies:
+                try:
+                    ExchangeRateService.get_exchange_rate(base, currency)
+                    rates += 1
+                except ValueError as e:
+                    report['errors'].append(f"{base}/{currency}: {e}")
+        report['steps']['fx_ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+        report['fx_rates'] = rates
+
+        step_started = time.perf_counter()
+        for metal in snapshot:
+            try:
+                MetalService.analyze_metal(metal['symbol'])
+            except Exception as e:
+                report['errors'].append(f"analysis {metal['symbol']}: {e}")
+        report['steps']['analysis_ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def start_warmup(app) -> WarmupState:
+    """Запускает прогрев в фоне; до его окончания /api/ready отвечает 503."""
+    state = WarmupState()
+    app.extensions['warmup'] = state
+    currencies = parse_currencies(app.config['WARMUP_CURRENCIES'])
+
+    def warm():
+        try:
+            state.report = run_warmup(app, currencies)
+        except Exception as e:
+            # Например, база недоступна: воркер все равно становится готовым, но с ошибкой в отчете
+            logger.error(f"Прогрев воркера завершился с ошибкой: {e}", exc_info=True)
+            state.report = {'errors': [str(e)]}
+        finally:
+            state.ready.set()
+        logger.info(f"Прогрев воркера завершен: {state.report}")
+
+    threading.Thread(target=warm, name='warmup', daemon=True).start()
+    return state
@@ -0,0 +1,174 @@
+"""Конкурентность эндпоинтов чтения: синхронный Flask на пуле потоков против ASGI режима (app/asgi.py).
+
+Запуск из директории backend/:
+
+    python benchmarks/bench_async.py --clients 64 --duration 15 --fx-latency 0.5
+
+Для каждого режима на общей временной базе поднимается сервер в отдельном процессе:
+sync - Flask на werkzeug с фиксированным пулом --threads потоков (как один gthread-воркер
+gunicorn), async - uvicorn с app.asgi:create_asgi_app. Курсы валют отдает заглушка с
+задержкой --fx-latency, а кэш курсов живет --fx-cache-seconds, поэтому часть запросов
+/api/metals/current ждет медленный внешний сервис. Клиенты - --clients асинхронных
+соединений без пауз; в конце печатаются throughput и p50/p99 по эндпоинтам.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from fake_upstreams import FakeUpstreams  # noqa: E402
+from loadtest import LatencyRecorder, seed_history  # noqa: E402
+
+METALS = ['GOLD', 'SILVER', 'PLATINUM', 'PALLADIUM']
+CURRENCIES = ['RUB', 'EUR', 'GBP', 'CNY', 'JPY', 'KZT']
+
+
+def serve_sync(port: int, threads: int):
+    """Flask на werkzeug с ограниченным пулом потоков вместо потока на каждое соединение."""
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import BaseWSGIServer
+    from app import create_app
+
+    class PooledWSGIServer(BaseWSGIServer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._process_request, request, client_address)
+
+        def _process_request(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer('127.0.0.1', port, create_app())
+    server.serve_forever()
+
+
+def start_server(mode: str, port: int, threads: int, env: dict) -> subprocess.Popen:
+    if mode == 'sync':
+        command = [sys.executable, __file__, '--serve', str(port), '--threads', str(threads)]
+    else:
+        command = [sys.executable, '-m', 'uvicorn', '--factory', 'app.asgi:create_asgi_app',
+                   '--port', str(port), '--log-level', 'warning', '--no-access-log']
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(client, base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f'{base_url}/api/health')).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f'Сервер {base_url} не поднялся за {timeout} с')
+
+
+async def client_loop(client, base_url: str, recorder: LatencyRecorder, deadline: float, history_days: int):
+    while time.monotonic() < deadline:
+        choice = random.random()
+        if choice < 0.5:
+            endpoint, path = 'current', '/api/metals/current'
+            params = {'currency': random.choice(CURRENCIES)}
+        elif choice < 0.8:
+            endpoint, path = 'history', '/api/metals/history'
+            date_to = datetime.utcnow().date()
+            params = {'metal': random.choice(METALS),
+                      'date_from': (date_to - timedelta(days=random.randint(7, history_days))).isoformat(),
+                      'date_to': date_to.isoformat()}
+        else:
+            endpoint, path = 'analysis', '/api/metals/analysis'
+            params = {'metal': random.choice(METALS)}
+        started = time.perf_counter()
+        try:
+            ok = (await client.get(f'{base_url}{path}', params=params)).status_code < 400
+        except Exception:
+            ok = False
+        recorder.record(endpoint, time.perf_counter() - started, ok)
+
+
+async def run_load(base_url: str, args) -> list:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await wait_ready(client, base_url)
+        recorder = LatencyRecorder()
+        started = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(client_loop(client, base_url, recorder, deadline, args.history_days)
+                               for _ in range(args.clients)))
+        return recorder.report(time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк конкурентности: sync Flask против ASGI')
+    parser.add_argument('--clients', type=int, default=64, help='одновременных клиентов')
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--threads', type=int, default=8, help='потоков синхронного сервера')
+    parser.add_argument('--fx-latency', type=float, default=0.5, help='задержка заглушки курсов, с')
+    parser.add_argument('--fx-cache-seconds', type=int, default=1, help='время жизни кэша курсов, с')
+    parser.add_argument('--history-days', type=int, default=365)
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_sync(args.serve, args.threads)
+        return
+
+    upstreams = FakeUpstreams(latency=args.fx_latency).start()
+    workdir = tempfile.mkdtemp(prefix='metals-bench-async-')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+               DATA_LAKE_DIR=os.path.join(workdir, 'data_lake'),
+               MFD_URL=upstreams.mfd_url,
+               EXCHANGE_RATE_API_BASE_URL=upstreams.fx_base_url,
+               EXCHANGE_RATE_API_KEY='bench',
+               EXCHANGE_RATE_CACHE_SECONDS=str(args.fx_cache_seconds),
+               PRICE_UPDATER_ENABLED='0')
+    os.environ.update(env)
+
+    from app import create_app
+    seed_history(create_app(), args.history_days)
+
+    results = {}
+    for port, mode in enumerate(args.modes.split(','), start=18700):
+        server = start_server(mode, port, args.threads, env)
+        try:
+            results[mode] = asyncio.run(run_load(f'http://127.0.0.1:{port}', args))
+        finally:
+            server.terminate()
+            server.wait()
+    fx_calls = upstreams.stats.counts.get('fx', (0, 0))[0]
+    upstreams.stop()
+
+    print(f"Клиентов: {args.clients}, длительность: {args.duration} с, потоков sync: {args.threads}, "
+          f"задержка FX: {args.fx_latency} с, кэш FX: {args.fx_cache_seconds} с, запросов к FX: {fx_calls}")
+    print(f"{'режим':<8}{'endpoint':<10}{'req':>8}{'err':>6}{'rps':>9}{'p50 мс':>10}{'p99 мс':>10}")
+    for mode, rows in results.items():
+        total = sum(row['requests'] for row in rows)
+        for row in rows:
+            print(f"{mode:<8}{row['endpoint']:<10}{row['requests']:>8}{row['errors']:>6}{row['rps']:>9.1f}"
+                  f"{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+        print(f"{mode:<8}{'всего':<10}{total:>8}{'':>6}{total / args.duration:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
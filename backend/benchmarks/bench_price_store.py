@@ -0,0 +1,115 @@
+"""Сравнение in-memory хранилища цен (PriceSeriesStore) с ORM-путем.
+
+Запуск из директории backend/:
+
+    python benchmarks/bench_price_store.py --points 50000 --queries 500
+
+Меряет объем памяти под историю одного металла (tracemalloc) и латентность
+диапазонных запросов MetalService.get_historical_prices в обоих режимах.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def seed_ticks(app, points: int, step_minutes: int = 10):
+    """Заполняет базу тиками с шагом step_minutes для всех металлов."""
+    from app import db
+    from app.models.metal import Metal, MetalPrice
+
+    start = datetime(2020, 1, 1)
+    with app.app_context():
+        for metal in Metal.query.all():
+            price = 100.0
+            rows = []
+            for i in range(points):
+                price *= 1 + random.gauss(0, 0.001)
+                rows.append({'metal_id': metal.id, 'price': round(price, 4),
+                             'timestamp': start + timedelta(minutes=step_minutes * i)})
+            db.session.bulk_insert_mappings(MetalPrice, rows)
+        db.session.commit()
+    return start, start + timedelta(minutes=step_minutes * points)
+
+
+def measure_memory(fn):
+    tracemalloc.start()
+    result = fn()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def time_queries(fn, ranges):
+    samples = []
+    for date_from, date_to in ranges:
+        started = time.perf_counter()
+        fn(date_from, date_to)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк PriceSeriesStore против ORM')
+    parser.add_argument('--points', type=int, default=50000, help='точек истории на металл')
+    parser.add_argument('--queries', type=int, default=300, help='число диапазонных запросов')
+    parser.add_argument('--span-days', type=int, default=30, help='средняя ширина диапазона, дней')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='metals-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['PRICE_UPDATER_ENABLED'] = '0'
+
+    from app import create_app, init_price_store, db
+    from app.models.metal import Metal, MetalPrice
+    from app.services.metal_service import MetalService
+
+    app = create_app()
+    start, end = seed_ticks(app, args.points)
+
+    with app.app_context():
+        gold = Metal.query.filter_by(symbol='GOLD').first()
+
+        orm_bytes, orm_rows = measure_memory(
+            lambda: MetalPrice.query.filter_by(metal_id=gold.id).order_by(MetalPrice.timestamp).all())
+        db.session.expunge_all()
+        del orm_rows
+
+        store_bytes, store = measure_memory(lambda: init_price_store(app))
+        total_points = args.points * len(store._series)
+
+        ranges = []
+        for _ in range(args.queries):
+            span = timedelta(days=random.uniform(1, 2 * args.span_days))
+            date_from = start + (end - start - span) * random.random()
+            ranges.append((date_from, date_from + span))
+
+        store_p50, store_p99 = time_queries(
+            lambda f, t: MetalService.get_historical_prices('GOLD', f, t), ranges)
+        store_slice_p50, store_slice_p99 = time_queries(
+            lambda f, t: store.range('GOLD', f, t), ranges)
+        app.extensions.pop('price_store')
+        orm_p50, orm_p99 = time_queries(
+            lambda f, t: MetalService.get_historical_prices('GOLD', f, t), ranges)
+
+    print(f"Точек на металл: {args.points}, всего в хранилище: {total_points}")
+    print(f"Память, ORM (один металл, .all()):   {orm_bytes / args.points:8.1f} байт/точку, {orm_bytes / 2**20:7.2f} MiB")
+    print(f"Память, хранилище (все металлы):     {store_bytes / total_points:8.1f} байт/точку, {store_bytes / 2**20:7.2f} MiB")
+    print(f"Диапазонный запрос (~{args.span_days} дн.), p50/p99 мс:")
+    print(f"  ORM get_historical_prices:          {orm_p50:8.3f} / {orm_p99:8.3f}")
+    print(f"  store get_historical_prices (JSON): {store_p50:8.3f} / {store_p99:8.3f}")
+    print(f"  store.range (memoryview-срез):      {store_slice_p50:8.3f} / {store_slice_p99:8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Пропускная способность читателей во время записи update_prices: обычный SQLite против производственного режима.
+
+Запуск из директории backend/:
+
+    python benchmarks/bench_sqlite_mode.py --readers 4 --duration 10
+
+Для каждого режима (SQLITE_PRODUCTION_MODE=0/1) создается временная база, запускаются
+процессы-читатели (get_historical_prices), а основной процесс непрерывно вызывает
+MetalService.update_prices пачками цен.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+METALS = ['GOLD', 'SILVER', 'PLATINUM', 'PALLADIUM']
+
+
+def reader_process(args, start, end, go, stop, results):
+    """Читатель в отдельном процессе - как API-воркер gunicorn рядом с процессом-писателем."""
+    from app import create_app, db
+    from app.services.metal_service import MetalService
+
+    app = create_app()
+    latencies = []
+    errors = 0
+    go.wait()
+    with app.app_context():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                date_from = start + (end - start) * random.random()
+                MetalService.get_historical_prices(random.choice(METALS), date_from, date_from + timedelta(days=1))
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+            finally:
+                # Как по окончании HTTP-запроса: соединение возвращается в пул
+                db.session.remove()
+            if args.think_ms:
+                stop.wait(args.think_ms / 1000)
+    results.put((latencies, errors))
+
+
+def run_mode(args) -> dict:
+    import multiprocessing
+    from bench_price_store import seed_ticks
+    from app import create_app
+    from app.services.metal_service import MetalService
+
+    app = create_app()
+    start, end = seed_ticks(app, args.points)
+
+    go, stop, results = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Queue()
+    readers = [multiprocessing.Process(target=reader_process, args=(args, start, end, go, stop, results))
+               for _ in range(args.readers)]
+    for process in readers:
+        process.start()
+
+    writes = [0, 0]  # пачек, строк
+    ts = end
+    go.set()
+    started = time.perf_counter()
+    with app.app_context():
+        while time.perf_counter() - started < args.duration:
+            batch = []
+            for _ in range(args.batch):
+                ts += timedelta(minutes=10)
+                batch.extend({'symbol': metal, 'price': random.uniform(50, 150), 'timestamp': ts.isoformat()}
+                             for metal in METALS)
+            MetalService.update_prices(batch)
+            writes[0] += 1
+            writes[1] += len(batch)
+    stop.set()
+    elapsed = time.perf_counter() - started
+
+    latencies, read_errors = [], 0
+    for _ in readers:
+        process_latencies, process_errors = results.get()
+        latencies.extend(process_latencies)
+        read_errors += process_errors
+    for process in readers:
+        process.join()
+    ordered = sorted(latencies)
+    return {
+        'reads_per_sec': len(ordered) / elapsed,
+        'read_p50_ms': ordered[len(ordered) // 2] * 1000 if ordered else 0.0,
+        'read_p99_ms': ordered[int(len(ordered) * 0.99)] * 1000 if ordered else 0.0,
+        'read_errors': read_errors,
+        'write_batches': writes[0],
+        'rows_written_per_sec': writes[1] / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк производственного режима SQLite')
+    parser.add_argument('--readers', type=int, default=4, help='процессов-читателей')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--points', type=int, default=20000, help='точек истории на металл')
+    parser.add_argument('--batch', type=int, default=5, help='временных меток в пачке update_prices')
+    parser.add_argument('--think-ms', type=float, default=5.0, help='пауза читателя между запросами, мс')
+    parser.add_argument('--mode', choices=['default', 'production'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    results = {}
+    for mode in ('default', 'production'):
+        workdir = tempfile.mkdtemp(prefix='metals-bench-')
+        env = dict(os.environ,
+                   DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+                   DATA_LAKE_DIR=os.path.join(workdir, 'data_lake'),
+                   SQLITE_PRODUCTION_MODE='1' if mode == 'production' else '0',
+                   SQLITE_READ_POOL_SIZE='2',
+                   PRICE_UPDATER_ENABLED='0')
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--readers', str(args.readers),
+             '--duration', str(args.duration), '--points', str(args.points), '--batch', str(args.batch), '--think-ms', str(args.think_ms)],
+            env=env, capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"Читателей: {args.readers}, длительность: {args.duration} с, пачка записи: {args.batch * len(METALS)} строк")
+    print(f"{'режим':<12}{'чтений/с':>12}{'p50 мс':>9}{'p99 мс':>9}{'ошибок чтения':>16}{'пачек записи':>15}{'строк/с':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['reads_per_sec']:>12.1f}{result['read_p50_ms']:>9.1f}{result['read_p99_ms']:>9.1f}"
+              f"{result['read_errors']:>16}"
+              f"{result['write_batches']:>15}{result['rows_written_per_sec']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Холодный старт воркера: время импорта app и create_app() с разбивкой по фазам.
+
+Запуск из директории backend/:
+
+    python benchmarks/bench_startup.py --runs 7
+
+Каждый замер - отдельный процесс интерпретатора (как новый воркер gunicorn). Сравниваются
+режимы DB_AUTO_INIT=1 (create_all и начальные металлы при каждом старте) и DB_AUTO_INIT=0
+(схема создается один раз командой `flask init-db`). Печатаются медианы фаз из
+app.extensions['startup_timings'], полное время процесса и тяжелые модули, оказавшиеся
+загруженными после старта.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+HEAVY_MODULES = ['requests', 'bs4', 'pandas', 'numpy', 'httpx', 'marshmallow']
+
+CHILD = """
+import json, sys
+from app import create_app
+app = create_app()
+print(json.dumps({'timings': app.extensions['startup_timings'],
+                  'loaded': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure(env: dict) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['timings']['process'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк холодного старта приложения')
+    parser.add_argument('--runs', type=int, default=7, help='запусков на режим')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='metals-bench-startup-')
+    base_env = dict(os.environ,
+                    DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+                    DATA_LAKE_DIR=os.path.join(workdir, 'data_lake'),
+                    PRICE_UPDATER_ENABLED='0')
+    # Схема создается заранее, как `flask init-db` при деплое
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'init-db'], cwd=BACKEND_DIR,
+                   env=base_env, check=True, capture_output=True)
+
+    phases = ['import_app', 'config', 'extensions', 'blueprints', 'database', 'create_app', 'process']
+    print(f"Медианы по {args.runs} запускам, мс")
+    print(f"{'режим':<16}" + ''.join(f"{phase:>12}" for phase in phases) + '  загружены')
+    for mode, auto_init in (('DB_AUTO_INIT=1', '1'), ('DB_AUTO_INIT=0', '0')):
+        env = dict(base_env, DB_AUTO_INIT=auto_init)
+        runs = [measure(env) for _ in range(args.runs)]
+        medians = {phase: statistics.median(run['timings'].get(phase, 0.0) for run in runs) for phase in phases}
+        print(f"{mode:<16}" + ''.join(f"{medians[phase]:>12.1f}" for phase in phases)
+              + '  ' + (', '.join(runs[-1]['loaded']) or '-'))
+
+
+if __name__ == '__main__':
+    main()
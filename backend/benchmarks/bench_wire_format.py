@@ -0,0 +1,101 @@
+"""Размер и скорость кодирования ответа /api/metals/history: текущий JSON против компактного формата.
+
+Запуск из директории backend/:
+
+    python benchmarks/bench_wire_format.py --runs 5
+
+Для синтетических рядов (дневные цены за 5 лет, 5-минутные тики за год) сравниваются:
+json - текущий список {'price', 'timestamp'}, compact - app/services/series_codec.py в JSON,
+msgpack - тот же компактный словарь в msgpack (если пакет установлен). Печатаются размер тела
+без сжатия и после gzip, медианы времени кодирования (ряд -> байты) и декодирования
+(байты -> моменты в микросекундах и цены).
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from app.services.price_store import from_epoch_us, to_epoch_us  # noqa: E402
+from app.services import series_codec  # noqa: E402
+
+
+def make_series(count: int, step_seconds: int):
+    start = to_epoch_us(datetime(2020, 1, 1))
+    price = 2000.0
+    timestamps, prices = [], []
+    for i in range(count):
+        price = max(1.0, price * (1 + random.gauss(0, 0.01)))
+        timestamps.append(start + i * step_seconds * 1_000_000)
+        prices.append(round(price, 2))
+    return timestamps, prices
+
+
+def encode_json(timestamps, prices) -> bytes:
+    data = [{'price': price, 'timestamp': from_epoch_us(ts).isoformat()} for ts, price in zip(timestamps, prices)]
+    return json.dumps({'status': 'success', 'data': data}, separators=(',', ':')).encode('utf-8')
+
+
+def decode_json(body: bytes):
+    data = json.loads(body)['data']
+    return [to_epoch_us(datetime.fromisoformat(item['timestamp'])) for item in data], [item['price'] for item in data]
+
+
+def encoder(mimetype):
+    def encode(timestamps, prices) -> bytes:
+        return series_codec.serialize({'status': 'success', 'encoding': series_codec.ENCODING,
+                                       'data': {'GOLD': series_codec.encode_series(timestamps, prices)}}, mimetype)
+    return encode
+
+
+def decode_compact_json(body: bytes):
+    return series_codec.decode_series(json.loads(body)['data']['GOLD'])
+
+
+def decode_msgpack(body: bytes):
+    import msgpack
+    return series_codec.decode_series(msgpack.unpackb(body)['data']['GOLD'])
+
+
+def median_ms(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк формата ответа истории цен')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    random.seed(42)
+
+    formats = [('json', encode_json, decode_json),
+               ('compact', encoder(series_codec.COMPACT_JSON_MIMETYPE), decode_compact_json)]
+    if series_codec.msgpack_available():
+        formats.append(('msgpack', encoder(series_codec.MSGPACK_MIMETYPE), decode_msgpack))
+
+    scenarios = [('daily, 5 years', 5 * 365, 86400), ('5-min ticks, 1 year', 365 * 288, 300)]
+    print(f"{'ряд':<22}{'формат':<10}{'точек':>8}{'байт':>12}{'gzip':>10}{'encode мс':>11}{'decode мс':>11}")
+    for name, count, step in scenarios:
+        timestamps, prices = make_series(count, step)
+        for label, encode, decode in formats:
+            body = encode(timestamps, prices)
+            assert decode(body) == (timestamps, prices), f"{label}: ряд не восстановился без потерь"
+            print(f"{name:<22}{label:<10}{count:>8}{len(body):>12}{len(gzip.compress(body)):>10}"
+                  f"{median_ms(lambda: encode(timestamps, prices), args.runs):>11.1f}"
+                  f"{median_ms(lambda: decode(body), args.runs):>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Локальные заглушки внешних сервисов (mfd.ru и exchangerate-api.com) для нагрузочных тестов.
+
+Отдают записанные ответы из benchmarks/fixtures с настраиваемой задержкой и долей ошибок.
+"""
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+MFD_FIXTURE = os.path.join(FIXTURES_DIR, 'mfd_preciousmetals.html')
+FX_FIXTURE = os.path.join(FIXTURES_DIR, 'exchangerate_latest_USD.json')
+
+
+class UpstreamStats:
+    """Потокобезопасные счетчики обращений к заглушкам."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def hit(self, name: str, failed: bool):
+        with self._lock:
+            total, errors = self.counts.get(name, (0, 0))
+            self.counts[name] = (total + 1, errors + int(failed))
+
+
+class FakeUpstreams:
+    """HTTP-сервер, имитирующий mfd.ru (/mfd/...) и exchangerate-api (/fx/v6/...)."""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stats = UpstreamStats()
+        with open(MFD_FIXTURE, 'rb') as f:
+            self.mfd_body = f.read()
+        with open(FX_FIXTURE, 'r', encoding='utf-8') as f:
+            self.fx_table = json.load(f)
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def mfd_url(self) -> str:
+        return f'{self.base_url}/mfd/centrobank/preciousmetals/'
+
+    @property
+    def fx_base_url(self) -> str:
+        return f'{self.base_url}/fx/v6'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _cross_rate(self, base: str, target: str):
+        rates = self.fx_table['conversion_rates']
+        if base not in rates or target not in rates:
+            return None
+        return rates[target] / rates[base]
+
+    def _make_handler(self):
+        upstreams = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                delay = upstreams.latency + random.uniform(0, upstreams.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+                failed = random.random() < upstreams.error_rate
+                parts = [p for p in self.path.split('?')[0].split('/') if p]
+
+                if parts[:1] == ['mfd']:
+                    upstreams.stats.hit('mfd', failed)
+                    if failed:
+                        return self._send(503, b'Service Unavailable', 'text/plain')
+                    return self._send(200, upstreams.mfd_body, 'text/html; charset=utf-8')
+
+                if parts[:2] == ['fx', 'v6'] and len(parts) >= 4:
+                    upstreams.stats.hit('fx', failed)
+                    if failed:
+                        return self._send(500, b'{"result": "error", "error-type": "internal"}', 'application/json')
+                    endpoint = parts[3]
+                    if endpoint == 'pair' and len(parts) == 6:
+                        rate = upstreams._cross_rate(parts[4].upper(), parts[5].upper())
+                        if rate is None:
+                            payload = {'result': 'error', 'error-type': 'unsupported-code'}
+                        else:
+                            payload = {'result': 'success', 'base_code': parts[4].upper(),
+                                       'target_code': parts[5].upper(), 'conversion_rate': round(rate, 6)}
+                        return self._send(200, json.dumps(payload).encode(), 'application/json')
+                    if endpoint == 'latest' and len(parts) == 5:
+                        base = parts[4].upper()
+                        rates = {code: round(value, 6) for code in upstreams.fx_table['conversion_rates']
+                                 if (value := upstreams._cross_rate(base, code)) is not None}
+                        if base not in rates:
+                            payload = {'result': 'error', 'error-type': 'unsupported-code'}
+                        else:
+                            payload = dict(upstreams.fx_table, base_code=base, conversion_rates=rates)
+                        return self._send(200, json.dumps(payload).encode(), 'application/json')
+
+                self._send(404, b'Not Found', 'text/plain')
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Запуск заглушек mfd.ru и exchangerate-api')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(latency=args.latency, error_rate=args.error_rate, port=args.port).start()
+    print(f"MFD_URL={upstreams.mfd_url}")
+    print(f"EXCHANGE_RATE_API_BASE_URL={upstreams.fx_base_url}")
+    try:
+        upstreams.thread.join()
+    except KeyboardInterrupt:
+        upstreams.stop()
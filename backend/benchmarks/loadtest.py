@@ -0,0 +1,261 @@
+"""Нагрузочный тест полного Flask-приложения с локальными заглушками внешних сервисов.
+
+Запуск из директории backend/:
+
+    python benchmarks/loadtest.py --duration 30 --readers 16 --writers 1
+
+Поднимает create_app() на временной SQLite базе, подменяет mfd.ru и exchangerate-api
+заглушками из fake_upstreams.py, запускает фоновый PriceUpdater и смешанную нагрузку:
+опрашивающих клиентов (current/history/analysis) и ручные POST /api/metals/update с опросом
+статуса задачи до ее завершения.
+В конце печатает throughput, p50/p99 и долю ошибок по каждому эндпоинту.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from fake_upstreams import FakeUpstreams  # noqa: E402
+
+METALS = ['GOLD', 'SILVER', 'PLATINUM', 'PALLADIUM']
+CURRENCIES = [None, 'RUB', 'EUR']
+
+
+class LatencyRecorder:
+    """Собирает латентности и ошибки по эндпоинтам."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            latencies, errors = self.samples.setdefault(endpoint, ([], [0]))
+            latencies.append(seconds)
+            if not ok:
+                errors[0] += 1
+
+    def report(self, elapsed: float) -> list:
+        rows = []
+        with self._lock:
+            for endpoint, (latencies, errors) in sorted(self.samples.items()):
+                ordered = sorted(latencies)
+                count = len(ordered)
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': count,
+                    'errors': errors[0],
+                    'error_rate': errors[0] / count if count else 0.0,
+                    'rps': count / elapsed if elapsed else 0.0,
+                    'p50_ms': percentile(ordered, 50) * 1000,
+                    'p99_ms': percentile(ordered, 99) * 1000,
+                    'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+                })
+        return rows
+
+
+def percentile(ordered: list, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def seed_history(app, days: int):
+    """Заполняет временную базу дневной историей цен для всех металлов."""
+    from app import db
+    from app.models.metal import Metal, MetalPrice
+
+    base_prices = {'GOLD': 8400.0, 'SILVER': 83.0, 'PLATINUM': 2500.0, 'PALLADIUM': 2470.0}
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    with app.app_context():
+        rows = []
+        for metal in Metal.query.all():
+            price = base_prices.get(metal.symbol, 100.0)
+            for day in range(days):
+                price *= 1 + random.gauss(0, 0.01)
+                rows.append({'metal_id': metal.id, 'price': round(price, 2),
+                             'timestamp': start + timedelta(days=day)})
+        db.session.bulk_insert_mappings(MetalPrice, rows)
+        db.session.commit()
+    return len(rows)
+
+
+def reader_loop(session, base_url: str, recorder: LatencyRecorder, stop: threading.Event,
+                think_time: float, history_days: int):
+    while not stop.is_set():
+        choice = random.random()
+        if choice < 0.5:
+            endpoint = 'GET /api/metals/current'
+            params = {}
+            currency = random.choice(CURRENCIES)
+            if currency:
+                params['currency'] = currency
+            url = f'{base_url}/api/metals/current'
+        elif choice < 0.8:
+            endpoint = 'GET /api/metals/history'
+            span = random.randint(7, history_days)
+            date_to = datetime.utcnow().date()
+            params = {'metal': random.choice(METALS),
+                      'date_from': (date_to - timedelta(days=span)).isoformat(),
+                      'date_to': date_to.isoformat()}
+            url = f'{base_url}/api/metals/history'
+        else:
+            endpoint = 'GET /api/metals/analysis'
+            params = {'metal': random.choice(METALS)}
+            url = f'{base_url}/api/metals/analysis'
+        timed_request(session, 'GET', url, params, endpoint, recorder)
+        if think_time:
+            stop.wait(random.uniform(0, 2 * think_time))
+
+
+def writer_loop(session, base_url: str, recorder: LatencyRecorder, stop: threading.Event, interval: float):
+    """POST /api/metals/update только ставит задачу; время до ее завершения пишется отдельно."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = timed_request(session, 'POST', f'{base_url}/api/metals/update', None,
+                                 'POST /api/metals/update', recorder)
+        if response is not None and response.status_code == 202:
+            wait_for_job(session, base_url + response.json()['status_url'], started, recorder, stop)
+        stop.wait(interval)
+
+
+def wait_for_job(session, status_url: str, started: float, recorder: LatencyRecorder, stop: threading.Event):
+    """Опрашивает статус задачи до завершения и записывает полное время обновления."""
+    while not stop.is_set():
+        try:
+            job = session.get(status_url, timeout=30).json()['data']
+        except Exception:
+            recorder.record('update job (end to end)', time.perf_counter() - started, False)
+            return
+        if job['status'] in ('succeeded', 'failed'):
+            recorder.record('update job (end to end)', time.perf_counter() - started, job['status'] == 'succeeded')
+            return
+        stop.wait(0.05)
+
+
+def timed_request(session, method: str, url: str, params, endpoint: str, recorder: LatencyRecorder):
+    started = time.perf_counter()
+    response = None
+    try:
+        response = session.request(method, url, params=params, timeout=30)
+        ok = response.status_code < 400
+    except Exception:
+        ok = False
+    recorder.record(endpoint, time.perf_counter() - started, ok)
+    return response
+
+
+def print_report(rows: list, upstream_counts: dict, updater_runs: int, elapsed: float):
+    print(f"\nДлительность: {elapsed:.1f} с, циклов PriceUpdater: {updater_runs}")
+    header = f"{'endpoint':<28}{'req':>8}{'err':>7}{'err%':>8}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['endpoint']:<28}{row['requests']:>8}{row['errors']:>7}{row['error_rate'] * 100:>7.1f}%"
+              f"{row['rps']:>9.1f}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    for name, (total, errors) in sorted(upstream_counts.items()):
+        print(f"upstream {name}: {total} запросов, {errors} ошибок")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API металлов с заглушками внешних сервисов')
+    parser.add_argument('--duration', type=float, default=30.0, help='длительность прогона, с')
+    parser.add_argument('--readers', type=int, default=8, help='число опрашивающих клиентов')
+    parser.add_argument('--writers', type=int, default=1, help='число клиентов POST /api/metals/update')
+    parser.add_argument('--think-time', type=float, default=0.0, help='средняя пауза между запросами читателя, с')
+    parser.add_argument('--write-interval', type=float, default=2.0, help='пауза между ручными обновлениями, с')
+    parser.add_argument('--updater-interval', type=float, default=5.0, help='период PriceUpdater, с (0 - выключен)')
+    parser.add_argument('--history-days', type=int, default=365, help='дней истории в тестовой базе')
+    parser.add_argument('--upstream-latency', type=float, default=0.05, help='задержка заглушек, с')
+    parser.add_argument('--upstream-jitter', type=float, default=0.0, help='случайная добавка к задержке, с')
+    parser.add_argument('--upstream-error-rate', type=float, default=0.0, help='доля ответов заглушек с ошибкой')
+    parser.add_argument('--json', dest='json_path', help='сохранить отчет в JSON файл')
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(latency=args.upstream_latency, jitter=args.upstream_jitter,
+                              error_rate=args.upstream_error_rate).start()
+    workdir = tempfile.mkdtemp(prefix='metals-loadtest-')
+    # Окружение должно быть задано до импорта app: адреса внешних сервисов читаются при импорте
+    os.environ['MFD_URL'] = upstreams.mfd_url
+    os.environ['EXCHANGE_RATE_API_BASE_URL'] = upstreams.fx_base_url
+    os.environ['EXCHANGE_RATE_API_KEY'] = 'loadtest'
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'loadtest.db')
+    os.environ['DATA_LAKE_DIR'] = os.path.join(workdir, 'data_lake')
+    # PriceUpdater запускается ниже со своим интервалом
+    os.environ['PRICE_UPDATER_ENABLED'] = '0'
+
+    import requests
+    from werkzeug.serving import make_server
+    from app import create_app
+    from app.tasks.price_updater import PriceUpdater
+
+    app = create_app()
+    seeded = seed_history(app, args.history_days)
+    print(f"Временная база: {workdir}, записей истории: {seeded}")
+
+    # Построчный access-лог werkzeug искажает замеры и засоряет отчет
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    updater = None
+    updater_runs = [0]
+    if args.updater_interval > 0:
+        updater = PriceUpdater(app, update_interval=args.updater_interval)
+        fetch = updater._fetch_and_update_prices
+
+        def counted_fetch():
+            updater_runs[0] += 1
+            return fetch()
+        updater._fetch_and_update_prices = counted_fetch
+        updater.start()
+
+    recorder = LatencyRecorder()
+    stop = threading.Event()
+    threads = []
+    for _ in range(args.readers):
+        threads.append(threading.Thread(target=reader_loop, daemon=True, args=(
+            requests.Session(), base_url, recorder, stop, args.think_time, args.history_days)))
+    for _ in range(args.writers):
+        threads.append(threading.Thread(target=writer_loop, daemon=True, args=(
+            requests.Session(), base_url, recorder, stop, args.write_interval)))
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        stop.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=35)
+    elapsed = time.perf_counter() - started
+
+    if updater:
+        updater.stop()
+    server.shutdown()
+    upstreams.stop()
+
+    rows = recorder.report(elapsed)
+    print_report(rows, upstreams.stats.counts, updater_runs[0], elapsed)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'duration': elapsed, 'args': vars(args), 'endpoints': rows,
+                       'upstream': upstreams.stats.counts, 'updater_runs': updater_runs[0]}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
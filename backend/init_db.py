@@ -2,7 +2,6 @@ import sys
 import os
 import traceback
 from datetime import datetime, time
-import pandas as pd # Добавлен импорт pandas
 
 print(f"--- init_db.py VERBOSE TEST from {os.getcwd()} ---")
 print(f"Python version: {sys.version}")
@@ -74,6 +73,8 @@ try:
             sys.stdout.flush()
         else:
             try:
+                # pandas нужен только для чтения Excel и импортируется лишь при наличии файла
+                import pandas as pd
                 # Заголовки на первой строке (индекс 0), данные начинаются со второй (header=0)
                 df = pd.read_excel(excel_file_path, sheet_name=0, header=0) 
                 print(f"Successfully read Excel file. Columns found: {df.columns.tolist()}")
@@ -97,6 +98,16 @@ try:
                     print(f"Found columns: {df.columns.tolist()}")
                     sys.stdout.flush()
                 else:
+                    # PostgreSQL с секциями по месяцам (PRICE_PARTITIONING=1): секции месяцев истории
+                    # должны существовать до вставки, иначе INSERT падает с "no partition"
+                    from app.tasks.partitions import get_price_partitions
+                    partitions = get_price_partitions()
+                    if partitions:
+                        record_dates = [pd.to_datetime(str(value), dayfirst=True, errors='coerce') for value in df["Дата"]]
+                        created = partitions.ensure_for(value for value in record_dates if not pd.isna(value))
+                        print(f"Created {len(created)} price partitions for the Excel history.")
+                        sys.stdout.flush()
+
                     for index, row in df.iterrows():
                         try:
                             date_str = str(row["Дата"])
@@ -175,6 +186,13 @@ try:
                     print("Successfully processed and committed historical data from Excel.")
                     sys.stdout.flush()
 
+                    # Пересобираем mmap-архив истории, если он настроен (HISTORY_ARCHIVE_PATH)
+                    if app.config.get('HISTORY_ARCHIVE_PATH'):
+                        from app.services.history_archive import build_from_db
+                        total_points = build_from_db(app.config['HISTORY_ARCHIVE_PATH'])
+                        print(f"History archive rebuilt: {total_points} points.")
+                        sys.stdout.flush()
+
             except Exception as e_excel:
                 print(f"Error reading or processing Excel file: {e_excel}")
                 print(traceback.format_exc())
@@ -0,0 +1,22 @@
+import pytest
+from app import create_app, db
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Приложение на временной SQLite базе, без фоновых потоков и внешних сервисов."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('DATA_LAKE_DIR', str(tmp_path / 'data_lake'))
+    monkeypatch.setenv('LOG_ASYNC', '0')
+    monkeypatch.setenv('WARMUP_ENABLED', '0')
+    monkeypatch.setenv('PRICE_UPDATER_ENABLED', '0')
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.alert import PriceAlert
+from app.models.metal import Metal, MetalPrice
+from app.services.alert_engine import AlertEngine, AlertService, evaluate_alerts
+from app.services.alert_sinks import QueueSink
+
+
+@pytest.fixture
+def gold(app):
+    gold = Metal.query.filter_by(symbol='GOLD').first()
+    db.session.add(MetalPrice(metal_id=gold.id, price=100.0, timestamp=datetime.utcnow()))
+    db.session.commit()
+    return gold
+
+
+def _engine(app):
+    engine = AlertEngine(QueueSink())
+    app.extensions['alert_engine'] = engine
+    return engine
+
+
+def _tick(price):
+    return [{'symbol': 'GOLD', 'price': price, 'timestamp': datetime.utcnow().isoformat()}]
+
+
+def test_alert_fires_only_when_price_crosses_level(app, gold):
+    engine = _engine(app)
+    with pytest.raises(ValueError):
+        AlertService.create({'metal': 'GOLD', 'condition': 'above', 'threshold': 95})
+    alert = AlertService.create({'metal': 'GOLD', 'condition': 'above', 'threshold': 105})
+
+    assert engine.evaluate(_tick(104)) == []
+    fired = engine.evaluate(_tick(106))
+    assert [(n['alert_id'], n['side'], n['price']) for n in fired] == [(alert['id'], 'above', 106.0)]
+    # Одноразовое: дальше не срабатывает
+    assert engine.evaluate(_tick(107)) == []
+    assert PriceAlert.query.get(alert['id']).triggered_price == 106.0
+    assert engine.sink.drain() == fired
+
+
+def test_move_alert_uses_latest_price_as_reference(app, gold):
+    engine = _engine(app)
+    alert = AlertService.create({'metal': 'GOLD', 'condition': 'move', 'percent': 5})
+    assert alert['levels'] == {'above': 105.0, 'below': 95.0}
+
+    assert engine.evaluate(_tick(96)) == []
+    fired = engine.evaluate(_tick(94))
+    assert [(n['side'], n['level']) for n in fired] == [('below', 95.0)]
+    assert engine.active_count == 0
+
+
+def test_failed_claim_keeps_alert_active(app, gold, monkeypatch):
+    engine = _engine(app)
+    alert = AlertService.create({'metal': 'GOLD', 'condition': 'above', 'threshold': 105})
+    commit = db.session.commit
+
+    def fail_once():
+        monkeypatch.setattr(db.session, 'commit', commit)
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(db.session, 'commit', fail_once)
+    evaluate_alerts(_tick(106))
+    assert PriceAlert.query.get(alert['id']).active
+    assert engine.active_count == 1
+
+    assert [n['alert_id'] for n in engine.evaluate(_tick(107))] == [alert['id']]
+
+
+def test_alert_claimed_by_another_process_is_dropped(app, gold):
+    alert = AlertService.create({'metal': 'GOLD', 'condition': 'below', 'threshold': 90})
+    first, second = AlertEngine(QueueSink()), AlertEngine(QueueSink())
+    first.refresh()
+    second.refresh()
+
+    assert [n['alert_id'] for n in second.evaluate(_tick(89))] == [alert['id']]
+    assert first.evaluate(_tick(88)) == []
+    assert first.active_count == 0
+    assert first.sink.drain() == []
@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models.metal import Metal, MetalAnalysis, MetalPrice
+from app.services.metal_service import MetalService
+from app.tasks.analytics import AnalyticsBatch
+
+
+def test_batch_replaces_analysis_rows(app):
+    gold = Metal.query.filter_by(symbol='GOLD').first()
+    start = datetime.utcnow() - timedelta(days=20)
+    db.session.bulk_insert_mappings(MetalPrice, [
+        {'metal_id': gold.id, 'price': 100.0 + day, 'timestamp': start + timedelta(days=day)}
+        for day in range(20)
+    ])
+    db.session.commit()
+    # Строка, сохраненная расчетом по запросу, тоже заменяется пакетом
+    MetalService._compute_and_store_analysis(gold, 30)
+
+    batch = AnalyticsBatch(windows=[7, 30], workers=1)
+    batch.run()
+    batch.run()
+
+    rows = MetalAnalysis.query.filter_by(metal_id=gold.id).all()
+    assert sorted(row.window_days for row in rows) == [7, 30]
+    assert MetalAnalysis.query.count() == batch.run()['rows']
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+from app.asgi import MetalsASGI
+from app.services.price_stream import price_stream_hub
+
+
+def _stream(asgi, on_started):
+    """Открыть /api/metals/stream, дождаться первого события prices и отключиться."""
+    sent = []
+    disconnect = asyncio.Event()
+
+    async def receive():
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+        if message['type'] == 'http.response.start':
+            on_started()
+        elif message['type'] == 'http.response.body' and b'event: prices' in message.get('body', b''):
+            disconnect.set()
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/metals/stream', 'query_string': b'', 'headers': []}
+    asyncio.run(asyncio.wait_for(asgi(scope, receive, send), 5))
+    return sent
+
+
+def test_stream_is_served_on_event_loop(app):
+    asgi = MetalsASGI(app)
+    prices = [{'symbol': 'GOLD', 'price': 100.0, 'timestamp': '2024-01-01T00:00:00'}]
+
+    def publish_from_thread():
+        # Как PriceUpdater: публикация из другого потока
+        threading.Thread(target=price_stream_hub.publish, args=(prices,)).start()
+
+    sent = _stream(asgi, publish_from_thread)
+
+    start = sent[0]
+    assert start['status'] == 200
+    assert dict(start['headers'])[b'content-type'].startswith(b'text/event-stream')
+    bodies = b''.join(message.get('body', b'') for message in sent[1:])
+    assert bodies.startswith(b'retry: 5000')
+    assert b'"GOLD"' in bodies
+    # Поток не занимал пул потоков WSGI и отписался после отключения клиента
+    assert asgi.executor._threads == set()
+    assert price_stream_hub.subscriber_count == 0
+
+
+def test_stream_rejects_clients_over_limit(app, monkeypatch):
+    monkeypatch.setattr(price_stream_hub, 'max_subscribers', 0)
+    sent = []
+
+    async def receive():
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/metals/stream', 'query_string': b'', 'headers': []}
+    asyncio.run(MetalsASGI(app)(scope, receive, send))
+    assert sent[0]['status'] == 503
+
+
+def test_flask_stream_limits_thread_clients(app, client, monkeypatch):
+    monkeypatch.setattr(price_stream_hub, 'max_thread_subscribers', 1)
+    first = client.get('/api/metals/stream', buffered=False)
+    assert first.status_code == 200
+    assert client.get('/api/metals/stream').status_code == 503
+    first.close()
+    assert price_stream_hub.subscriber_count == 0
+
+
+def test_other_process_streams_corrected_prices(app):
+    from app.services.metal_service import MetalService
+    from app.services.price_stream import PriceStreamHub
+
+    # Хаб другого воркера: видит цены только через журнал PriceChange
+    other = PriceStreamHub(poll_interval=0)
+    other._last_change_id = 0
+    subscription = other.subscribe()
+    timestamp = '2024-05-01T00:00:00'
+    MetalService.update_prices([{'symbol': 'GOLD', 'price': 100.0, 'timestamp': timestamp}], screen=False)
+    MetalService.update_prices([{'symbol': 'GOLD', 'price': 101.5, 'timestamp': timestamp}], screen=False)
+
+    assert other.poll() == 1
+    message = subscription.queue.get_nowait()
+    assert '"price": 100.0' in message and '"price": 101.5' in message
+    assert other.poll() == 0
+
+
+def test_other_routes_run_flask_on_the_pool(app):
+    asgi = MetalsASGI(app)
+    sent = []
+    requests = [{'type': 'http.request', 'body': b''}]
+
+    async def receive():
+        return requests.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'path': '/api/jobs',
+             'query_string': b'', 'headers': []}
+    asyncio.run(asgi(scope, receive, send))
+
+    assert sent[0]['status'] == 200
+    assert b'"success"' in b''.join(message.get('body', b'') for message in sent[1:])
+    assert sent[-1] == {'type': 'http.response.body'}
+    assert all(thread.name.startswith('wsgi') for thread in asgi.executor._threads)
+    assert len(asgi.executor._threads) == 1
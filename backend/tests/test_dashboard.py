@@ -0,0 +1,19 @@
+def test_dashboard_rejects_duplicate_ids(client):
+    response = client.post('/api/metals/dashboard', json={'queries': [
+        {'id': 'x', 'type': 'analysis', 'metal': 'GOLD'}, {'id': 'x', 'type': 'current'}]})
+    assert response.status_code == 400
+    assert 'x' in response.get_json()['message']
+
+    # Позиция второго подзапроса совпадает с id первого
+    response = client.post('/api/metals/dashboard', json={'queries': [
+        {'id': '1', 'type': 'current'}, {'type': 'current'}]})
+    assert response.status_code == 400
+
+
+def test_dashboard_keys_results_by_id_or_position(client):
+    response = client.post('/api/metals/dashboard', json={'queries': [
+        {'id': 'gold', 'type': 'analysis', 'metal': 'NOPE'}, {'type': 'history'}]})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert sorted(data) == ['1', 'gold']
+    assert data['gold']['status'] == 'error' and data['1']['status'] == 'error'
@@ -0,0 +1,18 @@
+from app.services import forecast_service
+from app.services.forecast_service import ForecastService
+
+
+def test_get_does_not_fit_and_caches_missing_forecast(app, monkeypatch):
+    def fail(config):
+        raise AssertionError('GET must not run the forecast batch')
+
+    monkeypatch.setattr(forecast_service, 'forecast_batch_from_config', fail)
+    queries = []
+    original_query = forecast_service.db.session.query
+    monkeypatch.setattr(forecast_service.db.session, 'query',
+                        lambda *args: queries.append(args) or original_query(*args))
+
+    assert ForecastService.get('GOLD') is None
+    assert ForecastService.get('GOLD') is None
+    # Второй запрос отвечает из кэша, без обращения к БД
+    assert len(queries) == 1
@@ -0,0 +1,51 @@
+import asyncio
+from datetime import date
+
+import httpx
+
+from app import db
+from app.models.exchange_rate import ExchangeRate
+from app.models.metal import Metal
+from app.services.async_metal_service import create_async_engine_for_app
+from app.services.exchange_rate_service import AsyncExchangeRateClient
+from app.services.fx_rate_history import get_fx_rate_history
+
+
+def test_record_leaves_caller_session_alone(app):
+    db.session.add(Metal(symbol='COPPER', name='Copper', unit='USD/oz'))
+
+    get_fx_rate_history().record('USD', date(2024, 5, 1), {'RUB': 90.0})
+    get_fx_rate_history().record('USD', date(2024, 5, 1), {'RUB': 91.0})
+    db.session.rollback()
+
+    assert Metal.query.filter_by(symbol='COPPER').first() is None
+    row = ExchangeRate.query.filter_by(base='USD').one()
+    assert row.rates == '{"RUB":91.0}'
+
+
+def test_async_client_persists_tables_and_falls_back_to_stale(app, monkeypatch):
+    monkeypatch.setenv('EXCHANGE_RATE_API_KEY', 'test')
+    latest = {'result': 'success', 'time_last_update_unix': 1714521600, 'conversion_rates': {'USD': 1, 'RUB': 90.5}}
+
+    def client(handler, **kwargs):
+        fx_client = AsyncExchangeRateClient(engine, **kwargs)
+        fx_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return fx_client
+
+    async def quotes():
+        online = client(lambda request: httpx.Response(200, json=latest))
+        fresh = await online.get_rate_quote('usd', 'rub')
+        # API недоступен, сохраненная таблица уже не свежая: отдается со stale=True
+        offline = client(lambda request: httpx.Response(503), cache_seconds=0)
+        stale = await offline.get_rate_quote('USD', 'RUB')
+        await online.aclose()
+        await offline.aclose()
+        await engine.dispose()
+        return fresh, stale
+
+    engine = create_async_engine_for_app(app, db.engine)
+    fresh, stale = asyncio.run(quotes())
+
+    assert (fresh.rate, fresh.date, fresh.stale) == (90.5, date(2024, 5, 1), False)
+    assert (stale.rate, stale.stale) == (90.5, True)
+    assert ExchangeRate.query.filter_by(base='USD').count() == 1
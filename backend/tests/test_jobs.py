@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from app.tasks.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobQueueFull
+
+
+def _queue(app, release, **kwargs):
+    queue = JobQueue(app, max_workers=1, **kwargs)
+
+    def handler(job, n):
+        job.set_progress(1, 2, 'halfway')
+        release.wait(5)
+        return n
+
+    queue.register('work', handler)
+    return queue
+
+
+def test_jobs_are_shared_between_workers(app):
+    """Две очереди на одной БД ведут себя как два воркера gunicorn."""
+    release = threading.Event()
+    first, second = _queue(app, release, max_pending=1), _queue(app, release, max_pending=1)
+
+    job, created = first.submit('work', {'n': 3})
+    assert created
+    duplicate, created = second.submit('work', {'n': 3})
+    assert not created and duplicate.id == job.id
+    with pytest.raises(JobQueueFull):
+        second.submit('work', {'n': 4})
+    assert second.get(job.id).status in (QUEUED, RUNNING)
+
+    release.set()
+    first.shutdown()
+    seen = second.get(job.id)
+    assert seen.status == SUCCEEDED
+    assert seen.rows == 3 and seen.progress == 1.0
+    assert seen.worker
+    assert [recent.id for recent in second.recent()] == [job.id]
+    # После завершения ключ свободен: та же задача ставится снова
+    assert second.submit('work', {'n': 3})[1]
+    second.shutdown()
+
+
+def test_stale_job_frees_its_key(app, monkeypatch):
+    release = threading.Event()
+    queue = _queue(app, release, stale_after=0)
+    # Воркер "упал": задача записана, но не выполняется
+    monkeypatch.setattr(queue._executor, 'submit', lambda *args: None)
+    lost, _ = queue.submit('work', {'n': 1})
+    job, created = queue.submit('work', {'n': 1})
+    assert created and job.id != lost.id
+    assert queue.get(lost.id).status == FAILED
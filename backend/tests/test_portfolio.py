@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models.metal import Metal, MetalPrice
+from app.services.fx_rate_history import get_fx_rate_history
+from app.services.portfolio_service import PortfolioService
+
+
+def test_series_uses_fx_history_and_leaves_days_before_it_empty(app):
+    gold = Metal.query.filter_by(symbol='GOLD').first()
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    days = [today - timedelta(days=offset) for offset in (4, 3, 2, 1)]
+    db.session.bulk_insert_mappings(MetalPrice, [
+        {'metal_id': gold.id, 'price': 100.0, 'timestamp': day + timedelta(hours=12)} for day in days
+    ])
+    db.session.commit()
+    get_fx_rate_history().record('USD', days[1].date(), {'RUB': 2.0})
+    # В таблице за этот день нет RUB: берется курс предыдущей
+    get_fx_rate_history().record('USD', days[2].date(), {'EUR': 0.9})
+    get_fx_rate_history().record('USD', days[3].date(), {'RUB': 3.0})
+
+    result = PortfolioService.value([{'metal': 'GOLD', 'quantity': 1, 'unit': 'oz'}], 'RUB',
+                                    days[0], today + timedelta(days=1))
+
+    series = result['series']
+    assert series['total'] == [None, 200.0, 200.0, 300.0]
+    assert series['fx_missing_days'] == [days[0].date().isoformat()]
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import app as app_package
+from app import create_app
+from app.tasks.price_updater import PriceUpdater
+
+
+def _start_recorder(monkeypatch):
+    started = []
+    monkeypatch.setattr(PriceUpdater, 'start', lambda self: started.append(self))
+    return started
+
+
+def test_create_app_starts_updater_in_server_process(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('LOG_ASYNC', '0')
+    monkeypatch.setenv('PRICE_UPDATER_ENABLED', '1')
+    monkeypatch.delenv('FLASK_RUN_FROM_CLI', raising=False)
+    started = _start_recorder(monkeypatch)
+
+    flask_app = create_app()
+
+    assert len(started) == 1
+    assert app_package.price_updater is started[0]
+    assert started[0].leader_lock.path == flask_app.config['PRICE_UPDATER_LOCK_PATH']
+
+
+def test_create_app_skips_updater_for_cli_commands_and_when_disabled(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('LOG_ASYNC', '0')
+    started = _start_recorder(monkeypatch)
+
+    # flask --app run init-db: переменную выставляет FlaskGroup, контекста команды run нет
+    monkeypatch.setenv('PRICE_UPDATER_ENABLED', '1')
+    monkeypatch.setenv('FLASK_RUN_FROM_CLI', 'true')
+    create_app()
+    monkeypatch.delenv('FLASK_RUN_FROM_CLI')
+    monkeypatch.setenv('PRICE_UPDATER_ENABLED', '0')
+    create_app()
+
+    assert started == []
+
+
+def test_daily_maintenance_runs_once_per_day_after_configured_hour(app, tmp_path, monkeypatch):
+    from app.tasks import price_updater
+
+    runs = []
+
+    class Batch:
+        def run(self):
+            runs.append(1)
+            return {'forecasts': 0, 'duration_ms': 0}
+
+    monkeypatch.setattr(price_updater, 'analytics_batch_from_config', lambda config: None)
+    monkeypatch.setattr(price_updater, 'forecast_batch_from_config', lambda config: Batch())
+    app.config['MAINTENANCE_HOUR_UTC'] = 2
+    lock_path = str(tmp_path / 'price_updater.lock')
+
+    updater = PriceUpdater(app, lock_path=lock_path)
+    updater._run_daily_maintenance(datetime(2024, 5, 1, 1, 50))
+    assert runs == []
+    updater._run_daily_maintenance(datetime(2024, 5, 1, 2, 0))
+    updater._run_daily_maintenance(datetime(2024, 5, 1, 2, 10))
+    assert runs == [1]
+
+    # Перезапуск или новый лидер в тот же день не повторяет обслуживание
+    restarted = PriceUpdater(app, lock_path=lock_path)
+    restarted._run_daily_maintenance(datetime(2024, 5, 1, 9, 0))
+    assert runs == [1]
+    restarted._run_daily_maintenance(datetime(2024, 5, 2, 3, 0))
+    assert runs == [1, 1]
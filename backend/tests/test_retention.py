@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models.metal import Metal, MetalPrice, MetalPriceDaily
+from app.services.history_cache import get_history_cache
+from app.services.metal_service import MetalService
+from app.tasks.retention import RetentionJob
+
+
+def test_run_compacts_ticks_and_invalidates_history_cache(app):
+    gold = Metal.query.filter_by(symbol='GOLD').first()
+    day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=10)
+    db.session.bulk_insert_mappings(MetalPrice, [
+        {'metal_id': gold.id, 'price': price, 'timestamp': day + timedelta(hours=hour)}
+        for hour, price in enumerate([100.0, 105.0, 95.0, 101.0])
+    ])
+    db.session.commit()
+
+    # Кэш истории включен по умолчанию; запрос кладет в него ряд за период с тиками
+    before = MetalService.get_historical_prices('GOLD', day - timedelta(days=1), day + timedelta(days=1))
+    assert len(before) == 4
+    assert get_history_cache() is not None
+
+    report = RetentionJob(retention_days=1).run()
+
+    assert report['rows_deleted'] == 3
+    daily = MetalPriceDaily.query.filter_by(metal_id=gold.id).one()
+    assert (daily.open, daily.high, daily.low, daily.close, daily.tick_count) == (100.0, 105.0, 95.0, 101.0, 4)
+    after = MetalService.get_historical_prices('GOLD', day - timedelta(days=1), day + timedelta(days=1))
+    assert [point['price'] for point in after] == [101.0]
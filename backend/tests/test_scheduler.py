@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from app.tasks.scheduler import AdaptiveSchedule, circular_median
+
+
+def test_circular_median_wraps_around_midnight():
+    # 23:50, 23:55, 00:05, 00:10
+    assert circular_median([1430, 1435, 5, 10]) in (1435, 5)
+    assert circular_median([1430, 1435, 5]) == 1435
+    assert circular_median([600, 610, 620]) == 610
+
+
+def test_first_fetch_is_not_learned_as_publish_time():
+    schedule = AdaptiveSchedule(jitter=0)
+    schedule.record(datetime(2024, 5, 1, 8, 0), changed=True, learn=False)
+    for minute in (58, 59, 59):
+        schedule.record(datetime(2024, 5, 1, 23, minute), changed=True)
+    assert list(schedule.observed_changes) == [1438, 1439, 1439]
+    assert schedule.publish_times == [1439]
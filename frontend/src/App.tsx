@@ -35,6 +35,22 @@ interface MetalHistoryData {
   message?: string
 }
 
+interface DashboardResult<T> {
+  type: string
+  status: string
+  data?: T
+  message?: string
+}
+
+interface DashboardData {
+  status: string
+  data: {
+    prices?: DashboardResult<MetalPrice[]>
+    history?: DashboardResult<HistoricalPrice[]>
+  }
+  message?: string
+}
+
 interface BackendStatus {
   status: string
   message: string
@@ -68,20 +84,6 @@ const App: React.FC = () => {
   const [backendStatus, setBackendStatus] = useState<BackendStatus | null>(null)
   const [selectedCurrency, setSelectedCurrency] = useState<string>('USD')
 
-  const fetchBackendStatus = useCallback(async () => {
-    try {
-      const response = await fetch(`${API_BASE_URL}/api/metals/current?limit=1`)
-      if (response.ok) {
-        setBackendStatus({ status: 'healthy', message: 'API is running' })
-      } else {
-        setBackendStatus({ status: 'unhealthy', message: `API returned status: ${response.status}` })
-      }
-    } catch (err) {
-      setBackendStatus({ status: 'unhealthy', message: 'API is unreachable' })
-      console.error("Failed to fetch backend status:", err)
-    }
-  }, [])
-
   const fetchCurrentPrices = useCallback(async (currency: string) => {
     setIsLoading(true)
     setErrorMetals(null)
@@ -139,10 +141,57 @@ const App: React.FC = () => {
     }
   }, [selectedMetal, dateFrom, dateTo])
 
+  // Первая загрузка страницы: статус API, текущие цены и история выбранного металла одним запросом
+  const fetchDashboard = useCallback(async (currency: string) => {
+    setIsLoading(true)
+    setErrorMetals(null)
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/metals/dashboard`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          currency,
+          queries: [
+            { id: 'prices', type: 'current' },
+            { id: 'history', type: 'history', metal: selectedMetal, date_from: dateFrom, date_to: dateTo },
+          ],
+        }),
+      })
+      if (!response.ok) {
+        setBackendStatus({ status: 'unhealthy', message: `API returned status: ${response.status}` })
+        const errorData: DashboardData = await response.json()
+        throw new Error(errorData.message || `Ошибка ${response.status} при загрузке текущих цен`)
+      }
+      setBackendStatus({ status: 'healthy', message: 'API is running' })
+      const data: DashboardData = await response.json()
+      const prices = data.data.prices
+      if (prices?.status === 'success' && prices.data) {
+        setMetalPrices(prices.data)
+      } else {
+        throw new Error(prices?.message || 'Не удалось получить данные о ценах')
+      }
+      const history = data.data.history
+      if (history?.status === 'success' && history.data) {
+        setMetalHistory(history.data)
+      }
+    } catch (err) {
+      if (err instanceof TypeError) {
+        // fetch не смог подключиться к API
+        setBackendStatus({ status: 'unhealthy', message: 'API is unreachable' })
+      }
+      const errorMessage = err instanceof Error ? err.message : "Произошла неизвестная ошибка при загрузке цен."
+      setErrorMetals(errorMessage)
+      console.error("Failed to fetch dashboard:", err)
+    } finally {
+      setIsLoading(false)
+    }
+  // История подгружается при первой загрузке и смене валюты; по кнопке - через fetchHistory
+  // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [])
+
   useEffect(() => {
-    fetchBackendStatus()
-    fetchCurrentPrices(selectedCurrency)
-  }, [fetchBackendStatus, fetchCurrentPrices, selectedCurrency])
+    fetchDashboard(selectedCurrency)
+  }, [fetchDashboard, selectedCurrency])
 
   const handleShowHistory = () => {
     fetchHistory()